@@ -0,0 +1,56 @@
+"""
+Import a watch/rating history CSV into a user's profile.
+
+    python -m app.jobs.import_history --uid abc123 letterboxd/ratings.csv
+    python -m app.jobs.import_history --uid abc123 ml/ratings.csv --links ml/links.csv --movielens-user 42
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.services.history_import import IMPORT_CHUNK_SIZE, ImportFormatError, import_history, parse_rows, read_links
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a MovieLens or Letterboxd ratings export")
+    parser.add_argument("path", help="ratings CSV")
+    parser.add_argument("--uid", required=True, help="Profile to import into")
+    parser.add_argument("--links", help="MovieLens links.csv, for ratings that only have movieId")
+    parser.add_argument("--movielens-user", help="Only import rows with this MovieLens userId")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from app.services.profile_store import profile_store
+    from app.services.tmdb_client import async_tmdb_client
+    if not profile_store:
+        raise SystemExit("Profile store not initialized")
+    if os.getenv("PROFILE_STORE", "firestore").lower() == "memory":
+        raise SystemExit("PROFILE_STORE=memory is per-process; use sqlite or firestore")
+    if profile_store.get_profile(args.uid) is None:
+        raise SystemExit(f"No profile for {args.uid}")
+
+    links = read_links(args.links) if args.links else None
+
+    async def run():
+        try:
+            with open(args.path, newline="", encoding="utf-8-sig") as f:
+                rows = parse_rows(f, links=links, user=args.movielens_user)
+                return await import_history(profile_store, args.uid, rows, chunk_size=args.chunk_size)
+        finally:
+            await async_tmdb_client.aclose()
+
+    started = time.perf_counter()
+    try:
+        stats = asyncio.run(run())
+    except ImportFormatError as e:
+        raise SystemExit(str(e))
+    print(
+        f"Imported {stats['rows']} rows in {time.perf_counter() - started:.1f}s: "
+        f"{stats['liked']} liked, {stats['disliked']} disliked, {stats['neutral']} neutral, "
+        f"{stats['unresolved']} unresolved"
+    )
+
+
+if __name__ == "__main__":
+    main()
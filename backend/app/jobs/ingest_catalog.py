@@ -0,0 +1,126 @@
+"""
+Build or incrementally refresh the local movie catalog.
+
+    python -m app.jobs.ingest_catalog --pages 50
+    python -m app.jobs.ingest_catalog --refresh
+"""
+import argparse
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Set
+
+from app.services.cache import TMDBResponseCache
+from app.services.catalog_store import CatalogStore, write_catalog
+from app.services.similarity_index import save_catalog_similarity
+from app.services.tmdb_client import AsyncTMDBClient
+from app.services.tmdb_scheduler import INGEST, tmdb_priority
+
+FETCH_CHUNK = 200
+MAX_CHANGES_WINDOW = 14  # days, TMDB limit for /movie/changes
+
+
+async def collect_catalog_ids(client: AsyncTMDBClient, pages: int, ids_file: str = None) -> List[int]:
+    """Catalog definition: the first N popular pages plus any ids listed in a file"""
+    results = await asyncio.gather(
+        *(client.get_popular_movies(page=page, min_rating=0) for page in range(1, pages + 1)),
+        return_exceptions=True,
+    )
+    ids = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error fetching popular page: {result}")
+            continue
+        ids.extend(m["id"] for m in result)
+
+    if ids_file:
+        with open(ids_file) as f:
+            ids.extend(int(line) for line in f if line.strip())
+    return list(dict.fromkeys(ids))
+
+
+async def get_changed_ids(client: AsyncTMDBClient, since: date) -> Set[int]:
+    """Ids TMDB reports as changed since a date, walking 14-day windows"""
+    changed = set()
+    start = since
+    today = date.today()
+    while start <= today:
+        end = min(start + timedelta(days=MAX_CHANGES_WINDOW - 1), today)
+        page, total_pages = 1, 1
+        while page <= total_pages:
+            data = await client._make_request("movie/changes", {
+                "start_date": start.isoformat(),
+                "end_date": end.isoformat(),
+                "page": page,
+            })
+            changed.update(r["id"] for r in data.get("results", []))
+            total_pages = data.get("total_pages", 1)
+            page += 1
+        start = end + timedelta(days=1)
+    return changed
+
+
+async def fetch_details(client: AsyncTMDBClient, movie_ids: List[int]) -> Dict[int, Dict]:
+    details = {}
+    for i in range(0, len(movie_ids), FETCH_CHUNK):
+        chunk = movie_ids[i:i + FETCH_CHUNK]
+        details.update(await client.get_movies_details(chunk))
+        print(f"Fetched {min(i + FETCH_CHUNK, len(movie_ids))}/{len(movie_ids)} movies")
+    return details
+
+
+async def ingest(path: str, pages: int, ids_file: str = None, refresh: bool = False, concurrency: int = 10):
+    # Details must come from TMDB, not from a possibly stale response cache
+    client = AsyncTMDBClient(cache=TMDBResponseCache(disk_path=None), max_concurrency=concurrency)
+    store = CatalogStore(path)
+    store.reload_if_changed(force=True)
+    today = date.today().isoformat()
+
+    try:
+        catalog_ids = await collect_catalog_ids(client, pages, ids_file)
+
+        if refresh and store.available:
+            existing = {int(movie_id) for movie_id in store.ids}
+            since = datetime.strptime(store.manifest["refreshed_at"], "%Y-%m-%d").date()
+            changed = await get_changed_ids(client, since) & existing
+            new_ids = [movie_id for movie_id in catalog_ids if movie_id not in existing]
+            to_fetch = sorted(changed) + new_ids
+            print(f"Refreshing {len(changed)} changed and {len(new_ids)} new movies")
+
+            fetched = await fetch_details(client, to_fetch)
+            movies = (
+                fetched.get(int(movie_id)) or store.get_movie_details(int(movie_id))
+                for movie_id in store.ids
+            )
+            new_movies = (fetched[movie_id] for movie_id in new_ids if movie_id in fetched)
+            version = write_catalog(path, list(movies) + list(new_movies), refreshed_at=today)
+        else:
+            print(f"Building catalog from {len(catalog_ids)} movies")
+            fetched = await fetch_details(client, catalog_ids)
+            version = write_catalog(path, fetched.values(), refreshed_at=today)
+    finally:
+        await client.aclose()
+
+    # Precompute MinHash signatures and neighbour lists so workers load the similarity index warm
+    store.reload_if_changed(force=True)
+    save_catalog_similarity(store)
+    print(f"Published catalog version {version} to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest TMDB movies into the local catalog")
+    parser.add_argument("--path", default=os.getenv("CATALOG_PATH", "./data/catalog"))
+    parser.add_argument("--pages", type=int, default=int(os.getenv("CATALOG_PAGES", "25")),
+                        help="Number of TMDB popular pages that define the catalog")
+    parser.add_argument("--ids-file", help="Extra movie ids to include, one per line")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Only re-fetch movies changed since the last ingest, plus new ones")
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    with tmdb_priority(INGEST):
+        asyncio.run(ingest(args.path, args.pages, args.ids_file, args.refresh, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
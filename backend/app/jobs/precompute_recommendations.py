@@ -0,0 +1,93 @@
+"""
+Precompute top-K recommendations for every user and store them on the
+profile, where the online endpoint serves them while the profile version
+is unchanged.
+
+    python -m app.jobs.precompute_recommendations --workers 4
+    python -m app.jobs.precompute_recommendations --top-k 100 --shard-size 512
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+
+from app.services.batch_recommender import PRECOMPUTE_TOP_K
+
+
+def run_shard(uids: List[str], top_k: int, item_cf_path: str) -> Tuple[int, int]:
+    """Score one shard of users in a worker process; returns (stored, skipped)"""
+    # Imported here so each worker builds its own store and HTTP clients
+    from app.services.batch_recommender import recommend_many, save_precomputed
+    from app.services.item_cf import item_cf
+    from app.services.profile_store import profile_store
+    from app.services.tmdb_client import async_tmdb_client
+    from app.services.tmdb_scheduler import BACKGROUND, tmdb_priority
+
+    # Workers are reused across shards; load the parent's CF snapshot once
+    if not item_cf.ready:
+        item_cf.load(item_cf_path)
+
+    async def score():
+        try:
+            profiles = profile_store.get_profiles(uids)
+            return profiles, await recommend_many(profiles, top_k=top_k)
+        finally:
+            await async_tmdb_client.aclose()
+
+    with tmdb_priority(BACKGROUND):
+        profiles, results = asyncio.run(score())
+    stored = 0
+    for uid, recommendations in results.items():
+        version = profiles[uid].get("profile_version", 0)
+        if recommendations and save_precomputed(profile_store, uid, version, recommendations):
+            stored += 1
+    return stored, len(uids) - stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-K recommendations for all users")
+    parser.add_argument("--top-k", type=int, default=PRECOMPUTE_TOP_K)
+    parser.add_argument("--shard-size", type=int, default=256, help="Users scored per matrix product")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    from app.services.profile_store import profile_store
+    if not profile_store:
+        raise SystemExit("Profile store not initialized")
+    if os.getenv("PROFILE_STORE", "firestore").lower() == "memory":
+        raise SystemExit("PROFILE_STORE=memory is per-process; use sqlite or firestore")
+
+    from app.services.item_cf import ITEM_CF_PATH, item_cf
+    started = time.perf_counter()
+    item_cf.build(profile_store)
+    item_cf.save(ITEM_CF_PATH)
+    print(f"Built item-item CF from {item_cf.interactions} interactions in {time.perf_counter() - started:.1f}s")
+
+    uids = [profile["uid"] for profile in profile_store.iter_profiles() if profile.get("uid")]
+    shards = [uids[i:i + args.shard_size] for i in range(0, len(uids), args.shard_size)]
+    print(f"Precomputing top-{args.top_k} for {len(uids)} users in {len(shards)} shards")
+
+    started = time.perf_counter()
+    stored = skipped = 0
+    # Spawn, not fork: children must not share the parent's store connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+        futures = [pool.submit(run_shard, shard, args.top_k, ITEM_CF_PATH) for shard in shards]
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                shard_stored, shard_skipped = future.result()
+            except Exception as e:
+                print(f"Error precomputing shard: {e}")
+                continue
+            stored += shard_stored
+            skipped += shard_skipped
+            print(f"Finished {done}/{len(shards)} shards")
+
+    print(f"Stored {stored} lists, skipped {skipped} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
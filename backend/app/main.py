@@ -1,12 +1,75 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import movies, users, recommendations, feedback
-import uvicorn
+from app.services.tmdb_client import default_tmdb_cache, tmdb_client, async_tmdb_client
+from app.services.cache_warmer import WARMER_ENABLED, cache_warmer
+from app.services.candidate_index import candidate_index
+from app.services.catalog_store import catalog_store
+from app.services.feedback_queue import feedback_queue
+from app.services.item_cf import item_cf
+from app.services.matrix_factorization import mf_model
+from app.services.metrics import registry
+from app.services.profile_store import profile_store
+from app.services.profiler import PROFILER_ENABLED, sampling_profiler
+from app.services.recommendation_cache import recommendation_cache
+from app.services.search_index import search_index
+from app.services.similarity_index import similarity_index
+from app.services.tmdb_scheduler import tmdb_scheduler
+from app.services.warmup import warmup
+
+background_tasks = []
+
+async def warm_up():
+    """Everything a request would otherwise pay for on first use, built once"""
+    warmup.begin()
+    # Firebase / SQLite connection, before the feedback worker needs it
+    await warmup.step("profile_store", profile_store.init)
+    await feedback_queue.start()
+    # SQLite response cache and the host-wide shared details cache
+    await warmup.step("tmdb_cache", default_tmdb_cache)
+    # Replay the interactions log off the request path; CF scores fall back
+    # to popularity until it's done
+    if profile_store:
+        background_tasks.append(asyncio.create_task(asyncio.to_thread(item_cf.build, profile_store)))
+    await warmup.step("catalog", lambda: catalog_store.reload_if_changed(force=True))
+    if catalog_store.available:
+        await warmup.step("candidate_index", candidate_index.ensure_built)
+        await warmup.step("similarity_index", similarity_index.ensure_built)
+    # Index persisted and catalog titles before the first keystroke arrives
+    await warmup.step("search_index", search_index.ensure_loaded)
+    await warmup.step("matrix_factorization", lambda: mf_model.reload_if_changed(force=True))
+    if WARMER_ENABLED:
+        await cache_warmer.start()
+    warmup.finish()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve /health straight away; /ready flips once warm-up has finished
+    warm_up_task = asyncio.create_task(warm_up())
+    if PROFILER_ENABLED:
+        sampling_profiler.start()
+    yield
+    warm_up_task.cancel()
+    await asyncio.gather(warm_up_task, return_exceptions=True)
+    sampling_profiler.stop()
+    await cache_warmer.stop()
+    item_cf.cancel_build()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    # Apply queued feedback before the worker exits
+    await feedback_queue.stop()
+    await search_index.wait_for_save()
+    search_index.save_if_dirty()
+    # Release pooled TMDB connections on shutdown
+    await async_tmdb_client.aclose()
 
 app = FastAPI(
     title="CineMatch API",
     description="Intelligent movie recommendation engine",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -18,6 +81,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Point-in-time gauges read at scrape time
+registry.gauge("cinematch_feedback_queue_depth", "Feedback events waiting to be applied", lambda: feedback_queue.depth)
+registry.gauge("cinematch_tmdb_cache_memory_entries", "Entries in the in-memory TMDB cache",
+               lambda: tmdb_client.cache.memory.stats()["size"])
+registry.gauge("cinematch_recommendation_cache_entries", "Cached recommendation responses",
+               lambda: recommendation_cache.stats()["size"])
+registry.gauge("cinematch_tmdb_scheduler_queue_depth", "TMDB calls waiting for a rate-limit token, by priority class",
+               tmdb_scheduler.depth, labelname="priority")
+registry.gauge("cinematch_search_index_titles", "Titles in the local search index", lambda: len(search_index))
+registry.gauge("cinematch_item_cf_neighbours", "Stored item-item similarities", lambda: item_cf.similarity.nnz)
+
 # Include routers
 app.include_router(movies.router)
 app.include_router(users.router)
@@ -34,7 +108,33 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "tmdb_cache": tmdb_client.cache.stats(),
+        "tmdb_singleflight": {
+            "sync": tmdb_client.flights.stats(),
+            "async": async_tmdb_client.flights.stats(),
+        },
+        "cache_warmer": cache_warmer.last_cycle,
+        "item_cf": item_cf.stats(),
+        "matrix_factorization": mf_model.stats(),
+        "warmup": warmup.stats(),
+    }
+
+@app.get("/ready")
+def readiness_check():
+    """503 until the lifespan warm-up has run, for load-balancer readiness probes"""
+    return JSONResponse(warmup.stats(), status_code=200 if warmup.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profile", response_class=PlainTextResponse)
+def profile(reset: bool = False):
+    """Collapsed stacks from the sampling profiler (ENABLE_SAMPLING_PROFILER=1)"""
+    return PlainTextResponse(sampling_profiler.collapsed(reset=reset))
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,28 +1,55 @@
+import asyncio
 from fastapi import APIRouter, Query
-from app.services.tmdb_client import tmdb_client
+from app.services.tmdb_client import async_tmdb_client
+from app.services.metrics import SEARCH_REQUESTS
+from app.services.search_index import search_index, SEARCH_INDEX_SAVE_EVERY, SEARCH_MIN_LOCAL_RESULTS
+from app.services.movie_data import get_movie_details as resolve_movie_details, get_movies_details
+from app.services.similarity_index import similarity_index
 
 router = APIRouter(prefix="/api/movies", tags=["movies"])
 
 @router.get("/popular")
 async def get_popular_movies(page: int = Query(1, ge=1), min_rating: float = Query(6.5, ge=0, le=10)):
     """Get popular movies with optional filters"""
-    movies = tmdb_client.get_popular_movies(page=page, min_rating=min_rating)
+    movies = await async_tmdb_client.get_popular_movies(page=page, min_rating=min_rating)
+    search_index.add_many(movies)
     return {"movies": movies, "page": page}
 
 @router.get("/search")
 async def search_movies(q: str = Query(..., min_length=1), page: int = Query(1, ge=1)):
-    """Search for movies by title"""
-    movies = tmdb_client.search_movies(query=q, page=page)
+    """Search for movies by title, from the local index when it has enough matches"""
+    if page == 1:
+        movies = search_index.search(q)
+        if len(movies) >= SEARCH_MIN_LOCAL_RESULTS:
+            SEARCH_REQUESTS.inc(source="local")
+            return {"movies": movies, "query": q, "page": page}
+    
+    SEARCH_REQUESTS.inc(source="tmdb")
+    movies = await async_tmdb_client.search_movies(query=q, page=page)
+    search_index.add_many(movies)
+    search_index.save_in_background(SEARCH_INDEX_SAVE_EVERY)
     return {"movies": movies, "query": q, "page": page}
 
 @router.get("/{movie_id}")
 async def get_movie_details(movie_id: int):
     """Get detailed information about a specific movie"""
-    movie = tmdb_client.get_movie_details(movie_id)
+    movie = await async_tmdb_client.get_movie_details(movie_id)
     return movie
 
+@router.get("/{movie_id}/similar")
+async def get_similar_movies(movie_id: int, limit: int = Query(20, ge=1, le=50)):
+    """Get movies with the most similar content ("more like this")"""
+    await asyncio.to_thread(similarity_index.ensure_built)
+    if movie_id not in similarity_index:
+        similarity_index.add_movie(await resolve_movie_details(movie_id))
+    
+    similar_ids = await asyncio.to_thread(similarity_index.similar_to, [movie_id], limit)
+    details = await get_movies_details(similar_ids)
+    movies = [details[i] for i in similar_ids if i in details]
+    return {"movies": movies, "movie_id": movie_id}
+
 @router.get("/genres/list")
 async def get_genres():
     """Get all available movie genres"""
-    genres = tmdb_client.get_genres()
+    genres = await async_tmdb_client.get_genres()
     return {"genres": genres}
@@ -1,84 +1,350 @@
+import asyncio
+import json
+import os
+import numpy as np
 from fastapi import APIRouter, HTTPException, Query
-from app.services.recommendation_engine import calculate_final_score
-from app.services.tmdb_client import tmdb_client
-from app.services.ml_recommender import (
-    add_exploration_diversity,
-    apply_collaborative_signal,
-    diversity_filter
-)
-from typing import List
-import firebase_admin
-from firebase_admin import firestore
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.services.recommendation_engine import score_movies
+from app.services.movie_data import get_candidate_movies, get_movies_details, movie_summary
+from app.services.candidate_index import candidate_index, CANDIDATE_POOL_SIZE
+from app.services.catalog_store import catalog_store
+from app.services.similarity_index import similarity_index
+from app.services.recommendation_cache import recommendation_cache, exploration_seed
+from app.services.ranked_pool import RankedPool, ranked_pools, encode_cursor, decode_cursor
+from app.services.ml_recommender import apply_collaborative_signal, collaborative_scores, feature_ids, mmr_rerank
+from app.services.batch_recommender import fresh_precomputed, recommend_many
+from app.services.cache_warmer import cache_warmer
+from app.services.profile_store import profile_store
+from app.services.metrics import timed
+from typing import Dict, List, Optional
 
 router = APIRouter(prefix="/api/recommendations", tags=["recommendations"])
 
-db = firestore.client() if firebase_admin._apps else None
+SIMILAR_POOL_SIZE = 50
+# Candidate batches (catalog pool multiples or TMDB popular pages) a ranking may grow to
+MAX_POOL_DEPTH = 10
+TMDB_PAGE_SIZE = 20
+MAX_BATCH_USERS = 500
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "50"))
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+class BatchRecommendationRequest(BaseModel):
+    uids: List[str]
+    limit: int = 20
+
+def _scored(movie: dict, movie_details: dict, score: float) -> dict:
+    return {
+        "movie": movie,
+        "score": score,
+        "details": {
+            "genres": [g["name"] for g in movie_details.get("genres", [])],
+            "actors": [a["name"] for a in movie_details.get("credits", {}).get("cast", [])[:3]],
+        }
+    }
+
+def _with_features(scored_movies: List[dict]) -> List[dict]:
+    """Intern each row's features once, so every re-rank of them reuses the ids"""
+    for rec, ids in zip(scored_movies, feature_ids([rec["details"] for rec in scored_movies])):
+        rec["feature_ids"] = ids
+    return scored_movies
+
+async def _retrieve_candidates(user_profile: dict, depth: int = 1):
+    """
+    Candidate movies in retrieval order for a ranking built from `depth`
+    candidate batches, plus whether the source has nothing further
+    """
+    favorite_movie_ids = [m["id"] for m in user_profile.get("favorite_movies", [])]
+    
+    # Get candidate movies: retrieve from the catalog's inverted indexes when
+    # available, else pool TMDB's popular pages 1..depth
+    with timed("candidate_fetch"):
+        if candidate_index.available:
+            limit = CANDIDATE_POOL_SIZE * depth
+            candidate_ids = candidate_index.retrieve(
+                user_profile,
+                favorite_movie_ids,
+                limit=limit,
+                min_rating=6.0
+            )
+            exhausted = len(candidate_ids) < limit
+            # Blend in nearest neighbours of the favorites' content vectors
+            neighbour_ids = await asyncio.to_thread(similarity_index.similar_to, favorite_movie_ids, SIMILAR_POOL_SIZE)
+            candidate_ids = list(dict.fromkeys(candidate_ids + neighbour_ids))
+            candidates = [
+                m for m in map(catalog_store.get_movie, candidate_ids)
+                if m is not None and m["vote_average"] >= 6.0
+            ]
+            return candidates, exhausted
+        
+        pages = await asyncio.gather(
+            *(get_candidate_movies(page=page, min_rating=6.0) for page in range(1, depth + 1))
+        )
+        popular_movies = list({m["id"]: m for page in pages for m in page}.values())
+        candidates = [m for m in popular_movies if m["id"] not in favorite_movie_ids]
+        return candidates, not pages[-1]
+
+def _score_batch(
+    user_profile: dict,
+    candidates: List[dict],
+    details_by_id: Dict[int, dict],
+    favorite_details: List[dict]
+) -> List[dict]:
+    """Score candidates whose details resolved; others are dropped"""
+    candidates = [m for m in candidates if m["id"] in details_by_id]
+    candidate_details = [details_by_id[m["id"]] for m in candidates]
+    
+    # Score all candidates in one batch
+    with timed("score"):
+        base_scores = score_movies(user_profile, candidate_details, favorite_details)
+    
+    # Apply collaborative signal
+    with timed("collaborative"):
+        final_scores = apply_collaborative_signal(
+            np.asarray(base_scores, dtype=np.float64),
+            collaborative_scores([user_profile], candidates)[0]
+        )
+    
+    return _with_features([
+        _scored(movie, movie_details, float(final_score))
+        for movie, movie_details, final_score in zip(candidates, candidate_details, final_scores)
+    ])
+
+async def _score_candidates(user_profile: dict, depth: int = 1):
+    """Retrieve and score candidates online; returns (scored movies, exhausted)"""
+    candidates, exhausted = await _retrieve_candidates(user_profile, depth)
+    favorite_movie_ids = [m["id"] for m in user_profile.get("favorite_movies", [])]
+    
+    # Fetch candidate and favorite details concurrently
+    with timed("detail_fetch"):
+        details_by_id = await get_movies_details(
+            [m["id"] for m in candidates] + favorite_movie_ids
+        )
+    favorite_details = [details_by_id[i] for i in favorite_movie_ids if i in details_by_id]
+    return _score_batch(user_profile, candidates, details_by_id, favorite_details), exhausted
+
+def _rank(scored_movies: List[dict], seed: Optional[int] = None) -> List[dict]:
+    """Re-rank for diversity (MMR) and, when seeded, fill exploration slots"""
+    with timed("rerank"):
+        return mmr_rerank(scored_movies, seed=seed)
+
+def _response(recommendations: List[dict], page: int) -> dict:
+    # feature_ids are process-local interned ids, not part of the API
+    return {
+        "recommendations": [{key: rec[key] for key in ("movie", "score", "details")} for rec in recommendations],
+        "total": len(recommendations),
+        "page": page
+    }
+
+def _frame(kind: str, payload: dict, stream_format: str) -> str:
+    data = json.dumps({"type": kind, **payload})
+    if stream_format == "sse":
+        return f"event: {kind}\ndata: {data}\n\n"
+    return data + "\n"
+
+async def _precomputed_candidates(items: List[dict]) -> List[dict]:
+    """Scored movies from a precomputed top-k list"""
+    with timed("detail_fetch"):
+        details_by_id = await get_movies_details([item["id"] for item in items])
+    return _with_features([
+        _scored(movie_summary(details_by_id[item["id"]]), details_by_id[item["id"]], item["score"])
+        for item in items if item["id"] in details_by_id
+    ])
+
+def _store_pool(
+    uid: str,
+    version: int,
+    ranked: List[dict],
+    depth: int,
+    exhausted: bool,
+    base: Optional[RankedPool] = None
+) -> RankedPool:
+    movie_ids = [rec["movie"]["id"] for rec in ranked]
+    scores = [rec["score"] for rec in ranked]
+    exhausted = exhausted or depth >= MAX_POOL_DEPTH
+    if base is None:
+        pool = RankedPool(uid, version, movie_ids, scores, depth, exhausted)
+    else:
+        pool = base.extended(movie_ids, scores, depth, exhausted)
+    ranked_pools.put(pool)
+    return pool
+
+def _depth_for(needed: int) -> int:
+    """Candidate batches expected to rank at least `needed` movies"""
+    per_batch = CANDIDATE_POOL_SIZE if candidate_index.available else TMDB_PAGE_SIZE
+    return min(MAX_POOL_DEPTH, max(1, -(-needed // per_batch)))
+
+async def _ensure_pool(uid: str, user_profile: dict, pool: Optional[RankedPool], needed: int) -> RankedPool:
+    """
+    The user's ranked pool covering at least `needed` entries (or all there
+    are). Built lazily: from a fresh precomputed list if there is one, and
+    deepened with more candidates only when a page runs past its end.
+    """
+    version = user_profile.get("profile_version", 0)
+    seed = exploration_seed(uid, version)
+    if pool is None:
+        precomputed = fresh_precomputed(user_profile)
+        if precomputed is not None:
+            ranked = _rank(await _precomputed_candidates(precomputed), seed=seed)
+            pool = _store_pool(uid, version, ranked, depth=0, exhausted=False)
+    
+    while pool is None or (len(pool) < needed and not pool.exhausted):
+        # Go straight to the depth a deep offset needs, doubling if filtering
+        # still leaves it short, so each scoring pass isn't one batch deeper
+        depth = min(MAX_POOL_DEPTH, max(_depth_for(needed), 2 * pool.depth if pool is not None else 1))
+        scored_movies, exhausted = await _score_candidates(user_profile, depth)
+        pool = _store_pool(uid, version, _rank(scored_movies, seed=seed), depth, exhausted, base=pool)
+    return pool
+
+async def _serve_page(pool: RankedPool, offset: int, limit: int, page: int) -> dict:
+    """Resolve one page of a pool, with the cursor for the next one"""
+    items = pool.page(offset, limit)
+    with timed("detail_fetch"):
+        details_by_id = await get_movies_details([movie_id for movie_id, _ in items])
+    recommendations = [
+        _scored(movie_summary(details_by_id[movie_id]), details_by_id[movie_id], score)
+        for movie_id, score in items if movie_id in details_by_id
+    ]
+    response = _response(recommendations, page)
+    next_offset = offset + limit
+    has_more = next_offset < len(pool) or not pool.exhausted
+    response["next_cursor"] = encode_cursor(pool.pool_id, next_offset) if has_more else None
+    return response
+
+@router.post("/batch")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """Top recommendations for many users, scored against one shared candidate set"""
+    if not profile_store:
+        raise HTTPException(status_code=503, detail="Profile store not initialized")
+    if len(request.uids) > MAX_BATCH_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_USERS} uids per request")
+    if not 1 <= request.limit <= 50:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 50")
+    
+    profiles = profile_store.get_profiles(request.uids)
+    results = await recommend_many(profiles, top_k=request.limit)
+    return {
+        "results": results,
+        "missing": [uid for uid in request.uids if uid not in profiles]
+    }
 
 @router.get("/{uid}")
 async def get_recommendations(
     uid: str,
     limit: int = Query(20, ge=1, le=50),
-    page: int = Query(1, ge=1)
+    page: int = Query(1, ge=1),
+    cursor: Optional[str] = None
 ):
-    """Get personalized movie recommendations for a user"""
-    if not db:
-        raise HTTPException(status_code=503, detail="Firestore not initialized")
+    """
+    Get personalized movie recommendations for a user. Pages (or the
+    next_cursor of a previous response) walk one ranked pool per profile
+    version instead of re-scoring for every page.
+    """
+    if not profile_store:
+        raise HTTPException(status_code=503, detail="Profile store not initialized")
     
     # Get user profile
-    profile_doc = db.collection("user_profiles").document(uid).get()
-    if not profile_doc.exists:
+    user_profile = profile_store.get_profile(uid)
+    if user_profile is None:
         raise HTTPException(status_code=404, detail="User profile not found")
+    cache_warmer.note_profile(user_profile)
     
-    user_profile = profile_doc.to_dict()
-    favorite_movie_ids = [m["id"] for m in user_profile.get("favorite_movies", [])]
+    version = user_profile.get("profile_version", 0)
+    if cursor is not None:
+        try:
+            pool_id, offset = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        page = offset // limit + 1
+        pool = ranked_pools.get(pool_id)
+        if pool is None or pool.uid != uid or pool.version != version:
+            # Expired, or the profile changed since: rank again for this version
+            pool = ranked_pools.for_profile(uid, version)
+    else:
+        cached = recommendation_cache.get(uid, version, page, limit)
+        if cached is not None:
+            return cached
+        offset = (page - 1) * limit
+        pool = ranked_pools.for_profile(uid, version)
     
-    # Get candidate movies
-    popular_movies = tmdb_client.get_popular_movies(page=page, min_rating=6.0)
+    pool = await _ensure_pool(uid, user_profile, pool, offset + limit)
+    response = await _serve_page(pool, offset, limit, page)
+    if cursor is None:
+        recommendation_cache.set(uid, version, page, limit, response)
+    return response
+
+async def _stream_frames(uid: str, user_profile: dict, page: int, limit: int, stream_format: str):
+    """provisional (optional) -> refined per scored batch -> complete"""
+    version = user_profile.get("profile_version", 0)
+    cached = recommendation_cache.get(uid, version, page, limit)
+    if cached is not None:
+        yield _frame("complete", cached, stream_format)
+        return
     
-    # Score each movie
-    scored_movies = []
-    for movie in popular_movies:
-        # Skip if already in favorites
-        if movie["id"] in favorite_movie_ids:
-            continue
+    offset = (page - 1) * limit
+    pool = ranked_pools.for_profile(uid, version)
+    if pool is None and fresh_precomputed(user_profile) is None:
+        # A stale precomputed list is still a good first paint
+        stale = (user_profile.get("precomputed_recommendations") or {}).get("items") or []
+        if len(stale) > offset:
+            provisional = await _precomputed_candidates(stale[offset:offset + limit])
+            yield _frame("provisional", _response(_rank(provisional), page), stream_format)
+        
+        candidates, exhausted = await _retrieve_candidates(user_profile)
+        favorite_movie_ids = [m["id"] for m in user_profile.get("favorite_movies", [])]
+        with timed("detail_fetch"):
+            favorite_by_id = await get_movies_details(favorite_movie_ids)
+        favorite_details = [favorite_by_id[i] for i in favorite_movie_ids if i in favorite_by_id]
+        
+        chunks = [candidates[i:i + STREAM_BATCH_SIZE] for i in range(0, len(candidates), STREAM_BATCH_SIZE)]
         
+        async def fetch(index: int):
+            return index, await get_movies_details([m["id"] for m in chunks[index]])
+        
+        # Score chunks as their details arrive; keep results in retrieval order
+        # so ties rank exactly as in the non-streaming endpoint
+        scored_chunks: List[Optional[List[dict]]] = [None] * len(chunks)
+        tasks = [asyncio.create_task(fetch(i)) for i in range(len(chunks))]
         try:
-            # Get full details for scoring
-            movie_details = tmdb_client.get_movie_details(movie["id"])
-            base_score = calculate_final_score(user_profile, movie_details, favorite_movie_ids)
-            
-            # Apply collaborative signal
-            final_score = apply_collaborative_signal(
-                base_score,
-                movie.get("popularity", 0)
-            )
-            
-            scored_movies.append({
-                "movie": movie,
-                "score": final_score,
-                "details": {
-                    "genres": [g["name"] for g in movie_details.get("genres", [])],
-                    "actors": [a["name"] for a in movie_details.get("credits", {}).get("cast", [])[:3]],
-                }
-            })
-        except Exception as e:
-            print(f"Error scoring movie {movie['id']}: {e}")
-            continue
-    
-    # Sort by score
-    scored_movies.sort(key=lambda x: x["score"], reverse=True)
-    
-    # Apply diversity filter
-    diverse_recs = diversity_filter(scored_movies)
+            for next_done in asyncio.as_completed(tasks):
+                index, details_by_id = await next_done
+                scored_chunks[index] = _score_batch(user_profile, chunks[index], details_by_id, favorite_details)
+                partial = [m for chunk in scored_chunks if chunk for m in chunk]
+                frame = _response(_rank(partial)[offset:offset + limit], page)
+                frame.update({"scored": len(partial), "candidates": len(candidates)})
+                yield _frame("refined", frame, stream_format)
+        finally:
+            # Client went away mid-stream
+            for task in tasks:
+                task.cancel()
+        
+        scored_movies = [m for chunk in scored_chunks if chunk for m in chunk]
+        ranked = _rank(scored_movies, seed=exploration_seed(uid, version))
+        pool = _store_pool(uid, version, ranked, depth=1, exhausted=exhausted)
     
-    # Apply exploration/exploitation
-    final_recs = add_exploration_diversity(diverse_recs)
+    pool = await _ensure_pool(uid, user_profile, pool, offset + limit)
+    response = await _serve_page(pool, offset, limit, page)
+    recommendation_cache.set(uid, version, page, limit, response)
+    yield _frame("complete", response, stream_format)
+
+@router.get("/{uid}/stream")
+async def stream_recommendations(
+    uid: str,
+    limit: int = Query(20, ge=1, le=50),
+    page: int = Query(1, ge=1),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$")
+):
+    """Stream recommendations as NDJSON or Server-Sent Events frames"""
+    if not profile_store:
+        raise HTTPException(status_code=503, detail="Profile store not initialized")
     
-    # Limit results
-    top_recommendations = final_recs[:limit]
+    user_profile = profile_store.get_profile(uid)
+    if user_profile is None:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    cache_warmer.note_profile(user_profile)
     
-    return {
-        "recommendations": top_recommendations,
-        "total": len(top_recommendations),
-        "page": page
-    }
+    return StreamingResponse(
+        _stream_frames(uid, user_profile, page, limit, format),
+        media_type=STREAM_MEDIA_TYPES[format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
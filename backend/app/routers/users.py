@@ -1,22 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from app.models.user_profile import ProfileCreateRequest, UserProfile
 from app.services.feature_extractor import build_user_profile
+from app.services.history_import import ImportFormatError, aiter_lines, aparse_rows, import_history
+from app.services.profile_store import profile_store
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
-import os
+import time
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
-# Initialize Firebase Admin SDK
-if not firebase_admin._apps:
-    cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "./serviceAccountKey.json")
-    if os.path.exists(cred_path):
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-
-db = firestore.client() if firebase_admin._apps else None
-
 @router.post("/profile")
 async def create_user_profile(request: ProfileCreateRequest):
     """Create user profile from onboarding data"""
@@ -37,13 +28,14 @@ async def create_user_profile(request: ProfileCreateRequest):
             "preferred_actors": request.preferred_actors,
             "genre_weights": profile["genre_weights"],
             "actor_weights": profile["actor_weights"],
-            "created_at": firestore.SERVER_TIMESTAMP,
-            "updated_at": firestore.SERVER_TIMESTAMP,
+            # Millisecond clock so a re-created profile never reuses an old
+            # version; feedback increments it from here
+            "profile_version": time.time_ns() // 1_000_000,
         }
         
-        # Store in Firestore
-        if db:
-            db.collection("user_profiles").document(request.uid).set(profile_data)
+        # Store profile
+        if profile_store:
+            profile_store.set_profile(request.uid, profile_data)
         
         return {"message": "Profile created successfully", "profile": profile_data}
     except Exception as e:
@@ -52,11 +44,28 @@ async def create_user_profile(request: ProfileCreateRequest):
 @router.get("/{uid}/profile")
 async def get_user_profile(uid: str):
     """Get user profile by UID"""
-    if not db:
-        raise HTTPException(status_code=503, detail="Firestore not initialized")
+    if not profile_store:
+        raise HTTPException(status_code=503, detail="Profile store not initialized")
     
-    doc = db.collection("user_profiles").document(uid).get()
-    if not doc.exists:
+    profile = profile_store.get_profile(uid)
+    if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    return doc.to_dict()
+    return profile
+
+@router.post("/{uid}/import")
+async def import_watch_history(uid: str, request: Request):
+    """
+    Import a MovieLens or Letterboxd ratings CSV sent as the request body.
+    The upload is parsed and applied in chunks as it arrives.
+    """
+    if not profile_store:
+        raise HTTPException(status_code=503, detail="Profile store not initialized")
+    
+    if profile_store.get_profile(uid) is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    try:
+        return await import_history(profile_store, uid, aparse_rows(aiter_lines(request.stream())))
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.candidate_index import candidate_index, CANDIDATE_POOL_SIZE
+from app.services.catalog_store import catalog_store
+from app.services.metrics import timed
+from app.services.ml_recommender import apply_collaborative_signal, collaborative_scores
+from app.services.movie_data import get_candidate_movies, get_movies_details
+from app.services.profile_store import ProfileStore
+from app.services.recommendation_engine import score_profiles
+
+PRECOMPUTE_TOP_K = int(os.getenv("PRECOMPUTE_TOP_K", "200"))
+PRECOMPUTE_MAX_AGE = float(os.getenv("PRECOMPUTE_MAX_AGE", "86400"))
+# TMDB popular pages pooled when there is no local catalog
+FALLBACK_PAGES = 5
+
+async def shared_candidates(user_profiles: List[dict], pool_size: int = CANDIDATE_POOL_SIZE) -> List[dict]:
+    """One candidate set covering every profile in the batch"""
+    if candidate_index.available:
+        candidate_ids = []
+        for profile in user_profiles:
+            favorite_ids = [m["id"] for m in profile.get("favorite_movies", [])]
+            candidate_ids.extend(candidate_index.retrieve(profile, favorite_ids, limit=pool_size, min_rating=6.0))
+        movies = map(catalog_store.get_movie, dict.fromkeys(candidate_ids))
+        return [m for m in movies if m is not None and m["vote_average"] >= 6.0]
+
+    pages = await asyncio.gather(
+        *(get_candidate_movies(page=page, min_rating=6.0) for page in range(1, FALLBACK_PAGES + 1)),
+        return_exceptions=True,
+    )
+    movies = {}
+    for page in pages:
+        if isinstance(page, Exception):
+            print(f"Error fetching candidate page: {page}")
+            continue
+        for movie in page:
+            movies.setdefault(movie["id"], movie)
+    return list(movies.values())
+
+
+async def recommend_many(user_profiles: Dict[str, dict], top_k: int = PRECOMPUTE_TOP_K) -> Dict[str, List[dict]]:
+    """
+    Top-k {"movie", "score"} lists per uid, scoring one shared candidate set
+    against every profile in a single matrix product
+    """
+    uids = list(user_profiles)
+    profiles = [user_profiles[uid] for uid in uids]
+    with timed("candidate_fetch"):
+        candidates = await shared_candidates(profiles)
+
+    favorite_ids = list(dict.fromkeys(m["id"] for p in profiles for m in p.get("favorite_movies", [])))
+    with timed("detail_fetch"):
+        details_by_id = await get_movies_details([m["id"] for m in candidates] + favorite_ids)
+    candidates = [m for m in candidates if m["id"] in details_by_id]
+    if not candidates:
+        return {uid: [] for uid in uids}
+
+    with timed("batch_score"):
+        scores = score_profiles(
+            profiles,
+            [details_by_id[m["id"]] for m in candidates],
+            {i: details_by_id[i] for i in favorite_ids if i in details_by_id},
+        )
+        scores = apply_collaborative_signal(scores, collaborative_scores(profiles, candidates))
+
+        # Never recommend a user's own favorites
+        column = {m["id"]: i for i, m in enumerate(candidates)}
+        for row, profile in enumerate(profiles):
+            owned = [column[m["id"]] for m in profile.get("favorite_movies", []) if m["id"] in column]
+            scores[row, owned] = -np.inf
+
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    return {
+        uid: [
+            {"movie": candidates[col], "score": float(score)}
+            for col, score in zip(top[row], top_scores[row])
+            if np.isfinite(score)
+        ]
+        for row, uid in enumerate(uids)
+    }
+
+
+def fresh_precomputed(user_profile: dict, max_age: float = PRECOMPUTE_MAX_AGE) -> Optional[List[dict]]:
+    """Precomputed [{"id", "score"}] list if it was built from the current profile version recently"""
+    precomputed = user_profile.get("precomputed_recommendations")
+    if not precomputed:
+        return None
+    if precomputed.get("profile_version") != user_profile.get("profile_version", 0):
+        return None
+    if time.time() - precomputed.get("computed_at", 0) > max_age:
+        return None
+    return precomputed.get("items")
+
+
+def save_precomputed(store: ProfileStore, uid: str, profile_version: int, recommendations: List[dict]) -> bool:
+    """
+    Store a top-k list on the profile without bumping its version. Skipped
+    if feedback changed the profile while the list was being computed.
+    """
+    items = [{"id": rec["movie"]["id"], "score": round(rec["score"], 6)} for rec in recommendations]
+
+    def mutate(profile: dict) -> Optional[dict]:
+        if profile.get("profile_version", 0) != profile_version:
+            return None
+        return {
+            "precomputed_recommendations": {
+                "profile_version": profile_version,
+                "computed_at": time.time(),
+                "items": items,
+            }
+        }
+
+    return store.modify_profile(uid, mutate, version_increment=0)
@@ -0,0 +1,337 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+from app.services.shared_cache import SharedCache, create_shared_cache
+
+# TTL (seconds) per TMDB endpoint class
+ENDPOINT_TTLS = {
+    "movie_details": 24 * 3600,
+    "popular": 3 * 3600,
+    "genres": 7 * 24 * 3600,
+    "search": 6 * 3600,
+    "default": 3600,
+}
+
+# Movie details are always requested with these, so the id alone is a key
+DETAILS_PARAMS = {"append_to_response": "credits,keywords,external_ids"}
+_DETAILS_ENDPOINT = re.compile(r"movie/(\d+)")
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional per-entry expiry"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return cached value or default, refreshing recency on hit"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Store value, evicting least recently used entries past max_size"""
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def expires_at(self, key) -> Optional[float]:
+        """Expiry of a live entry without touching recency or stats; None if absent or immortal"""
+        entry = self._data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+            return None
+        return entry[1]
+
+    def items(self) -> list:
+        """Live (key, value) pairs, without touching recency or stats"""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, expires_at) in self._data.items()
+                    if expires_at is None or expires_at > now]
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCache:
+    """On-disk JSON cache that survives restarts, evicting by last access"""
+
+    EVICT_EVERY = 100  # writes between eviction sweeps
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def get(self, key: str):
+        """Return (value, expires_at) or None if missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def expires_at(self, key: str) -> Optional[float]:
+        """Expiry of a live entry without touching accessed_at or stats; None if missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, key: str, value, ttl: float):
+        now = time.time()
+        payload = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop expired rows, then the least recently accessed beyond the limit"""
+        cursor = self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        self.evictions += max(cursor.rowcount, 0)
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {
+            "size": size,
+            "max_size": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def endpoint_class(endpoint: str) -> str:
+    """Map a TMDB endpoint path to its TTL class"""
+    if endpoint.startswith("movie/popular"):
+        return "popular"
+    if endpoint.startswith("genre/"):
+        return "genres"
+    if endpoint.startswith("search/"):
+        return "search"
+    if endpoint.startswith("movie/"):
+        return "movie_details"
+    return "default"
+
+
+def make_cache_key(endpoint: str, params: Optional[dict]) -> str:
+    """Stable key for an endpoint and its params, excluding credentials"""
+    items = sorted((k, v) for k, v in (params or {}).items() if k != "api_key")
+    return f"{endpoint}?{urlencode(items)}"
+
+
+class TMDBResponseCache:
+    """
+    Tiered TMDB response cache: a per-process in-memory LRU, then movie
+    details in the host-wide shared-memory cache (so N workers keep one
+    copy and fetch each movie once), then SQLite.
+    """
+
+    def __init__(
+        self,
+        memory_size: int = 2048,
+        disk_path: Optional[str] = None,
+        disk_size: int = 50000,
+        ttls: Optional[Dict[str, float]] = None,
+        shared: Optional[SharedCache] = None,
+    ):
+        self.memory = LRUCache(max_size=memory_size)
+        self.shared = shared
+        self.disk = SQLiteCache(disk_path, max_entries=disk_size) if disk_path else None
+        self.ttls = dict(ENDPOINT_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint_class(endpoint), self.ttls["default"])
+
+    def _shared_key(self, endpoint: str, params: Optional[dict]) -> Optional[int]:
+        """Movie id when the shared tier holds this request (full details), else None"""
+        if self.shared is None or params != DETAILS_PARAMS:
+            return None
+        match = _DETAILS_ENDPOINT.fullmatch(endpoint)
+        return int(match.group(1)) if match else None
+
+    def get(self, endpoint: str, params: Optional[dict] = None):
+        """Return cached response or None"""
+        key = make_cache_key(endpoint, params)
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        shared_key = self._shared_key(endpoint, params)
+        if shared_key is not None:
+            entry = self.shared.get(shared_key)
+            if entry is not None:
+                value, expires_at = entry
+                self.memory.set(key, value, ttl=max(expires_at - time.time(), 1))
+                self.hits += 1
+                return value
+
+        if self.disk is not None:
+            try:
+                entry = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"TMDB disk cache read failed: {e}")
+                entry = None
+            if entry is not None:
+                value, expires_at = entry
+                # Promote to memory (and the shared tier) with the remaining lifetime
+                self.memory.set(key, value, ttl=max(expires_at - time.time(), 1))
+                if shared_key is not None:
+                    self.shared.set(shared_key, value, max(expires_at - time.time(), 1))
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def expires_in(self, endpoint: str, params: Optional[dict] = None) -> Optional[float]:
+        """
+        Seconds until a cached response expires, or None if it isn't cached.
+        Only peeks at each tier: no promotion, recency or hit/miss updates.
+        May query SQLite, so call it off the event loop.
+        """
+        key = make_cache_key(endpoint, params)
+        expires_at = self.memory.expires_at(key)
+        shared_key = self._shared_key(endpoint, params)
+        if expires_at is None and shared_key is not None:
+            # Another worker may already have refreshed it
+            expires_at = self.shared.expires_at(shared_key)
+        if expires_at is None and self.disk is not None:
+            try:
+                expires_at = self.disk.expires_at(key)
+            except sqlite3.Error:
+                expires_at = None
+        return expires_at - time.time() if expires_at is not None else None
+
+    def set(self, endpoint: str, params: Optional[dict], value):
+        key = make_cache_key(endpoint, params)
+        ttl = self.ttl_for(endpoint)
+        self.memory.set(key, value, ttl=ttl)
+        shared_key = self._shared_key(endpoint, params)
+        if shared_key is not None:
+            self.shared.set(shared_key, value, ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, ttl)
+            except sqlite3.Error as e:
+                print(f"TMDB disk cache write failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory": self.memory.stats(),
+            "shared": self.shared.stats() if self.shared is not None else None,
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+def create_tmdb_cache() -> TMDBResponseCache:
+    """Build the TMDB cache from environment configuration"""
+    return TMDBResponseCache(
+        memory_size=int(os.getenv("TMDB_CACHE_MEMORY_SIZE", "2048")),
+        disk_path=os.getenv("TMDB_CACHE_PATH", "./.cache/tmdb_cache.sqlite3") or None,
+        disk_size=int(os.getenv("TMDB_CACHE_DISK_SIZE", "50000")),
+        shared=create_shared_cache("movie_details"),
+    )
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.services.cache import LRUCache
+from app.services.catalog_store import catalog_store
+from app.services.metrics import CACHE_WARMER_FETCHES, ERRORS
+from app.services.tmdb_client import DETAILS_PARAMS, AsyncTMDBClient, async_tmdb_client
+from app.services.tmdb_scheduler import BACKGROUND, TMDBScheduler, tmdb_priority, tmdb_scheduler
+
+
+class CacheWarmer:
+    """
+    Background task that keeps the TMDB response cache warm: popular pages,
+    the genre list, details for the candidate pool and for favorites of
+    recently active users. Entries are fetched when missing and renewed
+    when less than `refresh_ahead` of their TTL remains. Fetches run at
+    BACKGROUND priority, at most `concurrency` at a time and `budget` per
+    cycle, and pause while interactive requests are queued for a token.
+    """
+
+    def __init__(
+        self,
+        client: AsyncTMDBClient,
+        scheduler: TMDBScheduler,
+        interval: float = 300.0,
+        pages: int = 5,
+        concurrency: int = 4,
+        budget: int = 200,
+        refresh_ahead: float = 0.1,
+        max_active_users: int = 5000,
+        active_window: float = 24 * 3600,
+    ):
+        self.client = client
+        self.scheduler = scheduler
+        self.interval = interval
+        self.pages = pages
+        self.concurrency = concurrency
+        self.budget = budget
+        self.refresh_ahead = refresh_ahead
+        self.active_window = active_window
+        # uid -> favorite movie ids of users seen recently
+        self._active = LRUCache(max_size=max_active_users)
+        self._task: Optional[asyncio.Task] = None
+        self.last_cycle: Dict = {}
+
+    def note_profile(self, user_profile: dict):
+        """Remember a user's favorites so their details stay cached"""
+        uid = user_profile.get("uid")
+        if uid:
+            favorite_ids = [m["id"] for m in user_profile.get("favorite_movies", [])]
+            self._active.set(uid, favorite_ids, ttl=self.active_window)
+
+    def active_favorite_ids(self) -> List[int]:
+        return list(dict.fromkeys(movie_id for _, favorite_ids in self._active.items() for movie_id in favorite_ids))
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        with tmdb_priority(BACKGROUND):
+            while True:
+                try:
+                    await self.warm_once()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Error warming TMDB cache: {e}")
+                    ERRORS.inc(where="cache_warmer")
+                await asyncio.sleep(self.interval)
+
+    def _needs_fetch(self, endpoint: str, params: dict) -> Optional[str]:
+        """Why an entry should be fetched ("missing" or "expiring"), or None if it is fresh"""
+        remaining = self.client.cache.expires_in(endpoint, params)
+        if remaining is None:
+            return "missing"
+        if remaining < self.refresh_ahead * self.client.cache.ttl_for(endpoint):
+            return "expiring"
+        return None
+
+    async def _warm(self, targets: List[Tuple[str, dict]], state: dict):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(endpoint: str, params: dict, reason: str):
+            async with semaphore:
+                # Live traffic first: hold off while interactive calls wait for tokens
+                while self.scheduler.depth()["interactive"]:
+                    await asyncio.sleep(0.5)
+                try:
+                    await self.client._make_request(endpoint, params, refresh=True)
+                    CACHE_WARMER_FETCHES.inc(reason=reason)
+                except Exception as e:
+                    print(f"Error warming {endpoint}: {e}")
+                    ERRORS.inc(where="cache_warmer")
+
+        # Freshness probes may hit SQLite; run the sweep off the event loop
+        reasons = await asyncio.to_thread(
+            lambda: [self._needs_fetch(endpoint, params) for endpoint, params in targets]
+        )
+        jobs = []
+        for (endpoint, params), reason in zip(targets, reasons):
+            if reason is None:
+                continue
+            if state["fetched"] >= self.budget:
+                state["skipped"] += 1
+                continue
+            state["fetched"] += 1
+            jobs.append(fetch(endpoint, params, reason))
+        await asyncio.gather(*jobs)
+
+    async def warm_once(self) -> Dict:
+        """One warming cycle; returns what it fetched"""
+        started = time.time()
+        state = {"fetched": 0, "skipped": 0}
+        lists = [("genre/movie/list", {})] + [("movie/popular", {"page": page}) for page in range(1, self.pages + 1)]
+        await self._warm(lists, state)
+
+        # Candidates come from the catalog when there is one, so only
+        # movies outside it need TMDB details
+        movie_ids = [] if catalog_store.available else await self._popular_ids()
+        movie_ids += self.active_favorite_ids()
+        if catalog_store.available:
+            movie_ids = [movie_id for movie_id in movie_ids if catalog_store.row_of(movie_id) is None]
+        details = [(f"movie/{movie_id}", DETAILS_PARAMS) for movie_id in dict.fromkeys(movie_ids)]
+        await self._warm(details, state)
+
+        self.last_cycle = {**state, "started_at": started, "seconds": round(time.time() - started, 3)}
+        return self.last_cycle
+
+    async def _popular_ids(self) -> List[int]:
+        ids = []
+        for page in range(1, self.pages + 1):
+            try:
+                ids.extend(m["id"] for m in await self.client.get_popular_movies(page=page, min_rating=0))
+            except Exception:
+                continue
+        return ids
+
+
+WARMER_ENABLED = os.getenv("CACHE_WARMER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+cache_warmer = CacheWarmer(
+    async_tmdb_client,
+    tmdb_scheduler,
+    interval=float(os.getenv("CACHE_WARMER_INTERVAL", "300")),
+    pages=int(os.getenv("CACHE_WARMER_PAGES", "5")),
+    concurrency=int(os.getenv("CACHE_WARMER_CONCURRENCY", "4")),
+    budget=int(os.getenv("CACHE_WARMER_BUDGET", "200")),
+    refresh_ahead=float(os.getenv("CACHE_WARMER_REFRESH_AHEAD", "0.1")),
+)
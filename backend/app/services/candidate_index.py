@@ -0,0 +1,120 @@
+import os
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from app.services.catalog_store import CatalogStore, catalog_store, rows_in
+
+# Contribution of each posting-list match to a movie's retrieval score
+RETRIEVAL_WEIGHTS = {
+    "genres": 1.0,
+    "cast": 0.8,
+    "directors": 0.6,
+    "keywords": 0.15,
+}
+POPULARITY_PRIOR = 0.05
+
+
+class PostingLists:
+    """CSR-style posting lists for one list column: string id -> catalog rows"""
+
+    def __init__(self, store: CatalogStore, kind: str):
+        offsets = np.asarray(store.column(f"{kind}_offsets"))
+        values = np.asarray(store.column(f"{kind}_values"))
+        rows = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+
+        order = np.argsort(values, kind="stable")
+        sorted_values = values[order]
+        self.rows = rows[order]
+        self.keys, starts = np.unique(sorted_values, return_index=True)
+        self.offsets = np.append(starts, len(sorted_values)).astype(np.int64)
+        self.name_to_key = {store.string(int(key)): i for i, key in enumerate(self.keys)}
+        self._row_offsets, self._row_values = offsets, values
+
+    def lookup(self, name: str) -> np.ndarray:
+        i = self.name_to_key.get(name)
+        if i is None:
+            return self.rows[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def lookup_row(self, row: int) -> List[np.ndarray]:
+        """Posting lists of every value catalog row `row` has in this column"""
+        values = self._row_values[self._row_offsets[row]:self._row_offsets[row + 1]]
+        return [self.rows[self.offsets[i]:self.offsets[i + 1]] for i in np.searchsorted(self.keys, values)]
+
+
+class CandidateIndex:
+    """Inverted indexes over the catalog for profile-driven candidate generation"""
+
+    def __init__(self, store: CatalogStore):
+        self.store = store
+        # (version, postings, popularity prior, ids, vote_average), swapped as one
+        self._built: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.store.available
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._built[0] if self._built else None
+
+    def ensure_built(self) -> tuple:
+        """(Re)build the posting lists when the catalog version changes; returns the current build"""
+        self.store.reload_if_changed()
+        built = self._built
+        if built is not None and built[0] == self.store.version:
+            return built
+        with self._lock:
+            version = self.store.version
+            if self._built is not None and self._built[0] == version:
+                return self._built
+            postings = {kind: PostingLists(self.store, kind) for kind in RETRIEVAL_WEIGHTS}
+            popularity = np.log1p(np.asarray(self.store.column("popularity"), dtype=np.float64))
+            peak = popularity.max() if len(popularity) else 0.0
+            prior = POPULARITY_PRIOR * popularity / peak if peak > 0 else np.zeros_like(popularity)
+            ids = self.store.column("ids")
+            vote_average = np.asarray(self.store.column("vote_average"))
+            self._built = (version, postings, prior, ids, vote_average)
+            return self._built
+
+    def retrieve(
+        self,
+        user_profile: dict,
+        favorite_movie_ids: List[int],
+        limit: int = 300,
+        min_rating: float = 0.0,
+    ) -> List[int]:
+        """Top candidate movie ids by accumulated profile weight over posting lists"""
+        # Everything below reads this one build, so an ingest that swaps the
+        # catalog mid-call can't mix arrays from two versions
+        _, postings, prior, ids, vote_average = self.ensure_built()
+        scores = prior.copy()
+
+        for genre, weight in user_profile.get("genre_weights", {}).items():
+            np.add.at(scores, postings["genres"].lookup(genre), weight * RETRIEVAL_WEIGHTS["genres"])
+        for actor, weight in user_profile.get("actor_weights", {}).items():
+            np.add.at(scores, postings["cast"].lookup(actor), weight * RETRIEVAL_WEIGHTS["cast"])
+
+        # Profiles carry no director/keyword weights; use the favorites' own
+        favorite_rows = rows_in(ids, favorite_movie_ids)
+        favorite_rows = favorite_rows[favorite_rows >= 0]
+        for kind in ("directors", "keywords"):
+            for row in favorite_rows:
+                for rows in postings[kind].lookup_row(int(row)):
+                    np.add.at(scores, rows, RETRIEVAL_WEIGHTS[kind])
+
+        scores[vote_average < min_rating] = -np.inf
+        scores[favorite_rows] = -np.inf
+
+        limit = min(limit, int(np.isfinite(scores).sum()))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [int(movie_id) for movie_id in ids[top]]
+
+candidate_index = CandidateIndex(catalog_store)
+CANDIDATE_POOL_SIZE = int(os.getenv("CANDIDATE_POOL_SIZE", "300"))
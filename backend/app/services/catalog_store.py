@@ -0,0 +1,288 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Column layout of the on-disk catalog
+NUMERIC_COLUMNS = {
+    "vote_average": np.float32,
+    "vote_count": np.int32,
+    "popularity": np.float32,
+}
+STRING_COLUMNS = ("title", "overview", "release_date", "poster_path", "backdrop_path", "original_language")
+LIST_COLUMNS = ("genres", "cast", "directors", "keywords")
+
+MAX_CAST = 10
+MAX_KEYWORDS = 20
+
+
+def _extract_lists(movie: dict) -> Dict[str, List[str]]:
+    """Pull the feature name lists out of a TMDB details payload"""
+    credits = movie.get("credits", {})
+    return {
+        "genres": [g["name"] for g in movie.get("genres", [])],
+        "cast": [a["name"] for a in credits.get("cast", [])[:MAX_CAST]],
+        "directors": [p["name"] for p in credits.get("crew", []) if p.get("job") == "Director"],
+        "keywords": [k["name"] for k in movie.get("keywords", {}).get("keywords", [])[:MAX_KEYWORDS]],
+    }
+
+
+def write_catalog(path: str, movies: Iterable[dict], refreshed_at: Optional[str] = None) -> int:
+    """
+    Write TMDB details payloads as a new catalog version and switch to it atomically.
+    Returns the new version number.
+    """
+    by_id = {int(m["id"]): m for m in movies}
+    ids = np.array(sorted(by_id), dtype=np.int64)
+
+    strings: Dict[str, int] = {}
+
+    def intern(value) -> int:
+        if value is None:
+            return -1
+        return strings.setdefault(str(value), len(strings))
+
+    numeric = {name: np.zeros(len(ids), dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+    string_cols = {name: np.full(len(ids), -1, dtype=np.int32) for name in STRING_COLUMNS}
+    list_values = {name: [] for name in LIST_COLUMNS}
+    list_offsets = {name: [0] for name in LIST_COLUMNS}
+    genre_ids = []
+
+    for row, movie_id in enumerate(ids):
+        movie = by_id[int(movie_id)]
+        for name in NUMERIC_COLUMNS:
+            numeric[name][row] = movie.get(name) or 0
+        for name in STRING_COLUMNS:
+            string_cols[name][row] = intern(movie.get(name))
+        for name, values in _extract_lists(movie).items():
+            list_values[name].extend(intern(v) for v in values)
+            list_offsets[name].append(len(list_values[name]))
+        genre_ids.extend(g.get("id", 0) for g in movie.get("genres", []))
+
+    manifest_path = os.path.join(path, "manifest.json")
+    previous = _read_manifest(manifest_path)
+    version = (previous or {}).get("version", 0) + 1
+    version_dir = os.path.join(path, f"v{version}")
+    os.makedirs(version_dir, exist_ok=True)
+
+    def save(name: str, array: np.ndarray):
+        np.save(os.path.join(version_dir, f"{name}.npy"), array)
+
+    save("ids", ids)
+    for name, array in numeric.items():
+        save(name, array)
+    for name, array in string_cols.items():
+        save(name, array)
+    for name in LIST_COLUMNS:
+        save(f"{name}_values", np.array(list_values[name], dtype=np.int32))
+        save(f"{name}_offsets", np.array(list_offsets[name], dtype=np.int64))
+    save("genre_ids", np.array(genre_ids, dtype=np.int32))
+
+    # String table: one UTF-8 blob plus offsets
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    save("strings", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    save("string_offsets", offsets)
+
+    manifest = {
+        "version": version,
+        "count": int(len(ids)),
+        "created_at": datetime.utcnow().isoformat(),
+        "refreshed_at": refreshed_at or datetime.utcnow().date().isoformat(),
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+    # Keep the previous version around for readers that still have it mapped
+    if previous and previous.get("version", 0) > 1:
+        shutil.rmtree(os.path.join(path, f"v{previous['version'] - 1}"), ignore_errors=True)
+    return version
+
+
+def rows_in(ids: np.ndarray, movie_ids) -> np.ndarray:
+    """Rows of movie_ids in a sorted ids array; -1 where missing"""
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    if len(ids) == 0:
+        return np.full(len(movie_ids), -1, dtype=np.int64)
+    rows = np.minimum(np.searchsorted(ids, movie_ids), len(ids) - 1)
+    return np.where(ids[rows] == movie_ids, rows, -1)
+
+
+def _read_manifest(manifest_path: str) -> Optional[dict]:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class CatalogStore:
+    """Read-only, memory-mapped movie catalog shared by all workers"""
+
+    RELOAD_CHECK_INTERVAL = 5.0  # seconds between manifest checks
+
+    def __init__(self, path: str):
+        self.path = path
+        self.manifest: Optional[dict] = None
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._decoded: Dict[int, str] = {}
+        self._popularity_order: Optional[np.ndarray] = None
+        self._manifest_mtime = None
+        self._last_check = 0.0
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.manifest["version"] if self.manifest else None
+
+    @property
+    def available(self) -> bool:
+        self.reload_if_changed()
+        return bool(self._arrays) and len(self._arrays["ids"]) > 0
+
+    def __len__(self) -> int:
+        self.reload_if_changed()
+        return len(self._arrays["ids"]) if self._arrays else 0
+
+    def reload_if_changed(self, force: bool = False):
+        """Re-map the arrays when an ingest has published a new version"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.RELOAD_CHECK_INTERVAL:
+            return
+        self._last_check = now
+
+        manifest_path = os.path.join(self.path, "manifest.json")
+        try:
+            mtime = os.stat(manifest_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._manifest_mtime and not force:
+            return
+
+        manifest = _read_manifest(manifest_path)
+        if manifest is None:
+            return
+        version_dir = os.path.join(self.path, f"v{manifest['version']}")
+        arrays = {}
+        try:
+            for filename in os.listdir(version_dir):
+                if filename.endswith(".npy"):
+                    arrays[filename[:-4]] = np.load(os.path.join(version_dir, filename), mmap_mode="r")
+        except FileNotFoundError:
+            # A newer ingest pruned this version between the manifest read
+            # and the load; keep serving what's mapped and retry next check
+            return
+
+        self._arrays = arrays
+        self._decoded = {}
+        self._popularity_order = None
+        self.manifest = manifest
+        self._manifest_mtime = mtime
+
+    # Low-level, zero-copy accessors
+
+    @property
+    def ids(self) -> np.ndarray:
+        self.reload_if_changed()
+        return self._arrays.get("ids", np.zeros(0, dtype=np.int64))
+
+    def column(self, name: str) -> np.ndarray:
+        """Memory-mapped column array, one entry per catalog row"""
+        return self._arrays[name]
+
+    def row_of(self, movie_id: int) -> Optional[int]:
+        ids = self.ids
+        row = int(np.searchsorted(ids, movie_id))
+        if row < len(ids) and ids[row] == movie_id:
+            return row
+        return None
+
+    def rows_of(self, movie_ids) -> np.ndarray:
+        """Vectorised lookup; -1 where a movie is not in the catalog"""
+        return rows_in(self.ids, movie_ids)
+
+    def list_values(self, name: str, row: int) -> np.ndarray:
+        """String ids of a list column for one row (a view, no copy)"""
+        offsets = self._arrays[f"{name}_offsets"]
+        return self._arrays[f"{name}_values"][offsets[row]:offsets[row + 1]]
+
+    def string(self, string_id: int) -> Optional[str]:
+        if string_id < 0:
+            return None
+        value = self._decoded.get(string_id)
+        if value is None:
+            offsets = self._arrays["string_offsets"]
+            raw = self._arrays["strings"][offsets[string_id]:offsets[string_id + 1]]
+            value = raw.tobytes().decode("utf-8")
+            self._decoded[string_id] = value
+        return value
+
+    # TMDB-shaped views
+
+    def _summary(self, row: int) -> Dict:
+        summary = {"id": int(self._arrays["ids"][row])}
+        for name in STRING_COLUMNS:
+            summary[name] = self.string(int(self._arrays[name][row]))
+        for name in NUMERIC_COLUMNS:
+            summary[name] = self._arrays[name][row].item()
+        offsets = self._arrays["genres_offsets"]
+        summary["genre_ids"] = self._arrays["genre_ids"][offsets[row]:offsets[row + 1]].tolist()
+        return summary
+
+    def get_movie(self, movie_id: int) -> Optional[Dict]:
+        """Movie in the shape of a TMDB list result"""
+        row = self.row_of(movie_id)
+        return self._summary(row) if row is not None else None
+
+    def get_movie_details(self, movie_id: int) -> Optional[Dict]:
+        """Movie in the shape of a TMDB details payload with credits and keywords"""
+        row = self.row_of(movie_id)
+        if row is None:
+            return None
+        movie = self._summary(row)
+        names = {name: [self.string(int(s)) for s in self.list_values(name, row)] for name in LIST_COLUMNS}
+        movie["genres"] = [{"id": gid, "name": name} for gid, name in zip(movie.pop("genre_ids"), names["genres"])]
+        movie["credits"] = {
+            "cast": [{"name": name} for name in names["cast"]],
+            "crew": [{"job": "Director", "name": name} for name in names["directors"]],
+        }
+        movie["keywords"] = {"keywords": [{"name": name} for name in names["keywords"]]}
+        return movie
+
+    def get_movies_details(self, movie_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Details for every requested movie present in the catalog"""
+        details = {}
+        for movie_id in movie_ids:
+            movie = self.get_movie_details(movie_id)
+            if movie is not None:
+                details[movie_id] = movie
+        return details
+
+    def popular_movies(self, page: int = 1, per_page: int = 20, min_rating: float = 0.0) -> List[Dict]:
+        """Catalog movies ordered by popularity, paged like TMDB's popular list"""
+        if not self.available:
+            return []
+        if self._popularity_order is None:
+            self._popularity_order = np.argsort(-np.asarray(self._arrays["popularity"]), kind="stable")
+        order = self._popularity_order
+        start = (page - 1) * per_page
+        rows = order[start:start + per_page]
+        return [
+            self._summary(int(row)) for row in rows
+            if self._arrays["vote_average"][row] >= min_rating
+        ]
+
+    def iter_details(self):
+        """Yield every catalog movie as a details payload (used by incremental ingest)"""
+        for movie_id in self.ids:
+            yield self.get_movie_details(int(movie_id))
+
+
+catalog_store = CatalogStore(os.getenv("CATALOG_PATH", "./data/catalog"))
@@ -0,0 +1,152 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+
+from app.services.cache import LRUCache
+from app.services.vocabulary import actor_vocabulary, genre_vocabulary
+
+WEIGHT_MIN = 0.1
+WEIGHT_MAX = 2.0
+# Weight an unseen genre/actor starts from when feedback first touches it
+DEFAULT_WEIGHT = 1.0
+# action -> (genre delta, actor delta)
+FEEDBACK_DELTAS = {
+    "like": (0.05, 0.04),
+    "dislike": (-0.03, -0.02),
+}
+FEEDBACK_CAST = 3  # top-billed actors adjusted by feedback
+
+
+class CompactProfile:
+    """
+    Interned profile weights: a dense array over the genre vocabulary (NaN
+    for genres the profile never weighted) and sorted parallel arrays of
+    actor ids and weights
+    """
+
+    __slots__ = ("genre_weights", "actor_ids", "actor_weights")
+
+    def __init__(self, genre_weights: np.ndarray, actor_ids: np.ndarray, actor_weights: np.ndarray):
+        self.genre_weights = genre_weights
+        self.actor_ids = actor_ids
+        self.actor_weights = actor_weights
+
+    @classmethod
+    def from_dict(cls, profile: dict) -> "CompactProfile":
+        """Build from the stored {"genre_weights": {...}, "actor_weights": {...}} format"""
+        genres = profile.get("genre_weights") or {}
+        genre_ids = genre_vocabulary.intern_many(genres)
+        genre_weights = np.full(len(genre_vocabulary), np.nan)
+        genre_weights[genre_ids] = np.fromiter(genres.values(), dtype=np.float64, count=len(genres))
+
+        actors = profile.get("actor_weights") or {}
+        actor_ids = actor_vocabulary.intern_many(actors)
+        actor_weights = np.fromiter(actors.values(), dtype=np.float64, count=len(actors))
+        order = np.argsort(actor_ids, kind="stable")
+        return cls(genre_weights, actor_ids[order], actor_weights[order])
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """Stored format, for Firestore/SQLite writes and API responses"""
+        genre_ids = np.flatnonzero(~np.isnan(self.genre_weights))
+        return {
+            "genre_weights": dict(zip(genre_vocabulary.names(genre_ids), self.genre_weights[genre_ids].tolist())),
+            "actor_weights": dict(zip(actor_vocabulary.names(self.actor_ids), self.actor_weights.tolist())),
+        }
+
+    def copy(self) -> "CompactProfile":
+        return CompactProfile(self.genre_weights.copy(), self.actor_ids.copy(), self.actor_weights.copy())
+
+    def nbytes(self) -> int:
+        return self.genre_weights.nbytes + self.actor_ids.nbytes + self.actor_weights.nbytes
+
+    def dense_genre_weights(self, size: int) -> np.ndarray:
+        """Genre weights padded to the vocabulary size, 0 where unset"""
+        dense = np.zeros(size)
+        weights = np.nan_to_num(self.genre_weights[:size], nan=0.0)
+        dense[:len(weights)] = weights
+        return dense
+
+    def genre_scores(self, genre_ids: np.ndarray) -> np.ndarray:
+        """Weight of each genre id; 0 for unset or unknown (-1) ids"""
+        valid = (genre_ids >= 0) & (genre_ids < len(self.genre_weights))
+        scores = np.zeros(len(genre_ids))
+        scores[valid] = np.nan_to_num(self.genre_weights[genre_ids[valid]], nan=0.0)
+        return scores
+
+    def actor_scores(self, actor_ids: np.ndarray) -> np.ndarray:
+        """Weight of each actor id; 0 for actors the profile doesn't weight"""
+        if not len(self.actor_ids):
+            return np.zeros(len(actor_ids))
+        positions = np.minimum(np.searchsorted(self.actor_ids, actor_ids), len(self.actor_ids) - 1)
+        return np.where(self.actor_ids[positions] == actor_ids, self.actor_weights[positions], 0.0)
+
+    def apply_feedback(self, movie_data: dict, action: str):
+        """Clamp-and-add the like/dislike deltas for a movie's genres and top cast, in place"""
+        deltas = FEEDBACK_DELTAS.get(action)
+        if deltas is None:
+            return
+        genre_delta, actor_delta = deltas
+
+        genre_ids, counts = np.unique(
+            genre_vocabulary.intern_many(g["name"] for g in movie_data.get("genres", [])), return_counts=True
+        )
+        if len(genre_ids):
+            if genre_ids[-1] >= len(self.genre_weights):
+                grown = np.full(len(genre_vocabulary), np.nan)
+                grown[:len(self.genre_weights)] = self.genre_weights
+                self.genre_weights = grown
+            current = self.genre_weights[genre_ids]
+            current = np.where(np.isnan(current), DEFAULT_WEIGHT, current)
+            self.genre_weights[genre_ids] = np.clip(current + genre_delta * counts, WEIGHT_MIN, WEIGHT_MAX)
+
+        cast = movie_data.get("credits", {}).get("cast", [])[:FEEDBACK_CAST]
+        actor_ids, counts = np.unique(actor_vocabulary.intern_many(a["name"] for a in cast), return_counts=True)
+        if len(actor_ids):
+            positions = np.searchsorted(self.actor_ids, actor_ids)
+            known = positions < len(self.actor_ids)
+            known[known] = self.actor_ids[positions[known]] == actor_ids[known]
+            self.actor_weights[positions[known]] = np.clip(
+                self.actor_weights[positions[known]] + actor_delta * counts[known], WEIGHT_MIN, WEIGHT_MAX
+            )
+            new = ~known
+            if new.any():
+                self.actor_ids = np.insert(self.actor_ids, positions[new], actor_ids[new])
+                self.actor_weights = np.insert(
+                    self.actor_weights, positions[new],
+                    np.clip(DEFAULT_WEIGHT + actor_delta * counts[new], WEIGHT_MIN, WEIGHT_MAX)
+                )
+
+
+# Scoring reuses the compact form while a profile version is current
+_compact_profiles = LRUCache(max_size=int(os.getenv("COMPACT_PROFILE_CACHE_SIZE", "10000")))
+
+
+def compact_profile(user_profile: dict) -> CompactProfile:
+    """
+    Read-only compact form of a stored profile, cached per (uid,
+    profile_version). Profiles without a uid are converted every call.
+    """
+    uid = user_profile.get("uid")
+    if uid is None:
+        return CompactProfile.from_dict(user_profile)
+    key = (uid, user_profile.get("profile_version", 0))
+    profile = _compact_profiles.get(key)
+    if profile is None:
+        profile = CompactProfile.from_dict(user_profile)
+        _compact_profiles.set(key, profile)
+    return profile
+
+
+def carry_forward(uid: str, from_version: int, to_version: int, events: List[tuple]):
+    """
+    After feedback is written, derive the compact profile for the new version
+    from the cached old one so the next recommendation skips the conversion
+    """
+    previous = _compact_profiles.get((uid, from_version))
+    if previous is None:
+        return
+    profile = previous.copy()
+    for movie_data, action in events:
+        profile.apply_feedback(movie_data, action)
+    _compact_profiles.set((uid, to_version), profile)
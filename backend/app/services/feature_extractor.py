@@ -1,5 +1,5 @@
 from typing import List, Dict
-from app.services.tmdb_client import tmdb_client
+from app.services.movie_data import get_movies_details
 from app.models.user_profile import MovieReference
 
 async def build_user_profile(
@@ -12,11 +12,16 @@ async def build_user_profile(
     genre_weights = {}
     actor_weights = {}
     
+    # Fetch all favorites concurrently
+    details_by_id = await get_movies_details([m.id for m in favorite_movies])
+    
     # Extract features from favorite movies
     for movie_ref in favorite_movies:
+        movie_details = details_by_id.get(movie_ref.id)
+        if movie_details is None:
+            continue
+        
         try:
-            movie_details = tmdb_client.get_movie_details(movie_ref.id)
-            
             # Weight genres from favorites
             for genre in movie_details.get("genres", []):
                 genre_name = genre["name"]
@@ -0,0 +1,346 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.services.compact_profile import carry_forward
+from app.services.item_cf import item_cf
+from app.services.learning_engine import fold_feedback
+from app.services.matrix_factorization import mf_model
+from app.services.metrics import ERRORS
+from app.services.movie_data import get_movies_details
+from app.services.profile_store import ProfileStore, profile_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: each process only ever replays its own spool
+    fcntl = None
+
+MAX_ATTEMPTS = 5
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+class QueueFull(Exception):
+    """Raised when the feedback queue is at capacity"""
+
+
+class FeedbackQueue:
+    """
+    Write-behind queue for swipe feedback.
+    Events are spooled to disk, acknowledged immediately and applied by a
+    background worker that coalesces them per user.
+
+    Every process spools to its own file, spool_path plus its pid, so
+    workers never rotate or truncate each other's events. On start a
+    worker adopts the spools of processes that are gone, under a file lock
+    so two workers starting together don't both replay them.
+    """
+
+    def __init__(
+        self,
+        store: Optional[ProfileStore],
+        spool_path: str,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000
+    ):
+        self.store = store
+        self.spool_path = spool_path
+        self._path: Optional[str] = None
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, List[dict]]" = OrderedDict()
+        self._count = 0
+        self._spool = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._count
+
+    # Spool
+
+    def _open_spool(self, mode: str = "a"):
+        # Resolved on first use rather than at import, which may predate a fork
+        self._path = self._path or f"{self.spool_path}.{os.getpid()}"
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        self._spool = open(self._path, mode, encoding="utf-8")
+
+    def _append_to_spool(self, events: List[dict]):
+        for event in events:
+            self._spool.write(json.dumps(event) + "\n")
+        self._spool.flush()
+
+    @staticmethod
+    def _read_spool(path: str) -> List[dict]:
+        events = []
+        if not os.path.exists(path):
+            return events
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # torn write at crash time
+        return events
+
+    def _adoptable_spools(self) -> List[str]:
+        """This process's spool files and those of processes that have exited"""
+        paths = []
+        for path in glob.glob(glob.escape(self.spool_path) + "*"):
+            suffix = path[len(self.spool_path):]
+            if suffix.endswith(".flushing"):
+                suffix = suffix[:-len(".flushing")]
+            if suffix == "":
+                paths.append(path)  # written before spools were per process
+            elif suffix[1:].isdigit() and suffix[0] == ".":
+                pid = int(suffix[1:])
+                if pid == os.getpid() or not _process_alive(pid):
+                    paths.append(path)
+        return paths
+
+    def _replay_spools(self, paths: List[str]) -> List[dict]:
+        """Events from the given spool files, oldest first, each once"""
+        events = {}
+        for path in paths:
+            for event in self._read_spool(path):
+                events.setdefault(event["seq"], event)
+        return sorted(events.values(), key=lambda e: e["seq"])
+
+    def _rotate_spool(self, pending: "OrderedDict[str, List[dict]]") -> str:
+        """
+        Move the spool aside for the batch in flight. A .flushing file left
+        behind by an earlier flush still holds events that are in neither
+        the queue nor the new spool, so they join this batch and the current
+        spool is appended to it instead of overwriting it.
+        """
+        flushing = self._path + ".flushing"
+        self._spool.close()
+        if os.path.exists(flushing):
+            known = {e["seq"] for events in pending.values() for e in events}
+            for event in self._read_spool(flushing):
+                if event["seq"] not in known:
+                    pending.setdefault(event["uid"], []).append(event)
+            for events in pending.values():
+                events.sort(key=lambda e: e["seq"])
+            with open(self._path, encoding="utf-8") as src, open(flushing, "a", encoding="utf-8") as dst:
+                dst.write(src.read())
+            os.remove(self._path)
+        else:
+            os.replace(self._path, flushing)
+        self._open_spool()
+        return flushing
+
+    # Producer side
+
+    def submit(self, uid: str, movie_id: int, action: str) -> dict:
+        """Accept an event, spool it and wake the worker"""
+        if self._count >= self.max_pending:
+            raise QueueFull()
+        event = {"uid": uid, "movie_id": movie_id, "action": action, "seq": time.time_ns()}
+        if self._spool is None:
+            self._open_spool()
+        self._append_to_spool([event])
+        self._enqueue(event)
+        if self._wakeup is not None and self._count >= self.max_pending // 2:
+            self._wakeup.set()
+        return event
+
+    def _enqueue(self, event: dict):
+        self._pending.setdefault(event["uid"], []).append(event)
+        self._count += 1
+
+    # Worker side
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+
+        # Consolidate our own leftovers (anything submitted before start)
+        # and orphaned spools into a fresh spool; the spool is the source
+        # of truth. The orphans are removed only once their events are in it.
+        self._path = self._path or f"{self.spool_path}.{os.getpid()}"
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        with open(self.spool_path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.lockf(lock, fcntl.LOCK_EX)
+            paths = self._adoptable_spools() if fcntl is not None else [self._path, self._path + ".flushing"]
+            replayed = self._replay_spools(paths)
+            if self._spool is not None:
+                self._spool.close()
+            self._open_spool("w")
+            self._append_to_spool(replayed)
+            os.fsync(self._spool.fileno())
+            for path in paths:
+                if path != self._path and os.path.exists(path):
+                    os.remove(path)
+        if replayed:
+            print(f"Replaying {len(replayed)} spooled feedback events")
+
+        self._pending, self._count = OrderedDict(), 0
+        for event in replayed:
+            self._enqueue(event)
+
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+            if not self._count:
+                os.remove(self._path)  # nothing left for another worker to adopt
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing feedback queue: {e}")
+                ERRORS.inc(where="feedback_flush")
+
+    async def flush(self):
+        """Apply every pending event: one profile write per user, bulk interaction writes"""
+        async with self._flush_lock:
+            if not self._count or not self.store:
+                return
+
+            # Swap out the pending events and rotate the spool so new events
+            # land in a fresh file while this batch is in flight
+            pending, self._pending, self._count = self._pending, OrderedDict(), 0
+            flushing = self._rotate_spool(pending)
+
+            done = set()
+            try:
+                retry = await self._apply_batch(pending, done)
+            except Exception as e:
+                # Whatever hasn't reached a profile yet goes back in the queue
+                print(f"Error applying feedback batch: {e}")
+                ERRORS.inc(where="feedback_flush")
+                retry = [event for events in pending.values() for event in events if event["seq"] not in done]
+
+            # Failed and unresolved events are retried on the next flush
+            for event in retry:
+                self._enqueue(event)
+            if retry:
+                self._append_to_spool(retry)
+            os.remove(flushing)
+
+    async def _apply_batch(self, pending: "OrderedDict[str, List[dict]]", done: set) -> List[dict]:
+        """Apply a batch and return the events to retry; seqs that need no retry are added to done"""
+        movie_ids = [e["movie_id"] for events in pending.values() for e in events]
+        details_by_id = await get_movies_details(list(dict.fromkeys(movie_ids)))
+
+        interactions, retry = [], []
+        for uid, events in pending.items():
+            try:
+                applied, unresolved = await asyncio.to_thread(self._apply_user, uid, events, details_by_id)
+            except Exception as e:
+                print(f"Error applying feedback for {uid}: {e}")
+                ERRORS.inc(where="feedback_apply")
+                again = self._retryable(events)
+            else:
+                interactions.extend(applied)
+                again = []
+                if unresolved:
+                    print(f"No movie details for {len(unresolved)} feedback events from {uid}")
+                    ERRORS.inc(where="feedback_unresolved")
+                    again = self._retryable(unresolved)
+            retry.extend(again)
+            # Events waiting for a retry stay out of done, so a later failure
+            # in this batch still puts them back in the queue
+            again_seqs = {e["seq"] for e in again}
+            done.update(e["seq"] for e in events if e["seq"] not in again_seqs)
+
+        rows = [self._interaction_row(e) for e in interactions]
+        try:
+            await asyncio.to_thread(self.store.add_interactions, rows)
+        except Exception as e:
+            print(f"Error writing interactions: {e}")
+            ERRORS.inc(where="feedback_interactions")
+        else:
+            try:
+                await asyncio.to_thread(item_cf.add, rows)
+                mf_model.note_interactions(rows)
+            except Exception as e:
+                print(f"Error updating models from feedback: {e}")
+                ERRORS.inc(where="feedback_models")
+        return retry
+
+    @staticmethod
+    def _retryable(events: List[dict]) -> List[dict]:
+        """Count an attempt against each event; the ones still under MAX_ATTEMPTS"""
+        for event in events:
+            event["attempts"] = event.get("attempts", 0) + 1
+        retry = [e for e in events if e["attempts"] < MAX_ATTEMPTS]
+        if len(retry) < len(events):
+            print(f"Dropping {len(events) - len(retry)} feedback events after {MAX_ATTEMPTS} attempts")
+            ERRORS.inc(where="feedback_dropped")
+        return retry
+
+    def _apply_user(self, uid: str, events: List[dict], details_by_id: Dict[int, dict]) -> Tuple[List[dict], List[dict]]:
+        """
+        Fold a user's events into their weights in one atomic profile write.
+        Returns (applied, unresolved); unresolved events had no movie details.
+        """
+        applied = [e for e in events if e["movie_id"] in details_by_id]
+        unresolved = [e for e in events if e["movie_id"] not in details_by_id]
+        if not applied:
+            return [], unresolved
+
+        feedback = [(details_by_id[e["movie_id"]], e["action"]) for e in applied]
+        read_version = None
+
+        def mutate(profile: dict) -> dict:
+            nonlocal read_version
+            read_version = profile.get("profile_version", 0)
+            return fold_feedback(profile, feedback)
+
+        # profile_version is bumped per event, invalidating cached recommendations
+        if not self.store.modify_profile(uid, mutate, version_increment=len(applied)):
+            print(f"Dropping {len(events)} feedback events for missing profile {uid}")
+            return [], []
+        carry_forward(uid, read_version, read_version + len(applied), feedback)
+        return applied, unresolved
+
+    @staticmethod
+    def _interaction_row(event: dict) -> dict:
+        return {
+            "uid": event["uid"],
+            "movie_id": event["movie_id"],
+            "action": event["action"],
+            "timestamp": datetime.fromtimestamp(event["seq"] / 1e9, tz=timezone.utc),
+        }
+
+
+feedback_queue = FeedbackQueue(
+    profile_store,
+    spool_path=os.getenv("FEEDBACK_SPOOL_PATH", "./.cache/feedback_spool.jsonl"),
+    flush_interval=float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "1.0")),
+    max_pending=int(os.getenv("FEEDBACK_QUEUE_MAX", "10000")),
+)
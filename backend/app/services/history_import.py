@@ -0,0 +1,367 @@
+import asyncio
+import csv
+import os
+import re
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.services.cache import LRUCache
+from app.services.compact_profile import DEFAULT_WEIGHT, FEEDBACK_CAST, FEEDBACK_DELTAS, WEIGHT_MAX, WEIGHT_MIN
+from app.services.item_cf import item_cf
+from app.services.matrix_factorization import mf_model
+from app.services.movie_data import get_movies_details
+from app.services.profile_store import ProfileStore
+from app.services.search_index import search_index
+from app.services.tmdb_client import async_tmdb_client
+from app.services.tmdb_scheduler import BACKGROUND, tmdb_priority
+from app.services.vocabulary import Vocabulary, actor_vocabulary, genre_vocabulary
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Ratings on a 0.5-5 scale; in between is neutral and only counted
+IMPORT_LIKE_RATING = float(os.getenv("IMPORT_LIKE_RATING", "4.0"))
+IMPORT_DISLIKE_RATING = float(os.getenv("IMPORT_DISLIKE_RATING", "2.0"))
+# Concurrent TMDB title searches for rows the local index can't resolve
+IMPORT_SEARCH_CONCURRENCY = 4
+# Movies whose genre/cast names are kept between chunks of one import
+IMPORT_FEATURE_CACHE = 20000
+
+_TITLE_YEAR = re.compile(r"^(.*?)\s*\((\d{4})\)\s*$")
+
+# Header aliases, compared lowercased with spaces and underscores removed
+COLUMNS = {
+    "tmdb_id": ("tmdbid",),
+    "movielens_id": ("movieid",),
+    "title": ("title", "name"),
+    "year": ("year",),
+    "rating": ("rating",),
+    "timestamp": ("timestamp", "watcheddate", "date"),
+    "user": ("userid",),
+}
+
+
+class ImportFormatError(ValueError):
+    """The upload isn't a ratings CSV we understand"""
+
+
+class HistoryRow:
+    __slots__ = ("tmdb_id", "title", "year", "rating", "timestamp")
+
+    def __init__(self, tmdb_id: Optional[int], title: Optional[str], year: Optional[int],
+                 rating: float, timestamp: datetime):
+        self.tmdb_id = tmdb_id
+        self.title = title
+        self.year = year
+        self.rating = rating
+        self.timestamp = timestamp
+
+    @property
+    def action(self) -> Optional[str]:
+        if self.rating >= IMPORT_LIKE_RATING:
+            return "like"
+        if self.rating <= IMPORT_DISLIKE_RATING:
+            return "dislike"
+        return None
+
+
+def _column_map(header: List[str]) -> Dict[str, int]:
+    normalized = [re.sub(r"[\s_]", "", name.lower()) for name in header]
+    columns = {}
+    for field, aliases in COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[field] = normalized.index(alias)
+                break
+    if "rating" not in columns:
+        raise ImportFormatError("CSV needs a Rating column")
+    if not {"tmdb_id", "movielens_id", "title"} & set(columns):
+        raise ImportFormatError("CSV needs a tmdbId, movieId or title/Name column")
+    return columns
+
+
+def _parse_timestamp(value: str) -> datetime:
+    value = (value or "").strip()
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value), tz=timezone.utc)
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return datetime.now(timezone.utc)
+
+
+def parse_rows(lines: Iterable[str], links: Optional[Dict[int, int]] = None,
+               user: Optional[str] = None) -> Iterable[HistoryRow]:
+    """
+    Rows of a MovieLens (ratings with tmdbId, or movieId plus a links
+    mapping) or Letterboxd (Name, Year, Rating) export, one at a time
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _column_map(header)
+
+    def cell(row: List[str], field: str) -> str:
+        index = columns.get(field)
+        return row[index].strip() if index is not None and index < len(row) else ""
+
+    for row in reader:
+        if not row:
+            continue
+        if user is not None and cell(row, "user") != user:
+            continue
+        try:
+            rating = float(cell(row, "rating"))
+        except ValueError:
+            continue
+
+        tmdb_id = cell(row, "tmdb_id")
+        movielens_id = cell(row, "movielens_id")
+        if tmdb_id.isdigit():
+            tmdb_id = int(tmdb_id)
+        elif links and movielens_id.isdigit():
+            tmdb_id = links.get(int(movielens_id))
+        else:
+            tmdb_id = None
+
+        title = cell(row, "title") or None
+        year = cell(row, "year")
+        year = int(year) if year.isdigit() else None
+        if title and year is None:
+            # MovieLens titles carry the year: "Heat (1995)"
+            match = _TITLE_YEAR.match(title)
+            if match:
+                title, year = match.group(1), int(match.group(2))
+        yield HistoryRow(tmdb_id, title, year, rating, _parse_timestamp(cell(row, "timestamp")))
+
+
+def read_links(path: str) -> Dict[int, int]:
+    """MovieLens links.csv as {movieId: tmdbId}"""
+    links = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if row.get("tmdbId", "").isdigit():
+                links[int(row["movieId"])] = int(row["tmdbId"])
+    return links
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without holding more than one chunk"""
+    remainder = b""
+    async for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line.decode("utf-8-sig", errors="replace") + "\n"
+    if remainder:
+        yield remainder.decode("utf-8-sig", errors="replace")
+
+
+def clamped_walks(keys: np.ndarray, shifts: np.ndarray, lows: np.ndarray, highs: np.ndarray):
+    """
+    Collapse per-key sequences of x -> clip(x + shift, low, high), in order,
+    into one such step per key. Composing two steps gives another:
+    clip(clip(x + d1, a1, b1) + d2, a2, b2) = clip(x + d1 + d2, clip(a1 + d2, a2, b2), clip(b1 + d2, a2, b2)),
+    so adjacent steps are merged pairwise in log2(max steps per key) passes.
+    Returns (unique keys, shifts, lows, highs).
+    """
+    order = np.argsort(keys, kind="stable")
+    keys, shifts, lows, highs = keys[order], shifts[order], lows[order], highs[order]
+    while len(keys) > 1:
+        same_as_next = keys[:-1] == keys[1:]
+        if not same_as_next.any():
+            break
+        starts = np.r_[True, ~same_as_next]
+        index = np.arange(len(keys))
+        position = index - np.maximum.accumulate(np.where(starts, index, 0))
+        # Merge every even position with the step after it in the same key
+        first = np.flatnonzero((position % 2 == 0) & np.r_[same_as_next, False])
+        second = first + 1
+        d2, a2, b2 = shifts[second], lows[second], highs[second]
+        shifts[first] += d2
+        lows[first] = np.clip(lows[first] + d2, a2, b2)
+        highs[first] = np.clip(highs[first] + d2, a2, b2)
+        keep = np.ones(len(keys), dtype=bool)
+        keep[second] = False
+        keys, shifts, lows, highs = keys[keep], shifts[keep], lows[keep], highs[keep]
+    return keys, shifts, lows, highs
+
+
+class WeightFold:
+    """
+    Running composition of feedback steps over one vocabulary. Feeding the
+    same (name, delta) events as update_weights_from_feedback, in the same
+    order, gives the same clamped weights; memory grows with distinct names,
+    not with events.
+    """
+
+    def __init__(self, vocabulary: Vocabulary):
+        self.vocabulary = vocabulary
+        self.keys = np.zeros(0, dtype=np.int32)
+        self.shifts = np.zeros(0)
+        self.lows = np.zeros(0)
+        self.highs = np.zeros(0)
+
+    def add(self, names: List[str], deltas: List[float]):
+        if not names:
+            return
+        count = len(names)
+        self.keys, self.shifts, self.lows, self.highs = clamped_walks(
+            np.concatenate([self.keys, self.vocabulary.intern_many(names)]),
+            np.concatenate([self.shifts, np.asarray(deltas, dtype=np.float64)]),
+            np.concatenate([self.lows, np.full(count, WEIGHT_MIN)]),
+            np.concatenate([self.highs, np.full(count, WEIGHT_MAX)]),
+        )
+
+    def apply(self, weights: Dict[str, float]) -> Dict[str, float]:
+        """Weights after every folded event; names never weighted start at DEFAULT_WEIGHT"""
+        names = self.vocabulary.names(self.keys)
+        current = np.fromiter((weights.get(name, DEFAULT_WEIGHT) for name in names), dtype=np.float64, count=len(names))
+        updated = np.clip(current + self.shifts, self.lows, self.highs)
+        return {**weights, **dict(zip(names, updated.tolist()))}
+
+
+async def resolve_ids(rows: List[HistoryRow]) -> List[Optional[int]]:
+    """TMDB ids for a chunk: given ids, then exact titles in the local index, then TMDB search"""
+    ids = [
+        row.tmdb_id if row.tmdb_id is not None or not row.title else search_index.lookup(row.title, row.year)
+        for row in rows
+    ]
+    wanted = {(row.title, row.year) for row, movie_id in zip(rows, ids) if movie_id is None and row.title}
+    semaphore = asyncio.Semaphore(IMPORT_SEARCH_CONCURRENCY)
+
+    async def search(title: str, year: Optional[int]) -> Optional[int]:
+        async with semaphore:
+            try:
+                results = await async_tmdb_client.search_movies(query=title)
+            except Exception as e:
+                print(f"Error searching TMDB for {title!r}: {e}")
+                return None
+        search_index.add_many(results)
+        return search_index.lookup(title, year)
+
+    found = dict(zip(wanted, await asyncio.gather(*(search(title, year) for title, year in wanted))))
+    return [
+        movie_id if movie_id is not None else found.get((row.title, row.year))
+        for row, movie_id in zip(rows, ids)
+    ]
+
+
+async def import_history(store: ProfileStore, uid: str, rows, chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    Stream rows (an iterable or async iterable of HistoryRow) into a
+    profile. Each chunk is resolved and fetched in batches and its
+    like/dislike events are kept, with their movie features; once the
+    upload is read they are folded into the weights in rating-time order
+    (the upload itself can be in any order) and stored in one profile write.
+    Interactions are logged only after that write succeeds, so an import
+    that fails part way leaves nothing behind and can simply be retried.
+    """
+    stats = {"rows": 0, "resolved": 0, "unresolved": 0, "liked": 0, "disliked": 0, "neutral": 0}
+    # movie id -> (genre names, top cast names); histories revisit the same movies
+    features = LRUCache(max_size=IMPORT_FEATURE_CACHE)
+    # (timestamp, movie id, action, features) per like/dislike
+    events = []
+
+    async def movie_features(ids: List[Optional[int]]) -> Dict[int, tuple]:
+        known = {i: features.get(i) for i in dict.fromkeys(ids) if i is not None}
+        missing = [i for i, value in known.items() if value is None]
+        for movie_id, details in (await get_movies_details(missing)).items() if missing else ():
+            known[movie_id] = (
+                [g["name"] for g in details.get("genres", [])],
+                [a["name"] for a in details.get("credits", {}).get("cast", [])[:FEEDBACK_CAST]],
+            )
+            features.set(movie_id, known[movie_id])
+        return known
+
+    async def resolve(chunk: List[HistoryRow]):
+        ids = await resolve_ids(chunk)
+        features_by_id = await movie_features(ids)
+        for row, movie_id in zip(chunk, ids):
+            movie = features_by_id.get(movie_id)
+            if movie is None:
+                stats["unresolved"] += 1
+                continue
+            stats["resolved"] += 1
+            action = row.action
+            if action is None:
+                stats["neutral"] += 1
+                continue
+            stats["liked" if action == "like" else "disliked"] += 1
+            events.append((row.timestamp, movie_id, action, movie))
+
+    chunk: List[HistoryRow] = []
+    with tmdb_priority(BACKGROUND):
+        async for row in _aiter(rows):
+            stats["rows"] += 1
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                await resolve(chunk)
+                chunk = []
+        if chunk:
+            await resolve(chunk)
+
+    # Clamped steps don't commute: fold oldest first, ties in upload order
+    events.sort(key=lambda event: event[0])
+    genres = WeightFold(genre_vocabulary)
+    actors = WeightFold(actor_vocabulary)
+    for i in range(0, len(events), chunk_size):
+        genre_names, genre_deltas, actor_names, actor_deltas = [], [], [], []
+        for _, _, action, (movie_genres, movie_cast) in events[i:i + chunk_size]:
+            genre_delta, actor_delta = FEEDBACK_DELTAS[action]
+            genre_names.extend(movie_genres)
+            genre_deltas.extend([genre_delta] * len(movie_genres))
+            actor_names.extend(movie_cast)
+            actor_deltas.extend([actor_delta] * len(movie_cast))
+        genres.add(genre_names, genre_deltas)
+        actors.add(actor_names, actor_deltas)
+
+    def mutate(profile: dict) -> dict:
+        return {
+            "genre_weights": genres.apply(profile.get("genre_weights") or {}),
+            "actor_weights": actors.apply(profile.get("actor_weights") or {}),
+        }
+
+    stats["updated"] = False
+    if events:
+        stats["updated"] = await asyncio.to_thread(store.modify_profile, uid, mutate)
+    if stats["updated"]:
+        for i in range(0, len(events), chunk_size):
+            interactions = [
+                {"uid": uid, "movie_id": movie_id, "action": action, "timestamp": timestamp}
+                for timestamp, movie_id, action, _ in events[i:i + chunk_size]
+            ]
+            await asyncio.to_thread(store.add_interactions, interactions)
+            await asyncio.to_thread(item_cf.add, interactions)
+            await asyncio.to_thread(mf_model.note_interactions, interactions)
+    return stats
+
+
+async def _aiter(rows) -> AsyncIterator[HistoryRow]:
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+async def aparse_rows(lines: AsyncIterator[str]) -> AsyncIterator[HistoryRow]:
+    """parse_rows over an async line stream, e.g. an HTTP request body"""
+    buffer: List[str] = []
+    header: Optional[str] = None
+    async for line in lines:
+        if header is None:
+            header = line
+            # Reject an unknown format before reading the rest of the upload
+            _column_map(next(csv.reader([header]), []))
+            continue
+        buffer.append(line)
+        if len(buffer) >= IMPORT_CHUNK_SIZE:
+            for row in parse_rows([header] + buffer):
+                yield row
+            buffer = []
+    if header is not None:
+        for row in parse_rows([header] + buffer):
+            yield row
@@ -0,0 +1,301 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.services.cache import LRUCache
+from app.services.profile_store import ProfileStore
+
+
+class ItemCF:
+    """
+    Item-item collaborative filtering over the interactions log. Two movies
+    co-occur when a user likes both within their last `history` events;
+    similarity is the cosine C[i, j] / sqrt(n_i * n_j) over like counts.
+    New interactions are buffered as count deltas and merged into a CSR
+    matrix in batches. After each merge every row is pruned to its
+    `neighbours` most similar movies, so memory grows with the catalog,
+    not the log.
+    """
+
+    def __init__(
+        self,
+        neighbours: int = 50,
+        history: int = 200,
+        max_users: int = 100000,
+        merge_every: int = 50000,
+        merge_interval: float = 30.0,
+    ):
+        self.neighbours = neighbours
+        self.history = history
+        self.merge_every = merge_every
+        self.merge_interval = merge_interval
+
+        self.ids: List[int] = []
+        self._row_by_id: Dict[int, int] = {}
+        self.item_counts = np.zeros(0, dtype=np.float32)
+        # Pruned co-occurrence counts and the matching cosine similarities
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.similarity = sparse.csr_matrix((0, 0), dtype=np.float32)
+        # uid -> {movie_id: +1 like / -1 dislike}, oldest first
+        self._histories = LRUCache(max_size=max_users)
+
+        self._pair_rows: List[int] = []
+        self._pair_cols: List[int] = []
+        self._pair_deltas: List[float] = []
+        self._item_rows: List[int] = []
+        self._item_deltas: List[float] = []
+        self._last_merge = time.monotonic()
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._building = False
+        self._cancel = threading.Event()
+        self.ready = False
+        self.interactions = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _row(self, movie_id: int) -> int:
+        row = self._row_by_id.get(movie_id)
+        if row is None:
+            row = self._row_by_id[movie_id] = len(self.ids)
+            self.ids.append(movie_id)
+        return row
+
+    # Updates
+
+    def add(self, rows: Iterable[dict]):
+        """Fold newly logged interactions (uid, movie_id, action) into the model"""
+        # Until a build finishes, the log itself is the source of truth
+        if not self.ready or self._building:
+            return
+        self._add(rows)
+        self.merge_if_due()
+
+    def _add(self, rows: Iterable[dict]):
+        with self._lock:
+            for row in rows:
+                uid, movie_id = row.get("uid"), row.get("movie_id")
+                if uid is None or movie_id is None:
+                    continue
+                self.interactions += 1
+                history = self._histories.get(uid)
+                if history is None:
+                    history = {}
+                    self._histories.set(uid, history)
+                sign = 1 if row.get("action") == "like" else -1
+                previous = history.pop(movie_id, None)
+
+                # A new like co-occurs with every like still in the window;
+                # a like turned into a dislike takes those counts back
+                delta = 1.0 if sign > 0 and previous != 1 else -1.0 if sign < 0 and previous == 1 else 0.0
+                if delta:
+                    item = self._row(movie_id)
+                    self._item_rows.append(item)
+                    self._item_deltas.append(delta)
+                    for other, other_sign in history.items():
+                        if other_sign > 0:
+                            other_row = self._row(other)
+                            self._pair_rows += (item, other_row)
+                            self._pair_cols += (other_row, item)
+                            self._pair_deltas += (delta, delta)
+
+                history[movie_id] = sign
+                if len(history) > self.history:
+                    del history[next(iter(history))]
+
+    def merge_if_due(self):
+        pending = len(self._pair_deltas) + len(self._item_deltas)
+        if pending and (
+            len(self._pair_deltas) >= self.merge_every
+            or time.monotonic() - self._last_merge >= self.merge_interval
+        ):
+            self.merge()
+
+    def merge(self):
+        """Apply buffered count deltas, recompute similarities and prune rows"""
+        with self._merge_lock:
+            with self._lock:
+                n = len(self.ids)
+                pair_rows, pair_cols, pair_deltas = self._pair_rows, self._pair_cols, self._pair_deltas
+                item_rows, item_deltas = self._item_rows, self._item_deltas
+                self._pair_rows, self._pair_cols, self._pair_deltas = [], [], []
+                self._item_rows, self._item_deltas = [], []
+                self._last_merge = time.monotonic()
+
+            item_counts = np.zeros(n, dtype=np.float32)
+            item_counts[:len(self.item_counts)] = self.item_counts
+            if item_rows:
+                item_counts += np.bincount(item_rows, weights=item_deltas, minlength=n).astype(np.float32)
+            np.maximum(item_counts, 0, out=item_counts)
+
+            counts = _resized(self.counts, n)
+            if pair_rows:
+                delta = sparse.coo_matrix(
+                    (np.asarray(pair_deltas, dtype=np.float32), (pair_rows, pair_cols)), shape=(n, n)
+                ).tocsr()
+                counts = (counts + delta).tocsr()
+            counts.data[counts.data < 0] = 0
+            counts.eliminate_zeros()
+            counts.sum_duplicates()
+
+            counts, similarity = self._pruned(counts, item_counts)
+            self.item_counts, self.counts, self.similarity = item_counts, counts, similarity
+
+    def _pruned(self, counts: sparse.csr_matrix, item_counts: np.ndarray) -> Tuple[sparse.csr_matrix, sparse.csr_matrix]:
+        """Keep each row's `neighbours` most similar entries, in both matrices"""
+        n = counts.shape[0]
+        rows = np.repeat(np.arange(n), np.diff(counts.indptr))
+        norm = np.sqrt(item_counts[rows] * item_counts[counts.indices])
+        cosine = np.divide(counts.data, norm, out=np.zeros_like(counts.data), where=norm > 0)
+        np.minimum(cosine, 1.0, out=cosine)
+
+        # Rows are already grouped; order each row by similarity and keep its head
+        order = np.lexsort((-cosine, rows))
+        rank = np.arange(len(order)) - counts.indptr[rows[order]]
+        keep = np.sort(order[rank < self.neighbours])
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows[keep], minlength=n))])
+        indices = counts.indices[keep]
+        return (
+            sparse.csr_matrix((counts.data[keep], indices, indptr), shape=(n, n)),
+            sparse.csr_matrix((cosine[keep], indices, indptr), shape=(n, n)),
+        )
+
+    def build(self, store: ProfileStore, chunk: int = 10000):
+        """Replay the whole interactions log, oldest first; live adds are skipped meanwhile"""
+        self._building = True
+        self._cancel.clear()
+        try:
+            rows = []
+            for row in store.iter_interactions():
+                if self._cancel.is_set():
+                    return
+                rows.append(row)
+                if len(rows) >= chunk:
+                    self._add(rows)
+                    rows = []
+                    if len(self._pair_deltas) >= self.merge_every:
+                        self.merge()
+            self._add(rows)
+            self.merge()
+            self.ready = True
+        finally:
+            self._building = False
+
+    def cancel_build(self):
+        """Stop a running build early, e.g. on shutdown"""
+        self._cancel.set()
+
+    # Scoring
+
+    def history_for(self, user_profile: dict) -> Dict[int, int]:
+        """The user's recent likes/dislikes, with favorites counting as likes"""
+        with self._lock:
+            history = dict(self._histories.get(user_profile.get("uid")) or {})
+        for movie in user_profile.get("favorite_movies", []):
+            history.setdefault(movie["id"], 1)
+        return history
+
+    def score_matrix(self, histories: List[Dict[int, int]], candidate_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (users, candidates) scores in [0, 1]: the sum of each candidate's
+        similarity to the user's liked movies minus their disliked ones, all
+        users at once in one sparse product. Also returns which users have
+        any history the model knows about.
+        """
+        similarity = self.similarity
+        n = similarity.shape[0]
+        scores = np.zeros((len(histories), len(candidate_ids)), dtype=np.float64)
+        user_rows, item_rows, signs = [], [], []
+        for user, history in enumerate(histories):
+            for movie_id, sign in history.items():
+                row = self._row_by_id.get(movie_id)
+                if row is not None and row < n:
+                    user_rows.append(user)
+                    item_rows.append(row)
+                    signs.append(sign)
+        covered = np.zeros(len(histories), dtype=bool)
+        covered[user_rows] = True
+        if not user_rows or not similarity.nnz:
+            return scores, covered
+
+        candidate_rows = np.array([self._row_by_id.get(m, n) for m in candidate_ids], dtype=np.int64)
+        known = np.flatnonzero(candidate_rows < n)
+        users = sparse.csr_matrix(
+            (np.asarray(signs, dtype=np.float32), (user_rows, item_rows)), shape=(len(histories), n)
+        )
+        raw = (similarity[candidate_rows[known]] @ users.T).toarray().T
+        scores[:, known] = np.clip(raw, 0.0, 1.0)
+        return scores, covered
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "items": len(self.ids),
+            "neighbours": int(self.similarity.nnz),
+            "interactions": self.interactions,
+            "pending_pairs": len(self._pair_deltas),
+        }
+
+    # Snapshots, so the precompute workers don't each replay the log
+
+    def save(self, path: str):
+        self.merge()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        histories = self._histories.items()
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            ids=np.asarray(self.ids, dtype=np.int64),
+            item_counts=self.item_counts,
+            counts_data=self.counts.data,
+            counts_indices=self.counts.indices,
+            counts_indptr=self.counts.indptr,
+            history_uids=np.asarray([uid for uid, _ in histories], dtype=str),
+            history_offsets=np.cumsum([0] + [len(h) for _, h in histories]),
+            history_items=np.asarray([m for _, h in histories for m in h], dtype=np.int64),
+            history_signs=np.asarray([s for _, h in histories for s in h.values()], dtype=np.int8),
+        )
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as snapshot:
+            ids = snapshot["ids"].tolist()
+            n = len(ids)
+            counts = sparse.csr_matrix(
+                (snapshot["counts_data"], snapshot["counts_indices"], snapshot["counts_indptr"]), shape=(n, n)
+            )
+            item_counts = snapshot["item_counts"]
+            uids, offsets = snapshot["history_uids"].tolist(), snapshot["history_offsets"]
+            items, signs = snapshot["history_items"].tolist(), snapshot["history_signs"].tolist()
+        with self._merge_lock, self._lock:
+            self.ids = ids
+            self._row_by_id = {movie_id: row for row, movie_id in enumerate(ids)}
+            self.item_counts = item_counts
+            for i, uid in enumerate(uids):
+                self._histories.set(uid, dict(zip(items[offsets[i]:offsets[i + 1]], signs[offsets[i]:offsets[i + 1]])))
+            self.counts, self.similarity = self._pruned(counts, item_counts)
+        self.ready = True
+        return True
+
+
+def _resized(matrix: sparse.csr_matrix, n: int) -> sparse.csr_matrix:
+    """A square CSR matrix grown to n rows and columns"""
+    indptr = np.concatenate([matrix.indptr, np.full(n - matrix.shape[0], matrix.indptr[-1])])
+    return sparse.csr_matrix((matrix.data, matrix.indices, indptr), shape=(n, n))
+
+
+ITEM_CF_PATH = os.getenv("ITEM_CF_PATH", "./.cache/item_cf.npz")
+
+item_cf = ItemCF(
+    neighbours=int(os.getenv("ITEM_CF_NEIGHBOURS", "50")),
+    history=int(os.getenv("ITEM_CF_USER_HISTORY", "200")),
+    max_users=int(os.getenv("ITEM_CF_MAX_USERS", "100000")),
+    merge_every=int(os.getenv("ITEM_CF_MERGE_EVERY", "50000")),
+)
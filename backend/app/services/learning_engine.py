@@ -1,46 +1,46 @@
-from typing import Dict
+from typing import Dict, List, Tuple
+from app.services.compact_profile import (
+    DEFAULT_WEIGHT,
+    FEEDBACK_CAST,
+    FEEDBACK_DELTAS,
+    WEIGHT_MAX,
+    WEIGHT_MIN,
+)
 
 def clamp(value: float, min_val: float, max_val: float) -> float:
     """Clamp value between min and max"""
     return max(min_val, min(max_val, value))
 
-def update_weights_from_feedback(
-    user_profile: dict,
-    movie_data: dict,
-    action: str
-) -> dict:
-    """Update user preference weights based on feedback"""
-    
-    genre_weights = user_profile.get("genre_weights", {}).copy()
-    actor_weights = user_profile.get("actor_weights", {}).copy()
-    
-    movie_genres = [g["name"] for g in movie_data.get("genres", [])]
-    credits = movie_data.get("credits", {})
-    movie_actors = [a["name"] for a in credits.get("cast", [])[:3]]
-    
-    if action == "like":
-        # Increase weights for genres
-        for genre in movie_genres:
-            current = genre_weights.get(genre, 1.0)
-            genre_weights[genre] = clamp(current + 0.05, 0.1, 2.0)
-        
-        # Increase weights for actors
-        for actor in movie_actors:
-            current = actor_weights.get(actor, 1.0)
-            actor_weights[actor] = clamp(current + 0.04, 0.1, 2.0)
+def _apply_feedback(genre_weights: dict, actor_weights: dict, movie_data: dict, action: str):
+    """Clamp-and-add one feedback event into weight dicts, in place"""
+    deltas = FEEDBACK_DELTAS.get(action)
+    if deltas is None:
+        return
+    genre_delta, actor_delta = deltas
     
-    elif action == "dislike":
-        # Decrease weights for genres
-        for genre in movie_genres:
-            current = genre_weights.get(genre, 1.0)
-            genre_weights[genre] = clamp(current - 0.03, 0.1, 2.0)
-        
-        # Slightly decrease actor weights
-        for actor in movie_actors:
-            current = actor_weights.get(actor, 1.0)
-            actor_weights[actor] = clamp(current - 0.02, 0.1, 2.0)
+    for genre in movie_data.get("genres", []):
+        current = genre_weights.get(genre["name"], DEFAULT_WEIGHT)
+        genre_weights[genre["name"]] = clamp(current + genre_delta, WEIGHT_MIN, WEIGHT_MAX)
     
+    for actor in movie_data.get("credits", {}).get("cast", [])[:FEEDBACK_CAST]:
+        current = actor_weights.get(actor["name"], DEFAULT_WEIGHT)
+        actor_weights[actor["name"]] = clamp(current + actor_delta, WEIGHT_MIN, WEIGHT_MAX)
+
+def fold_feedback(user_profile: dict, events: List[Tuple[dict, str]]) -> Dict[str, dict]:
+    """Apply (movie_data, action) events in order, copying the weight dicts once"""
+    genre_weights = dict(user_profile.get("genre_weights", {}))
+    actor_weights = dict(user_profile.get("actor_weights", {}))
+    for movie_data, action in events:
+        _apply_feedback(genre_weights, actor_weights, movie_data, action)
     return {
         "genre_weights": genre_weights,
         "actor_weights": actor_weights
     }
+
+def update_weights_from_feedback(
+    user_profile: dict,
+    movie_data: dict,
+    action: str
+) -> dict:
+    """Update user preference weights based on feedback"""
+    return fold_feedback(user_profile, [(movie_data, action)])
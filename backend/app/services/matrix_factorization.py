@@ -0,0 +1,363 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.services.cache import LRUCache
+
+# Share of the final score taken by the latent-factor score, where the model knows both sides
+MF_BLEND_WEIGHT = float(os.getenv("MF_BLEND_WEIGHT", "0.2"))
+
+
+def _seconds(timestamp) -> float:
+    """Epoch seconds of a logged timestamp (datetime or number); -inf if missing"""
+    if timestamp is None:
+        return float("-inf")
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return float(timestamp)
+
+
+def interaction_matrix(interactions: Iterable[dict]):
+    """
+    Users x movies CSR arrays from the interactions log, the action with the
+    latest timestamp per pair winning (log order breaks ties, and rows
+    without a timestamp count as oldest). Returns (uids, movie_ids, indptr, indices, liked), with
+    uids and movie_ids sorted so rows and columns can be found by bisection.
+    """
+    uid_index: Dict[str, int] = {}
+    user_col, movie_col, like_col, time_col = [], [], [], []
+    for row in interactions:
+        uid, movie_id = row.get("uid"), row.get("movie_id")
+        if uid is None or movie_id is None:
+            continue
+        user_col.append(uid_index.setdefault(uid, len(uid_index)))
+        movie_col.append(int(movie_id))
+        like_col.append(row.get("action") == "like")
+        time_col.append(_seconds(row.get("timestamp")))
+
+    uids = np.array(sorted(uid_index), dtype=str)
+    user_rank = np.empty(len(uid_index), dtype=np.int64)
+    user_rank[[uid_index[uid] for uid in uids.tolist()]] = np.arange(len(uids))
+    users = user_rank[np.asarray(user_col, dtype=np.int64)] if user_col else np.zeros(0, dtype=np.int64)
+    movie_ids, movies = np.unique(np.asarray(movie_col, dtype=np.int64), return_inverse=True)
+    liked = np.asarray(like_col, dtype=np.int8)
+    times = np.asarray(time_col, dtype=np.float64)
+
+    # Keep the latest event per (user, movie): the last entry of each run
+    # once sorted by time within the pair (lexsort is stable for ties)
+    order = np.lexsort((times, movies, users))
+    users, movies, liked = users[order], movies[order], liked[order]
+    last = np.ones(len(users), dtype=bool)
+    if len(users):
+        last[:-1] = (users[1:] != users[:-1]) | (movies[1:] != movies[:-1])
+    users, movies, liked = users[last], movies[last], liked[last]
+
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(users, minlength=len(uids)))]).astype(np.int64)
+    return uids, movie_ids, indptr, movies.astype(np.int32), liked
+
+
+def _transpose(indptr: np.ndarray, indices: np.ndarray, values: np.ndarray, columns: int):
+    """CSR arrays of the transposed matrix"""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    t_indptr = np.concatenate([[0], np.cumsum(np.bincount(indices, minlength=columns))]).astype(np.int64)
+    return t_indptr, rows[order].astype(np.int32), values[order]
+
+
+def _conjugate_gradient(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    liked: np.ndarray,
+    other: np.ndarray,
+    x: np.ndarray,
+    regularization: float,
+    alpha: float,
+    steps: int = 3,
+) -> np.ndarray:
+    """
+    One implicit-ALS half-step: re-solve every row's factors with `other`
+    fixed. Observed entries have confidence 1 + alpha and preference 1 for a
+    like, 0 for a dislike; everything else confidence 1, preference 0.
+    Every row's system is solved at once by a few conjugate-gradient steps
+    warm-started from `x`, so a step costs two sparse products rather than
+    a k x k factorisation per row.
+    """
+    n, m = len(indptr) - 1, other.shape[0]
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    gram = other.T @ other + regularization * np.eye(other.shape[1], dtype=other.dtype)
+    y = other[indices]
+
+    def product(v: np.ndarray) -> np.ndarray:
+        # (gram + alpha * Y_u' Y_u) v_u for every row u
+        weights = alpha * np.einsum("ij,ij->i", y, v[rows])
+        return v @ gram + sparse.csr_matrix((weights, indices, indptr), shape=(n, m)) @ other
+
+    targets = (1 + alpha) * (sparse.csr_matrix((liked, indices, indptr), shape=(n, m)) @ other)
+    residual = targets - product(x)
+    direction = residual.copy()
+    norm = np.einsum("ij,ij->i", residual, residual)
+    for _ in range(steps):
+        moved = product(direction)
+        curvature = np.einsum("ij,ij->i", direction, moved)
+        step = np.divide(norm, curvature, out=np.zeros_like(norm), where=curvature > 0)[:, np.newaxis]
+        x = x + step * direction
+        residual -= step * moved
+        new_norm = np.einsum("ij,ij->i", residual, residual)
+        ratio = np.divide(new_norm, norm, out=np.zeros_like(norm), where=norm > 0)[:, np.newaxis]
+        direction = residual + ratio * direction
+        norm = new_norm
+    return x
+
+
+def train_als(
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    liked: np.ndarray,
+    num_items: int,
+    factors: int = 32,
+    regularization: float = 0.1,
+    alpha: float = 20.0,
+    iterations: int = 15,
+    seed: int = 7,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Implicit-feedback ALS (Hu, Koren & Volinsky) over a users x movies CSR; returns (user, item) factors"""
+    rng = np.random.default_rng(seed)
+    num_users = len(indptr) - 1
+    liked = liked.astype(np.float32)
+    t_indptr, t_indices, t_liked = _transpose(indptr, indices, liked, num_items)
+    user_factors = np.zeros((num_users, factors), dtype=np.float32)
+    item_factors = rng.normal(scale=0.01, size=(num_items, factors)).astype(np.float32)
+    for _ in range(iterations):
+        user_factors = _conjugate_gradient(indptr, indices, liked, item_factors, user_factors, regularization, alpha)
+        item_factors = _conjugate_gradient(t_indptr, t_indices, t_liked, user_factors, item_factors, regularization, alpha)
+    # Finish on the user side so stored vectors agree with what fold-in solves
+    user_factors = _conjugate_gradient(indptr, indices, liked, item_factors, user_factors, regularization, alpha, steps=10)
+    return user_factors, item_factors
+
+
+def write_model(
+    path: str,
+    uids: np.ndarray,
+    movie_ids: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    liked: np.ndarray,
+    user_factors: np.ndarray,
+    item_factors: np.ndarray,
+    params: dict,
+) -> int:
+    """Publish trained factors as a new model version, switching to it atomically"""
+    manifest_path = os.path.join(path, "manifest.json")
+    previous = _read_manifest(manifest_path)
+    version = (previous or {}).get("version", 0) + 1
+    version_dir = os.path.join(path, f"v{version}")
+    os.makedirs(version_dir, exist_ok=True)
+
+    arrays = {
+        "uids": uids,
+        "movie_ids": movie_ids,
+        "user_factors": user_factors,
+        "item_factors": item_factors,
+        # Each user's training interactions, re-solved together with newer ones on fold-in
+        "indptr": indptr,
+        "indices": indices,
+        "liked": liked,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(version_dir, f"{name}.npy"), array)
+
+    manifest = {
+        "version": version,
+        "users": int(len(uids)),
+        "items": int(len(movie_ids)),
+        "interactions": int(len(indices)),
+        "trained_at": datetime.utcnow().isoformat(),
+        **params,
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+    # Keep the previous version around for readers that still have it mapped
+    if previous and previous.get("version", 0) > 1:
+        shutil.rmtree(os.path.join(path, f"v{previous['version'] - 1}"), ignore_errors=True)
+    return version
+
+
+def _read_manifest(manifest_path: str) -> Optional[dict]:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class MFModel:
+    """
+    Memory-mapped user/item factors from the last train_mf run. Feedback
+    that arrives afterwards is folded in: the user's vector is re-solved
+    against the fixed item factors from their training interactions plus
+    the newer ones, a single k x k solve.
+    """
+
+    RELOAD_CHECK_INTERVAL = 5.0  # seconds between manifest checks
+
+    def __init__(self, path: str, max_users: int = 100000):
+        self.path = path
+        self.manifest: Optional[dict] = None
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._gram: Optional[np.ndarray] = None
+        self._manifest_mtime = None
+        self._last_check = 0.0
+        # uid -> {movie_id: liked} logged since training, and the re-solved vectors
+        self._recent = LRUCache(max_size=max_users)
+        self._folded = LRUCache(max_size=max_users)
+
+    @property
+    def available(self) -> bool:
+        self.reload_if_changed()
+        return bool(self._arrays) and len(self._arrays["movie_ids"]) > 0
+
+    def reload_if_changed(self, force: bool = False):
+        """Re-map the factors when train_mf has published a new version"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.RELOAD_CHECK_INTERVAL:
+            return
+        self._last_check = now
+
+        manifest_path = os.path.join(self.path, "manifest.json")
+        try:
+            mtime = os.stat(manifest_path).st_mtime
+        except OSError:
+            return
+        if mtime == self._manifest_mtime and not force:
+            return
+
+        manifest = _read_manifest(manifest_path)
+        if manifest is None:
+            return
+        version_dir = os.path.join(self.path, f"v{manifest['version']}")
+        arrays = {
+            filename[:-4]: np.load(os.path.join(version_dir, filename), mmap_mode="r")
+            for filename in os.listdir(version_dir) if filename.endswith(".npy")
+        }
+        item_factors = np.asarray(arrays["item_factors"], dtype=np.float64)
+        factors = item_factors.shape[1]
+
+        self._arrays = arrays
+        self._gram = item_factors.T @ item_factors + manifest["regularization"] * np.eye(factors)
+        # Vectors solved against the old item factors don't fit the new ones
+        self._folded.clear()
+        self.manifest = manifest
+        self._manifest_mtime = mtime
+
+    def _user_row(self, uid: str) -> Optional[int]:
+        uids = self._arrays["uids"]
+        row = int(np.searchsorted(uids, uid))
+        if row < len(uids) and uids[row] == uid:
+            return row
+        return None
+
+    def _item_rows(self, movie_ids) -> np.ndarray:
+        """Factor rows for movie ids; -1 where the model hasn't seen a movie"""
+        known = self._arrays["movie_ids"]
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(known, movie_ids), len(known) - 1)
+        return np.where(known[rows] == movie_ids, rows, -1)
+
+    def history(self, uid: str) -> Dict[int, int]:
+        """movie id -> liked (1) / disliked (0): training interactions overlaid with newer ones"""
+        history = {}
+        row = self._user_row(uid)
+        if row is not None:
+            indptr = self._arrays["indptr"]
+            lo, hi = indptr[row], indptr[row + 1]
+            movie_ids = self._arrays["movie_ids"][self._arrays["indices"][lo:hi]]
+            history = dict(zip(movie_ids.tolist(), self._arrays["liked"][lo:hi].tolist()))
+        history.update(self._recent.get(uid) or {})
+        return history
+
+    def fold_in(self, history: Dict[int, int]) -> np.ndarray:
+        """Solve one user's vector against the fixed item factors"""
+        rows = self._item_rows(list(history))
+        known = rows >= 0
+        y = np.asarray(self._arrays["item_factors"][rows[known]], dtype=np.float64)
+        liked = np.fromiter(history.values(), dtype=np.float64, count=len(history))[known]
+        alpha = self.manifest["alpha"]
+        system = self._gram + alpha * (y.T @ y)
+        return np.linalg.solve(system, (1 + alpha) * (y.T @ liked))
+
+    def note_interactions(self, rows: Iterable[dict]):
+        """Record newly logged interactions and re-solve the affected users"""
+        if not self.available:
+            return
+        uids = []
+        for row in rows:
+            uid, movie_id = row.get("uid"), row.get("movie_id")
+            if uid is None or movie_id is None:
+                continue
+            recent = self._recent.get(uid)
+            if recent is None:
+                recent = {}
+                self._recent.set(uid, recent)
+            recent[int(movie_id)] = 1 if row.get("action") == "like" else 0
+            uids.append(uid)
+        for uid in dict.fromkeys(uids):
+            self._folded.set(uid, self.fold_in(self.history(uid)))
+
+    def user_vector(self, user_profile: dict) -> Optional[np.ndarray]:
+        """Folded-in or trained vector; users the model never saw are folded in from their favorites"""
+        uid = user_profile.get("uid")
+        vector = self._folded.get(uid)
+        if vector is not None:
+            return vector
+        row = self._user_row(uid) if uid else None
+        if row is not None:
+            return np.asarray(self._arrays["user_factors"][row], dtype=np.float64)
+        favorites = {m["id"]: 1 for m in user_profile.get("favorite_movies", [])}
+        if not favorites or not (self._item_rows(list(favorites)) >= 0).any():
+            return None
+        vector = self.fold_in(favorites)
+        if uid:
+            self._folded.set(uid, vector)
+        return vector
+
+    def score_matrix(self, user_profiles: List[dict], movie_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (users, movies) predicted preference clipped to [0, 1], and a mask of
+        the entries the model has factors for on both sides
+        """
+        scores = np.zeros((len(user_profiles), len(movie_ids)))
+        known = np.zeros(scores.shape, dtype=bool)
+        if not self.available or not movie_ids:
+            return scores, known
+        vectors = [self.user_vector(profile) for profile in user_profiles]
+        users = [i for i, vector in enumerate(vectors) if vector is not None]
+        items = np.flatnonzero(self._item_rows(movie_ids) >= 0)
+        if not users or not len(items):
+            return scores, known
+        item_factors = np.asarray(self._arrays["item_factors"][self._item_rows(np.asarray(movie_ids)[items])])
+        scores[np.ix_(users, items)] = np.clip(np.vstack([vectors[i] for i in users]) @ item_factors.T, 0.0, 1.0)
+        known[np.ix_(users, items)] = True
+        return scores, known
+
+    def stats(self) -> Dict:
+        if not self.available:
+            return {"available": False}
+        return {
+            "available": True,
+            "version": self.manifest["version"],
+            "users": self.manifest["users"],
+            "items": self.manifest["items"],
+            "folded_users": len(self._folded.items()),
+        }
+
+
+mf_model = MFModel(os.getenv("MF_PATH", "./data/mf"))
@@ -0,0 +1,176 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Gauge:
+    """
+    Point-in-time value read from a callback at scrape time. With a label
+    name, the callback returns {label value: value}.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], float], labelname: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.labelname = labelname
+
+    def render(self) -> List[str]:
+        try:
+            if self.labelname is None:
+                return [f"{self.name} {float(self.callback())}"]
+            return [
+                f"{self.name}{_format_labels((self.labelname,), (label,))} {float(value)}"
+                for label, value in self.callback().items()
+            ]
+        except Exception:
+            return []
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._values.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, callback: Callable[[], float], labelname: Optional[str] = None) -> Gauge:
+        return self.register(Gauge(name, help, callback, labelname))
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+PIPELINE_STAGE_SECONDS = registry.histogram(
+    "cinematch_pipeline_stage_seconds", "Time spent in each recommendation pipeline stage", ["stage"]
+)
+TMDB_REQUEST_SECONDS = registry.histogram(
+    "cinematch_tmdb_request_seconds", "Upstream TMDB request latency by endpoint class", ["endpoint"]
+)
+TMDB_CACHE_REQUESTS = registry.counter(
+    "cinematch_tmdb_cache_requests_total", "TMDB response cache lookups by endpoint class", ["endpoint", "result"]
+)
+TMDB_RETRIES = registry.counter(
+    "cinematch_tmdb_retries_total", "TMDB attempts retried, by status code or transport error", ["reason"]
+)
+SINGLEFLIGHT_CALLS = registry.counter(
+    "cinematch_singleflight_calls_total", "Deduplicated calls that ran upstream (executed) or joined one in flight (coalesced)",
+    ["group", "role"],
+)
+CACHE_WARMER_FETCHES = registry.counter(
+    "cinematch_cache_warmer_fetches_total", "TMDB responses fetched ahead of demand, by reason", ["reason"]
+)
+SEARCH_REQUESTS = registry.counter(
+    "cinematch_search_requests_total", "Title searches by where they were answered", ["source"]
+)
+ERRORS = registry.counter("cinematch_errors_total", "Errors by location", ["where"])
+
+
+@contextmanager
+def timed(stage: str):
+    """Record the duration of a pipeline stage"""
+    with PIPELINE_STAGE_SECONDS.time(stage=stage):
+        yield
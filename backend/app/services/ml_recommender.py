@@ -1,46 +1,41 @@
-import random
-from typing import List, Dict
+import os
+from itertools import chain
+from typing import List, Dict, Optional
 import numpy as np
+from scipy import sparse
+from app.services.item_cf import item_cf
+from app.services.vocabulary import actor_vocabulary, genre_vocabulary
 
-def add_exploration_diversity(
-    recommendations: List[Dict],
-    exploration_rate: float = 0.15
-) -> List[Dict]:
+# Slots filled by MMR re-ranking; the rest of a ranking stays in score order
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "100"))
+# 0 ranks by score alone, 1 by novelty alone
+RERANK_DIVERSITY = float(os.getenv("RERANK_DIVERSITY", "0.3"))
+# Leading slots never given to exploration
+EXPLOIT_FIRST = 3
+# Actor feature ids follow every possible genre id
+ACTOR_FEATURE_OFFSET = 1 << 31
+
+def collaborative_scores(user_profiles: List[Dict], movies: List[Dict]) -> np.ndarray:
     """
-    Add exploration vs exploitation balance
-    85% top matches, 15% diverse picks for discovery
+    (users, movies) collaborative scores in [0, 1] from item-item CF.
+    Users with no history the model knows get popularity instead.
     """
-    if len(recommendations) < 5:
-        return recommendations
-    
-    num_exploit = int(len(recommendations) * (1 - exploration_rate))
-    num_explore = len(recommendations) - num_exploit
-    
-    # Top recommendations (exploitation)
-    top_picks = recommendations[:num_exploit]
-    
-    # Random diverse picks (exploration)
-    remaining = recommendations[num_exploit:]
-    if len(remaining) > num_explore:
-        explore_picks = random.sample(remaining, num_explore)
-    else:
-        explore_picks = remaining
-    
-    # Interleave for better UX
-    result = top_picks + explore_picks
-    random.shuffle(result[num_exploit//2:])  # Shuffle latter half
-    
-    return result
+    cf_scores, covered = item_cf.score_matrix(
+        [item_cf.history_for(profile) for profile in user_profiles],
+        [movie["id"] for movie in movies]
+    )
+    popularity = np.array([movie.get("popularity", 0) or 0 for movie in movies], dtype=np.float64)
+    return np.where(covered[:, np.newaxis], cf_scores, np.minimum(popularity / 100, 1.0)[np.newaxis, :])
 
 def apply_collaborative_signal(
     content_score: float,
-    popularity: float,
+    cf_score: float,
     blend_weight: float = 0.15
 ) -> float:
     """
-    Blend content-based score with popularity (collaborative signal proxy)
+    Blend content-based score with a collaborative score in [0, 1]
+    Accepts scalars or numpy arrays
     """
-    cf_score = min(popularity / 100, 1.0)
     return (1 - blend_weight) * content_score + blend_weight * cf_score
 
 def boost_trending_movies(
@@ -56,25 +51,101 @@ def boost_trending_movies(
         return min(base_score + trending_boost, 1.0)
     return base_score
 
-def diversity_filter(
+def feature_ids(details: List[Dict]) -> List[List[int]]:
+    """
+    Interned genre + actor ids of each row's {"genres", "actors"} details,
+    the features MMR compares. Actor ids are offset past every genre id.
+    """
+    genres = [d.get("genres", []) for d in details]
+    actors = [d.get("actors", []) for d in details]
+    genre_ids = genre_vocabulary.intern_many([name for names in genres for name in names]).tolist()
+    actor_ids = actor_vocabulary.intern_many([name for names in actors for name in names]).astype(np.int64)
+    actor_ids = (actor_ids + ACTOR_FEATURE_OFFSET).tolist()
+    rows, g, a = [], 0, 0
+    for movie_genres, movie_actors in zip(genres, actors):
+        rows.append(genre_ids[g:g + len(movie_genres)] + actor_ids[a:a + len(movie_actors)])
+        g += len(movie_genres)
+        a += len(movie_actors)
+    return rows
+
+def _feature_matrix(recommendations: List[Dict]) -> sparse.csr_matrix:
+    """
+    Unit-length genre + actor multi-hot rows, one column per feature present
+    in the batch. Rows scored with their feature_ids aren't interned again.
+    """
+    ids = [rec.get("feature_ids") for rec in recommendations]
+    if None in ids:
+        missing = [i for i, row in enumerate(ids) if row is None]
+        for i, row in zip(missing, feature_ids([recommendations[i].get("details", {}) for i in missing])):
+            ids[i] = row
+    
+    counts = np.fromiter(map(len, ids), dtype=np.int64, count=len(ids))
+    flat = np.fromiter(chain.from_iterable(ids), dtype=np.int64, count=int(counts.sum()))
+    columns, indices = np.unique(flat, return_inverse=True)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    weights = np.repeat(1.0 / np.sqrt(np.maximum(counts, 1)), counts)
+    return sparse.csr_matrix((weights, indices.ravel(), indptr), shape=(len(ids), len(columns)))
+
+
+def mmr_rerank(
     recommendations: List[Dict],
-    genre_diversity_threshold: int = 3
+    top_k: int = RERANK_TOP_K,
+    diversity: float = RERANK_DIVERSITY,
+    exploration_rate: float = 0.15,
+    seed: Optional[int] = None
 ) -> List[Dict]:
     """
-    Ensure genre diversity in recommendations
+    Maximal-marginal-relevance re-ranking. Each of the first top_k slots
+    takes the candidate maximising
+    (1 - diversity) * relevance - diversity * max similarity to the picks so far
+    (cosine over genres + actors, relevance = score scaled to [0, 1]); the
+    rest follow by score. When seeded, exploration_rate of the slots after
+    the first few go to random candidates from below the top_k by score,
+    reproducibly for the same seed.
     """
-    seen_genres = set()
-    diverse_recs = []
+    n = len(recommendations)
+    scores = np.fromiter((rec["score"] for rec in recommendations), dtype=np.float64, count=n)
+    order = np.argsort(-scores, kind="stable")
+    ranked = [recommendations[i] for i in order.tolist()]
+    scores = scores[order]
+    top_k = min(top_k, n)
+    if top_k == 0:
+        return ranked
+    
+    spread = scores[0] - scores[-1]
+    relevance = (scores - scores[-1]) / spread if spread > 0 else np.ones(n)
+    features = _feature_matrix(ranked)
+    
+    # Exploration slots and the tail they draw from
+    explore_slots = set()
+    if seed is not None and n > top_k:
+        rng = np.random.default_rng(seed)
+        slots = np.arange(min(EXPLOIT_FIRST, top_k), top_k)
+        count = min(int(round(top_k * exploration_rate)), len(slots))
+        explore_slots = set(rng.choice(slots, size=count, replace=False).tolist())
     
-    for rec in recommendations:
-        movie_genres = set(rec.get("details", {}).get("genres", []))
-        
-        # Allow if introduces new genres or we don't have many yet
-        if len(movie_genres - seen_genres) > 0 or len(diverse_recs) < genre_diversity_threshold:
-            diverse_recs.append(rec)
-            seen_genres.update(movie_genres)
+    available = np.ones(n, dtype=bool)
+    # Each candidate's highest similarity to anything picked so far
+    max_similarity = np.zeros(n)
+    picked = np.zeros(features.shape[1])
+    selected = []
+    for slot in range(top_k):
+        tail = np.flatnonzero(available[top_k:]) + top_k if slot in explore_slots else ()
+        if len(tail):
+            pick = int(rng.choice(tail))
+        else:
+            gain = (1 - diversity) * relevance - diversity * max_similarity
+            gain[~available] = -np.inf
+            pick = int(np.argmax(gain))
+        selected.append(pick)
+        available[pick] = False
+        # Incremental update: one sparse mat-vec against the new pick
+        columns = features.indices[features.indptr[pick]:features.indptr[pick + 1]]
+        picked[columns] = features.data[features.indptr[pick]:features.indptr[pick + 1]]
+        np.maximum(max_similarity, features @ picked, out=max_similarity)
+        picked[columns] = 0.0
     
-    return diverse_recs
+    return [ranked[i] for i in selected] + [ranked[i] for i in np.flatnonzero(available)]
 
 def calculate_confidence_score(
     genre_similarity: float,
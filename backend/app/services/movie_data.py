@@ -0,0 +1,39 @@
+from typing import Dict, List
+from app.services.catalog_store import catalog_store
+from app.services.tmdb_client import async_tmdb_client
+
+SUMMARY_FIELDS = (
+    "id", "title", "overview", "release_date", "poster_path", "backdrop_path",
+    "vote_average", "vote_count", "popularity", "original_language",
+)
+
+def movie_summary(movie: Dict) -> Dict:
+    """List-result shape (with genre_ids) of a list result or full details payload"""
+    summary = {field: movie.get(field) for field in SUMMARY_FIELDS}
+    if "genre_ids" in movie:
+        summary["genre_ids"] = list(movie["genre_ids"])
+    else:
+        summary["genre_ids"] = [g["id"] for g in movie.get("genres", [])]
+    return summary
+
+async def get_movies_details(movie_ids: List[int]) -> Dict[int, Dict]:
+    """Resolve movie details from the local catalog, falling back to TMDB for misses"""
+    details = catalog_store.get_movies_details(movie_ids) if catalog_store.available else {}
+    missing = [movie_id for movie_id in movie_ids if movie_id not in details]
+    if missing:
+        details.update(await async_tmdb_client.get_movies_details(missing))
+    return details
+
+async def get_movie_details(movie_id: int) -> Dict:
+    """Resolve a single movie's details, raising if TMDB lookup fails"""
+    if catalog_store.available:
+        movie = catalog_store.get_movie_details(movie_id)
+        if movie is not None:
+            return movie
+    return await async_tmdb_client.get_movie_details(movie_id)
+
+async def get_candidate_movies(page: int = 1, min_rating: float = 6.0) -> List[Dict]:
+    """Candidate pool: catalog by popularity when ingested, else TMDB's popular list"""
+    if catalog_store.available:
+        return catalog_store.popular_movies(page=page, min_rating=min_rating)
+    return await async_tmdb_client.get_popular_movies(page=page, min_rating=min_rating)
@@ -0,0 +1,348 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.services.cache import LRUCache
+
+# mutate(profile) -> fields to update, or None to leave the profile untouched
+ProfileMutation = Callable[[dict], Optional[dict]]
+
+
+class ProfileStore(ABC):
+    """Storage for user profiles and the interaction log"""
+
+    @abstractmethod
+    def get_profile(self, uid: str) -> Optional[dict]:
+        """The profile, or None if it doesn't exist"""
+
+    @abstractmethod
+    def get_profiles(self, uids: List[str]) -> Dict[str, dict]:
+        """Batched read; missing profiles are omitted"""
+
+    @abstractmethod
+    def set_profile(self, uid: str, data: dict):
+        """Create or replace a profile, stamping created_at/updated_at"""
+
+    @abstractmethod
+    def modify_profile(self, uid: str, mutate: ProfileMutation, version_increment: int = 1) -> bool:
+        """
+        Atomic read-modify-write. Bumps profile_version and updated_at with the
+        returned fields. Returns False if the profile doesn't exist or mutate
+        returned None.
+        """
+
+    @abstractmethod
+    def add_interactions(self, rows: List[dict]):
+        """Bulk append interaction rows (uid, movie_id, action, timestamp)"""
+
+    @abstractmethod
+    def iter_interactions(self) -> Iterator[dict]:
+        """Every interaction row, streamed oldest first; replaying models depend on the order"""
+
+    @abstractmethod
+    def iter_profiles(self) -> Iterator[dict]:
+        """Every profile, streamed"""
+
+
+class FirestoreProfileStore(ProfileStore):
+    BATCH_SIZE = 500  # Firestore batch write limit
+
+    def __init__(self, db):
+        from firebase_admin import firestore
+        self._firestore = firestore
+        self.db = db
+
+    def _ref(self, uid: str):
+        return self.db.collection("user_profiles").document(uid)
+
+    def get_profile(self, uid: str) -> Optional[dict]:
+        doc = self._ref(uid).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_profiles(self, uids: List[str]) -> Dict[str, dict]:
+        docs = self.db.get_all([self._ref(uid) for uid in uids])
+        return {doc.id: doc.to_dict() for doc in docs if doc.exists}
+
+    def set_profile(self, uid: str, data: dict):
+        self._ref(uid).set({
+            **data,
+            "created_at": self._firestore.SERVER_TIMESTAMP,
+            "updated_at": self._firestore.SERVER_TIMESTAMP,
+        })
+
+    def modify_profile(self, uid: str, mutate: ProfileMutation, version_increment: int = 1) -> bool:
+        profile_ref = self._ref(uid)
+
+        @self._firestore.transactional
+        def update(transaction):
+            snapshot = profile_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                return False
+            fields = mutate(snapshot.to_dict())
+            if fields is None:
+                return False
+            transaction.update(profile_ref, {
+                **fields,
+                "profile_version": self._firestore.Increment(version_increment),
+                "updated_at": self._firestore.SERVER_TIMESTAMP,
+            })
+            return True
+
+        return update(self.db.transaction())
+
+    def add_interactions(self, rows: List[dict]):
+        interactions = self.db.collection("interactions")
+        for i in range(0, len(rows), self.BATCH_SIZE):
+            batch = self.db.batch()
+            for row in rows[i:i + self.BATCH_SIZE]:
+                batch.set(interactions.document(), row)
+            batch.commit()
+
+    def iter_interactions(self) -> Iterator[dict]:
+        for doc in self.db.collection("interactions").order_by("timestamp").stream():
+            yield doc.to_dict()
+
+    def iter_profiles(self) -> Iterator[dict]:
+        for doc in self.db.collection("user_profiles").stream():
+            yield doc.to_dict()
+
+
+class SQLiteProfileStore(ProfileStore):
+    """Local backend for development and load tests; use ':memory:' for RAM only"""
+
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS profiles (uid TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS interactions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, uid TEXT NOT NULL, movie_id INTEGER NOT NULL, "
+            "action TEXT NOT NULL, timestamp REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS interactions_by_time ON interactions (timestamp, id)")
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def _read(self, uid: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT data FROM profiles WHERE uid = ?", (uid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, uid: str, data: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO profiles (uid, data) VALUES (?, ?)", (uid, json.dumps(data))
+        )
+
+    def get_profile(self, uid: str) -> Optional[dict]:
+        with self._lock:
+            return self._read(uid)
+
+    def get_profiles(self, uids: List[str]) -> Dict[str, dict]:
+        if not uids:
+            return {}
+        placeholders = ",".join("?" * len(uids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT uid, data FROM profiles WHERE uid IN ({placeholders})", list(uids)
+            ).fetchall()
+        return {uid: json.loads(data) for uid, data in rows}
+
+    def set_profile(self, uid: str, data: dict):
+        now = self._now()
+        with self._lock:
+            self._write(uid, {**data, "created_at": now, "updated_at": now})
+
+    def modify_profile(self, uid: str, mutate: ProfileMutation, version_increment: int = 1) -> bool:
+        with self._lock:
+            profile = self._read(uid)
+            if profile is None:
+                return False
+            fields = mutate(profile)
+            if fields is None:
+                return False
+            profile.update(fields)
+            profile["profile_version"] = profile.get("profile_version", 0) + version_increment
+            profile["updated_at"] = self._now()
+            self._write(uid, profile)
+            return True
+
+    def add_interactions(self, rows: List[dict]):
+        def timestamp(row):
+            ts = row.get("timestamp")
+            return ts.timestamp() if isinstance(ts, datetime) else (ts or time.time())
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO interactions (uid, movie_id, action, timestamp) VALUES (?, ?, ?, ?)",
+                [(r["uid"], r["movie_id"], r["action"], timestamp(r)) for r in rows],
+            )
+
+    def _iter_rows(self, query: str, start: tuple = (0,), chunk: int = 10000):
+        """
+        Page through a table by its sort key, the leading len(start) columns,
+        so large logs aren't loaded at once
+        """
+        last = start
+        while True:
+            with self._lock:
+                rows = self._conn.execute(query, (*last, chunk)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][:len(start)]
+
+    def iter_interactions(self) -> Iterator[dict]:
+        # Imports append history with past timestamps, so insertion order isn't time order
+        query = ("SELECT timestamp, id, uid, movie_id, action FROM interactions "
+                 "WHERE (timestamp, id) > (?, ?) ORDER BY timestamp, id LIMIT ?")
+        for ts, _, uid, movie_id, action in self._iter_rows(query, start=(float("-inf"), 0)):
+            yield {
+                "uid": uid,
+                "movie_id": movie_id,
+                "action": action,
+                "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc),
+            }
+
+    def iter_profiles(self) -> Iterator[dict]:
+        query = "SELECT rowid, data FROM profiles WHERE rowid > ? ORDER BY rowid LIMIT ?"
+        for _, data in self._iter_rows(query):
+            yield json.loads(data)
+
+
+class CachedProfileStore(ProfileStore):
+    """
+    Read-through profile cache in front of a backend, invalidated on writes.
+    Cached profiles are shared; treat them as read-only.
+    """
+
+    def __init__(self, backend: ProfileStore, max_entries: int = 10000, ttl: float = 5.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache = LRUCache(max_size=max_entries)
+
+    def get_profile(self, uid: str) -> Optional[dict]:
+        profile = self.cache.get(uid)
+        if profile is None:
+            profile = self.backend.get_profile(uid)
+            if profile is not None:
+                self.cache.set(uid, profile, ttl=self.ttl)
+        return profile
+
+    def get_profiles(self, uids: List[str]) -> Dict[str, dict]:
+        profiles = {}
+        missing = []
+        for uid in dict.fromkeys(uids):
+            profile = self.cache.get(uid)
+            if profile is None:
+                missing.append(uid)
+            else:
+                profiles[uid] = profile
+        if missing:
+            fetched = self.backend.get_profiles(missing)
+            for uid, profile in fetched.items():
+                self.cache.set(uid, profile, ttl=self.ttl)
+            profiles.update(fetched)
+        return profiles
+
+    def set_profile(self, uid: str, data: dict):
+        self.cache.delete(uid)
+        self.backend.set_profile(uid, data)
+        self.cache.delete(uid)
+
+    def modify_profile(self, uid: str, mutate: ProfileMutation, version_increment: int = 1) -> bool:
+        self.cache.delete(uid)
+        try:
+            return self.backend.modify_profile(uid, mutate, version_increment)
+        finally:
+            self.cache.delete(uid)
+
+    def add_interactions(self, rows: List[dict]):
+        self.backend.add_interactions(rows)
+
+    def iter_interactions(self) -> Iterator[dict]:
+        return self.backend.iter_interactions()
+
+    def iter_profiles(self) -> Iterator[dict]:
+        return self.backend.iter_profiles()
+
+
+def _init_firestore():
+    """Initialize the Firebase Admin SDK from FIREBASE_CREDENTIALS_PATH, if present"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH", "./serviceAccountKey.json")
+        if os.path.exists(cred_path):
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+    return firestore.client() if firebase_admin._apps else None
+
+
+def create_profile_store() -> Optional[ProfileStore]:
+    """Build the configured backend (PROFILE_STORE=firestore|sqlite|memory)"""
+    backend_name = os.getenv("PROFILE_STORE", "firestore").lower()
+    if backend_name == "sqlite":
+        backend = SQLiteProfileStore(os.getenv("PROFILE_STORE_PATH", "./.cache/profiles.sqlite3"))
+    elif backend_name == "memory":
+        backend = SQLiteProfileStore(":memory:")
+    else:
+        db = _init_firestore()
+        if db is None:
+            return None
+        backend = FirestoreProfileStore(db)
+    return CachedProfileStore(
+        backend,
+        max_entries=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("PROFILE_CACHE_TTL", "5")),
+    )
+
+
+class LazyProfileStore:
+    """
+    The process-wide store, built on first use rather than at import so
+    importing a router never imports firebase_admin or opens a connection.
+    The API builds it in its lifespan via init(); jobs just use it. Falsy
+    when no backend is configured, like the None create_profile_store
+    returns.
+    """
+
+    def __init__(self, factory: Callable[[], Optional[ProfileStore]] = create_profile_store):
+        self._factory = factory
+        self._store: Optional[ProfileStore] = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def init(self) -> Optional[ProfileStore]:
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    self._store = self._factory()
+                    self._initialized = True
+        return self._store
+
+    @property
+    def initialized(self) -> bool:
+        return self._initialized
+
+    def __bool__(self) -> bool:
+        return self.init() is not None
+
+    def __getattr__(self, name):
+        store = self.init()
+        if store is None:
+            raise AttributeError(f"Profile store not initialized (no backend for {name})")
+        return getattr(store, name)
+
+
+profile_store = LazyProfileStore()
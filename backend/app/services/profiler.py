@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Optional
+
+
+class SamplingProfiler:
+    """Background thread that samples every thread's stack into collapsed-stack counts"""
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(names)))
+            with self._lock:
+                self.samples.update(stacks)
+
+    def collapsed(self, reset: bool = False) -> str:
+        """Samples in flamegraph.pl / speedscope collapsed format"""
+        with self._lock:
+            items = self.samples.most_common()
+            if reset:
+                self.samples.clear()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+
+sampling_profiler = SamplingProfiler(interval=float(os.getenv("SAMPLING_PROFILER_INTERVAL", "0.01")))
+PROFILER_ENABLED = os.getenv("ENABLE_SAMPLING_PROFILER", "").lower() in ("1", "true", "yes")
@@ -0,0 +1,102 @@
+import base64
+import json
+import os
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.cache import LRUCache
+
+
+class RankedPool:
+    """A user's ranked, diversified recommendations as compact (movie_id, score) arrays"""
+
+    __slots__ = ("pool_id", "uid", "version", "movie_ids", "scores", "depth", "exhausted", "created_at")
+
+    def __init__(self, uid: str, version: int, movie_ids, scores, depth: int, exhausted: bool,
+                 pool_id: Optional[str] = None, created_at: Optional[float] = None):
+        self.pool_id = pool_id or secrets.token_urlsafe(9)
+        self.uid = uid
+        self.version = version
+        self.movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        # How many candidate batches the ranking was built from
+        self.depth = depth
+        self.exhausted = exhausted
+        self.created_at = created_at or time.time()
+
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, float]]:
+        end = offset + limit
+        return list(zip(self.movie_ids[offset:end].tolist(), self.scores[offset:end].tolist()))
+
+    def extended(self, movie_ids: List[int], scores: List[float], depth: int, exhausted: bool) -> "RankedPool":
+        """
+        Same pool with a deeper ranking appended after the entries already
+        in it, so pages that were served keep their order
+        """
+        seen = set(self.movie_ids.tolist())
+        keep = [i for i, movie_id in enumerate(movie_ids) if movie_id not in seen]
+        return RankedPool(
+            self.uid,
+            self.version,
+            np.concatenate([self.movie_ids, np.asarray(movie_ids, dtype=np.int64)[keep]]),
+            np.concatenate([self.scores, np.asarray(scores, dtype=np.float32)[keep]]),
+            depth,
+            exhausted,
+            pool_id=self.pool_id,
+            created_at=self.created_at,
+        )
+
+
+class RankedPoolStore:
+    """Pools by id (for cursors) and by (uid, profile_version), expiring after ttl"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 1800):
+        self.ttl = ttl
+        self._pools = LRUCache(max_size=max_entries)
+        self._by_profile = LRUCache(max_size=max_entries)
+
+    def get(self, pool_id: str) -> Optional[RankedPool]:
+        return self._pools.get(pool_id)
+
+    def for_profile(self, uid: str, version: int) -> Optional[RankedPool]:
+        pool_id = self._by_profile.get((uid, version))
+        return self.get(pool_id) if pool_id is not None else None
+
+    def put(self, pool: RankedPool):
+        # Extensions keep the original expiry so a session can't outlive the ttl
+        ttl = max(pool.created_at + self.ttl - time.time(), 1)
+        self._pools.set(pool.pool_id, pool, ttl=ttl)
+        self._by_profile.set((pool.uid, pool.version), pool.pool_id, ttl=ttl)
+
+    def stats(self) -> Dict:
+        return self._pools.stats()
+
+
+def encode_cursor(pool_id: str, offset: int) -> str:
+    """Opaque URL-safe cursor for the entry at offset in a pool"""
+    raw = json.dumps([pool_id, offset], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(pool_id, offset); raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        pool_id, offset = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(pool_id, str) or not isinstance(offset, int) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return pool_id, offset
+
+
+ranked_pools = RankedPoolStore(
+    max_entries=int(os.getenv("RANKED_POOL_SIZE", "10000")),
+    ttl=float(os.getenv("RANKED_POOL_TTL", "1800")),
+)
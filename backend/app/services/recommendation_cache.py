@@ -0,0 +1,33 @@
+import os
+import zlib
+from typing import Dict, Optional
+from app.services.cache import LRUCache
+
+class RecommendationCache:
+    """Bounded LRU of recommendation responses keyed on the profile version"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 600):
+        self.ttl = ttl
+        self._cache = LRUCache(max_size=max_entries)
+
+    @staticmethod
+    def key(uid: str, version: int, page: int, limit: int) -> tuple:
+        return (uid, version, page, limit)
+
+    def get(self, uid: str, version: int, page: int, limit: int) -> Optional[Dict]:
+        return self._cache.get(self.key(uid, version, page, limit))
+
+    def set(self, uid: str, version: int, page: int, limit: int, response: Dict):
+        self._cache.set(self.key(uid, version, page, limit), response, ttl=self.ttl)
+
+    def stats(self) -> Dict:
+        return self._cache.stats()
+
+def exploration_seed(uid: str, version: int) -> int:
+    """Deterministic per-version seed so cached and recomputed results match"""
+    return zlib.crc32(f"{uid}:{version}".encode("utf-8"))
+
+recommendation_cache = RecommendationCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "600")),
+)
@@ -1,9 +1,21 @@
 import numpy as np
-from typing import List, Dict
+from scipy import sparse
+from typing import List, Dict, Iterable
 from datetime import datetime
+from app.services.catalog_store import catalog_store
+from app.services.compact_profile import compact_profile
+from app.services.matrix_factorization import MF_BLEND_WEIGHT, mf_model
 from app.services.tmdb_client import tmdb_client
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import MultiLabelBinarizer
+from app.services.vocabulary import Vocabulary, actor_vocabulary, genre_vocabulary
+
+# Component weights of the hybrid score
+SCORE_WEIGHTS = {
+    "genre": 0.35,
+    "actor": 0.20,
+    "content": 0.25,
+    "rating": 0.10,
+    "recency": 0.10,
+}
 
 def calculate_genre_similarity(user_genre_weights: Dict[str, float], movie_genres: List[str]) -> float:
     """Calculate similarity based on genre preferences"""
@@ -44,37 +56,227 @@ def create_movie_vector(movie_data: dict) -> List[str]:
     
     return features
 
+def get_favorite_details(favorite_movie_ids: List[int]) -> List[dict]:
+    """Fetch details for a user's favorite movies, skipping failures"""
+    favorites = []
+    for movie_id in favorite_movie_ids:
+        movie = catalog_store.get_movie_details(movie_id) if catalog_store.available else None
+        if movie is not None:
+            favorites.append(movie)
+            continue
+        try:
+            favorites.append(tmdb_client.get_movie_details(movie_id))
+        except Exception:
+            continue
+    return favorites
+
+def _encode(feature_lists: Iterable[List[str]], vocabulary: Dict[str, int]) -> sparse.csr_matrix:
+    """Encode feature lists as a sparse count matrix over a fixed vocabulary"""
+    indptr = [0]
+    indices = []
+    for features in feature_lists:
+        indices.extend(vocabulary[f] for f in features if f in vocabulary)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float64)
+    matrix = sparse.csr_matrix(
+        (data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, len(vocabulary))
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+class FavoriteFeatures:
+    """Binary feature matrix of a user's favorites, built once per request"""
+
+    def __init__(self, favorite_movies: List[dict]):
+        feature_lists = [create_movie_vector(m) for m in favorite_movies]
+        self.vocabulary: Dict[str, int] = {}
+        for features in feature_lists:
+            for feature in features:
+                self.vocabulary.setdefault(feature, len(self.vocabulary))
+        
+        matrix = _encode(feature_lists, self.vocabulary)
+        matrix.data[:] = 1.0  # binary, like a multi-hot encoding
+        self.matrix = matrix
+        self.norms = np.sqrt(np.asarray(matrix.sum(axis=1)).ravel())
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def cosine(self, candidate_features: List[List[str]]) -> np.ndarray:
+        """Candidates x favorites cosine similarity matrix"""
+        candidates = _encode(candidate_features, self.vocabulary)
+        candidates.data[:] = 1.0
+        # Features outside the favorites' vocabulary only contribute to the norm
+        candidate_norms = np.sqrt([len(set(f)) for f in candidate_features])
+        
+        dots = (candidates @ self.matrix.T).toarray()
+        denom = np.outer(candidate_norms, self.norms)
+        return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+    def similarity(self, candidate_features: List[List[str]]) -> np.ndarray:
+        """Mean cosine similarity of each candidate to the favorites"""
+        if len(self) == 0 or not candidate_features:
+            return np.zeros(len(candidate_features))
+        return self.cosine(candidate_features).mean(axis=1)
+
+def _flatten_ids(name_lists: List[List[str]], vocabulary: Vocabulary):
+    """Interned ids of every name plus the index of the movie each came from"""
+    lengths = np.fromiter((len(names) for names in name_lists), dtype=np.int64, count=len(name_lists))
+    ids = vocabulary.lookup_many(name for names in name_lists for name in names)
+    return ids, np.repeat(np.arange(len(name_lists)), lengths)
+
+def _id_matrix(name_lists: List[List[str]], vocabulary: Vocabulary, size: int) -> sparse.csr_matrix:
+    """Movies x first `size` vocabulary ids count matrix; other names are dropped"""
+    ids, rows = _flatten_ids(name_lists, vocabulary)
+    known = (ids >= 0) & (ids < size)
+    return sparse.csr_matrix(
+        (np.ones(int(known.sum())), (rows[known], ids[known])),
+        shape=(len(name_lists), size)
+    )
+
+def _release_years(movies: List[dict]) -> np.ndarray:
+    years = np.empty(len(movies))
+    for i, movie in enumerate(movies):
+        release_date = movie.get("release_date", "")
+        try:
+            years[i] = int(release_date[:4]) if release_date else 2000
+        except (TypeError, ValueError):
+            years[i] = np.nan
+    return years
+
+def calculate_score_components(
+    user_profile: dict,
+    movies: List[dict],
+    favorites: FavoriteFeatures
+) -> Dict[str, np.ndarray]:
+    """Compute every score component for a batch of candidate movies"""
+    movie_genres = [[g["name"] for g in m.get("genres", [])] for m in movies]
+    movie_actors = [[a["name"] for a in m.get("credits", {}).get("cast", [])[:5]] for m in movies]
+    
+    profile = compact_profile(user_profile)
+    
+    # Genre/actor affinity: sum the profile weight of each interned name per movie
+    genre_ids, genre_rows = _flatten_ids(movie_genres, genre_vocabulary)
+    genre_sim = np.bincount(genre_rows, weights=profile.genre_scores(genre_ids), minlength=len(movies))
+    genre_sim = np.minimum(genre_sim / 2.0, 1.0)
+    
+    actor_ids, actor_rows = _flatten_ids(movie_actors, actor_vocabulary)
+    actor_sim = np.bincount(actor_rows, weights=profile.actor_scores(actor_ids), minlength=len(movies))
+    actor_sim = np.minimum(actor_sim / 1.5, 1.0)
+    
+    content_sim = favorites.similarity([create_movie_vector(m) for m in movies])
+    
+    return {
+        "genre": genre_sim,
+        "actor": actor_sim,
+        "content": content_sim,
+        **_movie_components(movies),
+    }
+
+def _movie_components(movies: List[dict]) -> Dict[str, np.ndarray]:
+    """Profile-independent score components"""
+    ratings = np.array([m.get("vote_average", 0) or 0 for m in movies], dtype=np.float64)
+    years = _release_years(movies)
+    recency = np.maximum(0, 1 - (datetime.now().year - years) / 30)
+    recency = np.where(np.isnan(recency), 0.5, recency)
+    return {"rating": ratings / 10.0, "recency": recency}
+
+def score_movies(
+    user_profile: dict,
+    movies: List[dict],
+    favorite_movies: List[dict]
+) -> np.ndarray:
+    """Calculate final hybrid scores for a batch of candidate movies"""
+    if not movies:
+        return np.zeros(0)
+    favorites = FavoriteFeatures(favorite_movies)
+    components = calculate_score_components(user_profile, movies, favorites)
+    scores = sum(components[name] * weight for name, weight in SCORE_WEIGHTS.items())
+    return blend_latent_factors(scores[np.newaxis, :], [user_profile], movies)[0]
+
+def blend_latent_factors(
+    scores: np.ndarray,
+    user_profiles: List[dict],
+    movies: List[dict]
+) -> np.ndarray:
+    """Mix the matrix-factorisation score into users x movies scores where the model knows both"""
+    if not mf_model.available:
+        return scores
+    mf_scores, known = mf_model.score_matrix(user_profiles, [m["id"] for m in movies])
+    return np.where(known, (1 - MF_BLEND_WEIGHT) * scores + MF_BLEND_WEIGHT * mf_scores, scores)
+
+def score_profiles(
+    user_profiles: List[dict],
+    movies: List[dict],
+    favorite_details: Dict[int, dict]
+) -> np.ndarray:
+    """
+    Hybrid scores for many profiles against one shared candidate set, as a
+    users x movies matrix. Each affinity is a users x features @ features x
+    movies product; favorites missing from favorite_details are skipped.
+    """
+    if not user_profiles or not movies:
+        return np.zeros((len(user_profiles), len(movies)))
+    movie_genres = [[g["name"] for g in m.get("genres", [])] for m in movies]
+    movie_actors = [[a["name"] for a in m.get("credits", {}).get("cast", [])[:5]] for m in movies]
+    
+    profiles = [compact_profile(p) for p in user_profiles]
+    # Vocabularies only grow; fix their sizes once so every matrix agrees
+    num_genres, num_actors = len(genre_vocabulary), len(actor_vocabulary)
+    
+    # Dense users x genres weights against the movies' genre counts
+    genre_weights = np.vstack([p.dense_genre_weights(num_genres) for p in profiles])
+    genre_counts = _id_matrix(movie_genres, genre_vocabulary, num_genres)
+    genre_sim = np.minimum(np.asarray(genre_counts @ genre_weights.T).T / 2.0, 1.0)
+    
+    # Sparse users x actors rows straight from each profile's sorted arrays
+    actor_counts = np.fromiter((len(p.actor_ids) for p in profiles), dtype=np.int64, count=len(profiles))
+    actor_weights = sparse.csr_matrix(
+        (
+            np.concatenate([p.actor_weights for p in profiles]),
+            np.concatenate([p.actor_ids for p in profiles]),
+            np.concatenate([[0], np.cumsum(actor_counts)]),
+        ),
+        shape=(len(profiles), num_actors)
+    )
+    actor_counts = _id_matrix(movie_actors, actor_vocabulary, num_actors)
+    actor_sim = np.minimum((actor_weights @ actor_counts.T).toarray() / 1.5, 1.0)
+    
+    # Content: cosine against every distinct favorite once, then average each
+    # user's favorites through a users x favorites membership matrix
+    favorite_ids = list(favorite_details)
+    favorite_column = {movie_id: i for i, movie_id in enumerate(favorite_ids)}
+    rows, cols, data = [], [], []
+    for row, profile in enumerate(user_profiles):
+        columns = [favorite_column[m["id"]] for m in profile.get("favorite_movies", []) if m["id"] in favorite_column]
+        if not columns:
+            continue
+        rows.extend([row] * len(columns))
+        cols.extend(columns)
+        data.extend([1.0 / len(columns)] * len(columns))
+    membership = sparse.csr_matrix((data, (rows, cols)), shape=(len(user_profiles), len(favorite_ids)))
+    if favorite_ids:
+        favorites = FavoriteFeatures([favorite_details[i] for i in favorite_ids])
+        content_sim = np.asarray(membership @ favorites.cosine([create_movie_vector(m) for m in movies]).T)
+    else:
+        content_sim = np.zeros((len(user_profiles), len(movies)))
+    
+    movie_components = _movie_components(movies)
+    movie_score = sum(movie_components[name] * SCORE_WEIGHTS[name] for name in movie_components)
+    scores = (
+        SCORE_WEIGHTS["genre"] * genre_sim
+        + SCORE_WEIGHTS["actor"] * actor_sim
+        + SCORE_WEIGHTS["content"] * content_sim
+        + movie_score[np.newaxis, :]
+    )
+    return blend_latent_factors(scores, user_profiles, movies)
+
 def calculate_content_similarity(favorite_movie_ids: List[int], candidate_movie_data: dict) -> float:
     """Calculate cosine similarity between candidate and favorite movies"""
     try:
-        # Get candidate features
-        candidate_features = create_movie_vector(candidate_movie_data)
-        
-        # Get favorite movie features
-        favorite_features_list = []
-        for movie_id in favorite_movie_ids:
-            try:
-                movie_details = tmdb_client.get_movie_details(movie_id)
-                features = create_movie_vector(movie_details)
-                favorite_features_list.append(features)
-            except:
-                continue
-        
-        if not favorite_features_list:
-            return 0.0
-        
-        # Convert to binary vectors using MultiLabelBinarizer
-        mlb = MultiLabelBinarizer()
-        all_features = favorite_features_list + [candidate_features]
-        vectors = mlb.fit_transform(all_features)
-        
-        # Calculate cosine similarity
-        candidate_vector = vectors[-1].reshape(1, -1)
-        favorite_vectors = vectors[:-1]
-        
-        similarities = cosine_similarity(candidate_vector, favorite_vectors)[0]
-        return float(np.mean(similarities))
-        
+        favorites = FavoriteFeatures(get_favorite_details(favorite_movie_ids))
+        return float(favorites.similarity([create_movie_vector(candidate_movie_data)])[0])
     except Exception as e:
         print(f"Error calculating content similarity: {e}")
         return 0.0
@@ -98,26 +300,5 @@ def calculate_final_score(
     favorite_movie_ids: List[int]
 ) -> float:
     """Calculate final hybrid score for a movie"""
-    
-    # Extract movie features
-    movie_genres = [g["name"] for g in movie_data.get("genres", [])]
-    credits = movie_data.get("credits", {})
-    movie_actors = [a["name"] for a in credits.get("cast", [])[:5]]
-    
-    # Calculate component scores
-    genre_sim = calculate_genre_similarity(user_profile.get("genre_weights", {}), movie_genres)
-    actor_sim = calculate_actor_similarity(user_profile.get("actor_weights", {}), movie_actors)
-    content_sim = calculate_content_similarity(favorite_movie_ids, movie_data)
-    rating_score = calculate_rating_score(movie_data.get("vote_average", 0))
-    recency_score = calculate_recency_score(movie_data.get("release_date", ""))
-    
-    # Weighted combination
-    final_score = (
-        genre_sim * 0.35 +
-        actor_sim * 0.20 +
-        content_sim * 0.25 +
-        rating_score * 0.10 +
-        recency_score * 0.10
-    )
-    
-    return final_score
+    favorite_movies = get_favorite_details(favorite_movie_ids)
+    return float(score_movies(user_profile, [movie_data], favorite_movies)[0])
@@ -0,0 +1,301 @@
+import asyncio
+import heapq
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from bisect import insort
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.services.catalog_store import catalog_store
+from app.services.movie_data import movie_summary
+
+# Trie depth; longer prefixes filter the deepest node's candidates
+MAX_PREFIX = 12
+# Most popular titles kept at each trie node
+NODE_TOP_K = 64
+# Share of a query's trigrams a title must contain to count as a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accent-free, alphanumeric words separated by single spaces"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(_NON_ALNUM.sub(" ", text).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # (-popularity, movie_id), most popular first
+        self.top: List[tuple] = []
+
+
+_EMPTY_NODE = _TrieNode()
+
+
+class SearchIndex:
+    """
+    In-process title search over every movie the API has seen: a word-prefix
+    trie holding the most popular titles per prefix for typeahead, exact word
+    postings for multi-word queries, and a trigram index for misspellings.
+    Entries are persisted as list-result summaries and re-indexed on load.
+    """
+
+    def __init__(self, path: Optional[str] = None, top_k: int = NODE_TOP_K):
+        self.path = path
+        self.top_k = top_k
+        self.movies: Dict[int, dict] = {}
+        self._titles: Dict[int, str] = {}
+        self._title_words: Dict[int, tuple] = {}
+        self._by_title: Dict[str, List[int]] = {}
+        self._popularity: Dict[int, float] = {}
+        self._root = _TrieNode()
+        self._words: Dict[str, Set[int]] = {}
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._trigram_counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._catalog_version = None
+        self._saving = False
+        self._save_task: Optional[asyncio.Task] = None
+        self.dirty = 0
+
+    def __len__(self) -> int:
+        return len(self.movies)
+
+    def __contains__(self, movie_id: int) -> bool:
+        return movie_id in self.movies
+
+    def add(self, movie: dict) -> bool:
+        """Index a list result or details payload; False if it was already known"""
+        movie_id = movie.get("id")
+        title = movie.get("title")
+        if movie_id is None or not title or movie_id in self.movies:
+            return False
+        normalized = normalize(title)
+        if not normalized:
+            return False
+
+        with self._lock:
+            if movie_id in self.movies:
+                return False
+            popularity = float(movie.get("popularity") or 0)
+            self.movies[movie_id] = movie_summary(movie)
+            self._titles[movie_id] = normalized
+            self._title_words[movie_id] = tuple(normalized.split())
+            self._by_title.setdefault(normalized, []).append(movie_id)
+            self._popularity[movie_id] = popularity
+
+            entry = (-popularity, movie_id)
+            visited = set()
+            for word in set(normalized.split()):
+                self._words.setdefault(word, set()).add(movie_id)
+                node = self._root
+                for char in word[:MAX_PREFIX]:
+                    node = node.children.setdefault(char, _TrieNode())
+                    if id(node) in visited:
+                        continue
+                    visited.add(id(node))
+                    if len(node.top) < self.top_k or entry < node.top[-1]:
+                        insort(node.top, entry)
+                        del node.top[self.top_k:]
+
+            grams = trigrams(normalized)
+            for gram in grams:
+                self._trigrams.setdefault(gram, set()).add(movie_id)
+            self._trigram_counts[movie_id] = len(grams)
+            self.dirty += 1
+        return True
+
+    def add_many(self, movies: Iterable[dict]) -> int:
+        return sum(self.add(movie) for movie in movies)
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """
+        Titles whose words start with the query's words (the last one may be
+        partial), most popular first, topped up with fuzzy trigram matches
+        """
+        self.ensure_loaded()
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        words = normalized.split()
+        complete, last = words[:-1], words[-1]
+
+        if complete:
+            # The last word's popular titles usually cover the page; only
+            # intersect the word postings when they might not
+            ids = [i for i in self._prefix_ids(last) if self._has_words(i, complete)]
+            if len(ids) < limit and len(self._prefix_node(last).top) >= self.top_k:
+                postings = sorted((self._words.get(w, set()) for w in complete), key=len)
+                ids = set(postings[0]).intersection(*postings[1:])
+                ids = [i for i in ids if any(w.startswith(last) for w in self._title_words[i])]
+        else:
+            ids = self._prefix_ids(last)
+
+        # Titles that start with the whole query rank above ones containing
+        # it, which rank above titles matching the words in another order
+        titles = self._titles
+        ids.sort(key=lambda i: (not titles[i].startswith(normalized), normalized not in titles[i], -self._popularity[i]))
+        results = ids[:limit]
+        if len(results) < limit and len(normalized) >= 3:
+            results += self._fuzzy(normalized, limit - len(results), exclude=set(results))
+        return [self.movies[i] for i in results]
+
+    def lookup(self, title: str, year: Optional[int] = None) -> Optional[int]:
+        """Id of the movie with exactly this (normalized) title, preferring the given release year"""
+        self.ensure_loaded()
+        ids = self._by_title.get(normalize(title))
+        if not ids:
+            return None
+        if year is not None:
+            # A different year is usually a remake, not the movie we want
+            ids = [i for i in ids if (self.movies[i].get("release_date") or "")[:4] == str(year)]
+            if not ids:
+                return None
+        return max(ids, key=lambda i: self._popularity[i])
+
+    def _prefix_node(self, prefix: str) -> _TrieNode:
+        node = self._root
+        for char in prefix[:MAX_PREFIX]:
+            node = node.children.get(char)
+            if node is None:
+                return _EMPTY_NODE
+        return node
+
+    def _prefix_ids(self, prefix: str) -> List[int]:
+        """Most popular titles with a word starting with prefix"""
+        ids = [movie_id for _, movie_id in self._prefix_node(prefix).top]
+        if len(prefix) > MAX_PREFIX:
+            ids = [i for i in ids if any(w.startswith(prefix) for w in self._title_words[i])]
+        return ids
+
+    def _has_words(self, movie_id: int, words: List[str]) -> bool:
+        title_words = self._title_words[movie_id]
+        return all(w in title_words for w in words)
+
+    def _fuzzy(self, normalized: str, limit: int, exclude: Set[int]) -> List[int]:
+        grams = sorted(trigrams(normalized), key=lambda g: len(self._trigrams.get(g, ())))
+        # A match shares at least `needed` trigrams, so it contains one of the
+        # rarest len - needed + 1; count the common ones by membership only
+        needed = math.ceil(FUZZY_THRESHOLD * len(grams))
+        probe, rest = grams[:len(grams) - needed + 1], grams[len(grams) - needed + 1:]
+        shared = Counter()
+        for gram in probe:
+            shared.update(self._trigrams.get(gram, ()))
+        for gram in rest:
+            shared.update(self._trigrams.get(gram, set()).intersection(shared))
+
+        scored = []
+        for movie_id, count in shared.items():
+            similarity = count / len(grams)
+            if similarity < FUZZY_THRESHOLD or movie_id in exclude:
+                continue
+            # Closer matches first; popularity and shorter titles break ties
+            length_penalty = count / self._trigram_counts[movie_id]
+            scored.append((similarity + 0.1 * length_penalty + 0.01 * math.log1p(self._popularity[movie_id]), movie_id))
+        return [movie_id for _, movie_id in heapq.nlargest(limit, scored)]
+
+    def ensure_loaded(self):
+        """Load the persisted index once, then index catalog titles not seen yet"""
+        if not self._loaded:
+            movies = []
+            with self._lock:
+                if not self._loaded:
+                    movies = self._read()
+                    self._loaded = True
+            if movies:
+                self.add_many(movies)
+                self.dirty = 0
+        if catalog_store.available and catalog_store.version != self._catalog_version:
+            self._catalog_version = catalog_store.version
+            added = self.add_many(
+                movie for movie in map(catalog_store.get_movie, catalog_store.ids.tolist()) if movie is not None
+            )
+            if added:
+                print(f"Indexed {added} catalog titles for search")
+
+    def _read(self) -> List[dict]:
+        if not self.path or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("movies", [])
+        except Exception as e:
+            print(f"Error loading search index: {e}")
+            return []
+
+    def _begin_save(self, min_changes: int) -> Optional[List[dict]]:
+        """Claim the one save allowed in flight: snapshot summaries and reset dirty"""
+        with self._lock:
+            if not self.path or self._saving or self.dirty < min_changes:
+                return None
+            self._saving = True
+            self.dirty = 0
+            return list(self.movies.values())
+
+    def _write(self, movies: List[dict]):
+        """Write the summaries atomically so other workers start warm"""
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"movies": movies}, f, separators=(",", ":"))
+                os.chmod(tmp_path, 0o644)  # mkstemp creates it owner-only
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except Exception as e:
+            print(f"Error saving search index: {e}")
+            with self._lock:
+                self.dirty += 1  # so the shutdown save_if_dirty still writes
+        finally:
+            self._saving = False
+
+    def save(self):
+        self.save_if_dirty(min_changes=0)
+
+    def save_if_dirty(self, min_changes: int = 1):
+        movies = self._begin_save(min_changes)
+        if movies is not None:
+            self._write(movies)
+
+    def save_in_background(self, min_changes: int = 1):
+        """
+        Claim the save on the event loop, so overlapping requests start at
+        most one, then write it in a thread without the caller waiting
+        """
+        movies = self._begin_save(min_changes)
+        if movies is not None:
+            self._save_task = asyncio.create_task(asyncio.to_thread(self._write, movies))
+
+    async def wait_for_save(self):
+        """Let a background save in flight finish, e.g. before the shutdown save"""
+        if self._save_task is not None:
+            await asyncio.gather(self._save_task, return_exceptions=True)
+            self._save_task = None
+
+
+SEARCH_INDEX_SAVE_EVERY = int(os.getenv("SEARCH_INDEX_SAVE_EVERY", "200"))
+# Fewer local hits than this on the first page falls back to TMDB search
+SEARCH_MIN_LOCAL_RESULTS = int(os.getenv("SEARCH_MIN_LOCAL_RESULTS", "3"))
+
+search_index = SearchIndex(path=os.getenv("SEARCH_INDEX_PATH", "./.cache/search_index.json") or None)
@@ -0,0 +1,249 @@
+import json
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, so no shared tier
+    fcntl = None
+
+MAGIC = 0x434D534843000001  # "CMSHC", layout 1
+HEADER_WORDS = 8
+MAGIC_WORD, CAPACITY, ARENA_SIZE, GENERATION, TAIL, ENTRIES, RESETS = range(7)
+
+SLOT_DTYPE = np.dtype([
+    ("seq", np.int64),
+    ("key", np.int64),
+    ("offset", np.int64),
+    ("length", np.int64),
+    ("expires_at", np.float64),
+])
+
+MAX_PROBE = 32
+MAX_LOAD = 0.5
+READ_RETRIES = 3
+
+
+class SharedCache:
+    """
+    JSON values keyed by movie id in one memory-mapped file, shared by every
+    worker process on the host: an open-addressing slot table in front of an
+    append-only byte arena.
+
+    Reads take no lock. Each slot carries a sequence number that a writer
+    makes odd while it updates the slot, and the header a generation that
+    is odd while the table is being reset; a reader that sees either change
+    under it retries, and a payload that doesn't decode counts as a miss.
+    Writes are serialised across processes with a file lock, so there is only
+    ever one writer, and an odd sequence or generation seen while holding
+    the lock was left by a writer that died mid-update: the writer repairs
+    it. When the arena or the table fills up the writer resets the whole
+    cache (generation bump) rather than compacting it.
+    """
+
+    def __init__(self, path: str, capacity: int = 65536, arena_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._writer():
+            header = np.zeros(HEADER_WORDS, dtype=np.int64)
+            if os.fstat(self._fd).st_size >= header.nbytes:
+                header = np.frombuffer(os.pread(self._fd, header.nbytes, 0), dtype=np.int64).copy()
+            if header[MAGIC_WORD] != MAGIC:
+                # First process on the host lays the file out; later ones
+                # adopt its geometry whatever their own settings say
+                header[:] = 0
+                header[MAGIC_WORD], header[CAPACITY], header[ARENA_SIZE] = MAGIC, capacity, arena_size
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, header.nbytes + capacity * SLOT_DTYPE.itemsize + arena_size)
+                os.pwrite(self._fd, header.tobytes(), 0)
+
+        self._map = mmap.mmap(self._fd, 0)
+        self._header = np.frombuffer(self._map, dtype=np.int64, count=HEADER_WORDS)
+        self.capacity = int(self._header[CAPACITY])
+        self.arena_size = int(self._header[ARENA_SIZE])
+        slots = np.frombuffer(self._map, dtype=SLOT_DTYPE, count=self.capacity, offset=self._header.nbytes)
+        self._seqs, self._keys = slots["seq"], slots["key"]
+        self._offsets, self._lengths, self._expires = slots["offset"], slots["length"], slots["expires_at"]
+        self._arena = np.frombuffer(
+            self._map, dtype=np.uint8, count=self.arena_size, offset=self._header.nbytes + slots.nbytes
+        )
+        # A worker restarting after a crash clears whatever the crash left odd
+        with self._writer():
+            self._repair()
+            for slot in np.flatnonzero(self._seqs & 1).tolist():
+                self._repair_slot(slot)
+
+    @contextmanager
+    def _writer(self):
+        # POSIX record locks belong to the process, so forked workers that
+        # inherited this fd still exclude each other (flock would not)
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _repair(self):
+        """Finish a reset whose writer died, which would otherwise make every read miss"""
+        if self._header[GENERATION] & 1:
+            self._reset()
+
+    def _repair_slot(self, slot: int):
+        """
+        Make a slot whose writer died mid-update even again. Its payload may
+        be torn, so it is left expired; the key stays to keep probe chains intact.
+        """
+        self._expires[slot] = 0.0
+        self._seqs[slot] += 1
+
+    def _home(self, key: int) -> int:
+        # Fibonacci hashing spreads sequential movie ids across the table
+        return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) % self.capacity
+
+    def get(self, key: int) -> Optional[Tuple[object, float]]:
+        """Return (value, expires_at) or None if missing, expired or mid-write"""
+        key = int(key)
+        for _ in range(READ_RETRIES):
+            stable, entry = self._lookup(key)
+            if stable:
+                break
+        else:
+            entry = None
+        if entry is not None and entry[1] > time.time():
+            try:
+                value = json.loads(entry[0])
+            except ValueError:
+                pass  # torn despite the checks; treat as a miss
+            else:
+                self.hits += 1
+                return value, entry[1]
+        self.misses += 1
+        return None
+
+    def expires_at(self, key: int) -> Optional[float]:
+        """Expiry of a live entry without decoding it or touching stats; None if missing or expired"""
+        key = int(key)
+        for _ in range(READ_RETRIES):
+            stable, entry = self._lookup(key)
+            if stable:
+                break
+        else:
+            return None
+        return entry[1] if entry is not None and entry[1] > time.time() else None
+
+    def _lookup(self, key: int) -> Tuple[bool, Optional[Tuple[bytes, float]]]:
+        """(stable, (payload, expires_at) or None); not stable if a writer got in the way"""
+        seqs, keys, header = self._seqs, self._keys, self._header
+        if key <= 0:
+            return True, None
+        generation = header[GENERATION]
+        if generation & 1:
+            return False, None
+        slot = self._home(key)
+        for _ in range(MAX_PROBE):
+            seq = seqs[slot]
+            if seq & 1:
+                return False, None
+            slot_key = keys[slot]
+            if slot_key == 0:
+                return header[GENERATION] == generation, None
+            if slot_key == key:
+                offset, length, expires_at = int(self._offsets[slot]), int(self._lengths[slot]), self._expires[slot]
+                payload = self._arena[offset:offset + length].tobytes()
+                if seqs[slot] != seq or header[GENERATION] != generation:
+                    return False, None
+                return True, (payload, float(expires_at))
+            slot = (slot + 1) % self.capacity
+        return True, None
+
+    def set(self, key: int, value, ttl: float) -> bool:
+        """Store value for key; False if it can't fit even in an empty arena"""
+        key = int(key)
+        payload = np.frombuffer(json.dumps(value, separators=(",", ":")).encode("utf-8"), dtype=np.uint8)
+        if key <= 0 or len(payload) > self.arena_size:
+            return False
+        with self._writer():
+            self._repair()
+            header = self._header
+            if header[TAIL] + len(payload) > self.arena_size or header[ENTRIES] >= self.capacity * MAX_LOAD:
+                self._reset()
+            slot = self._home(key)
+            for _ in range(MAX_PROBE):
+                if self._seqs[slot] & 1:
+                    self._repair_slot(slot)
+                if self._keys[slot] in (0, key):
+                    break
+                slot = (slot + 1) % self.capacity
+            else:
+                return False
+            is_new = self._keys[slot] == 0
+            tail = int(header[TAIL])
+
+            self._seqs[slot] += 1
+            self._arena[tail:tail + len(payload)] = payload
+            self._offsets[slot] = tail
+            self._lengths[slot] = len(payload)
+            self._expires[slot] = time.time() + ttl
+            self._keys[slot] = key
+            self._seqs[slot] += 1
+
+            header[TAIL] = tail + len(payload)
+            if is_new:
+                header[ENTRIES] += 1
+        return True
+
+    def _reset(self):
+        """Drop every entry; readers see the odd generation and miss"""
+        header = self._header
+        if not header[GENERATION] & 1:  # odd: finishing a dead writer's reset
+            header[GENERATION] += 1
+        self._keys[:] = 0
+        header[TAIL] = 0
+        header[ENTRIES] = 0
+        header[RESETS] += 1
+        header[GENERATION] += 1
+
+    def clear(self):
+        with self._writer():
+            self._reset()
+
+    def stats(self) -> Dict:
+        header = self._header
+        return {
+            "size": int(header[ENTRIES]),
+            "max_size": int(self.capacity * MAX_LOAD),
+            "arena_bytes": int(header[TAIL]),
+            "arena_size": self.arena_size,
+            "resets": int(header[RESETS]),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def create_shared_cache(name: str) -> Optional[SharedCache]:
+    """A host-wide cache under SHARED_CACHE_DIR, or None when disabled or unsupported"""
+    directory = os.getenv("SHARED_CACHE_DIR", "/dev/shm/cinematch" if os.path.isdir("/dev/shm") else "./.cache/shared")
+    if not directory or fcntl is None:
+        return None
+    try:
+        return SharedCache(
+            os.path.join(directory, f"{name}.bin"),
+            capacity=int(os.getenv("SHARED_CACHE_SLOTS", "65536")),
+            arena_size=int(os.getenv("SHARED_CACHE_SIZE_MB", "256")) * 1024 * 1024,
+        )
+    except OSError as e:
+        print(f"Shared cache {name} unavailable: {e}")
+        return None
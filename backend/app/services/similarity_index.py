@@ -0,0 +1,506 @@
+import os
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.services.catalog_store import CatalogStore, catalog_store
+from app.services.recommendation_engine import create_movie_vector
+
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+EMPTY_TOKEN = 0  # stands in for movies without any features
+# Bucket candidates re-ranked by exact Jaccard, per neighbour asked for
+RERANK_FACTOR = 10
+# Rows read from any one bucket; common-feature buckets are sampled, not scanned
+MAX_BUCKET = int(os.getenv("SIMILAR_MAX_BUCKET", "256"))
+# Exact neighbours precomputed per catalog movie
+CATALOG_NEIGHBOURS = int(os.getenv("SIMILAR_CATALOG_NEIGHBOURS", "50"))
+
+# Catalog list column -> (create_movie_vector prefix, max items used)
+TOKEN_KINDS = {
+    "genres": ("genre", None),
+    "cast": ("actor", 5),
+    "directors": ("director", 1),
+    "keywords": ("keyword", 10),
+}
+
+
+def hash_token(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) % int(MERSENNE_PRIME)
+
+
+class SimilarityIndex:
+    """
+    MinHash/LSH index over create_movie_vector feature sets.
+
+    Similar films share few features: the closest titles sit around Jaccard
+    0.1-0.2, where two minhashes per band would collide in less than one
+    band in 64. So every minhash is its own band, and the number of bands
+    a row collides in estimates its agreement with the query. The rows with
+    the most collisions are re-ranked by exact Jaccard over the stored
+    token sets. At most max_bucket rows are read from any bucket, so a
+    query costs the same however large the catalog is.
+
+    build() also takes exact neighbour lists precomputed for the built rows
+    (see catalog_neighbours); similar_to answers those movies from the
+    lists and only queries the buckets for movies inserted since.
+
+    Rows are append-only: replacing a movie adds a row and retires the old
+    one, so inserts never copy the built signatures.
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 7, merge_threshold: int = 1024,
+                 max_bucket: int = MAX_BUCKET):
+        self.num_perm = num_perm
+        self.merge_threshold = merge_threshold
+        self.max_bucket = max_bucket
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        # Bucket key = band << 32 | minhash (minhashes are below 2**31)
+        self._band_shift = np.arange(num_perm, dtype=np.uint64) << np.uint64(32)
+
+        self._size = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        # Built rows' signatures as given (possibly memory-mapped), then a
+        # geometrically grown buffer for rows inserted after the build
+        self._built_signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._extra_signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        # Sorted unique feature-token hashes per row, for the exact re-rank:
+        # CSR arrays for the built rows, one array per inserted row
+        self._built_tokens = np.zeros(0, dtype=np.int64)
+        self._built_offsets = np.zeros(1, dtype=np.int64)
+        self._extra_tokens: List[np.ndarray] = []
+        self._row_by_id: Dict[int, int] = {}
+        # Exact neighbour rows/scores of the built rows, -1/0 padded
+        self._neighbour_rows = np.zeros((0, 0), dtype=np.int32)
+        self._neighbour_scores = np.zeros((0, 0), dtype=np.float32)
+        # Sorted (key, row) arrays for the built rows and for merged inserts,
+        # plus a dict of inserts not merged yet
+        self._built_buckets = _empty_buckets()
+        self._extra_buckets = _empty_buckets()
+        self._pending: Dict[int, List[int]] = {}
+        self._pending_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._row_by_id)
+
+    def __contains__(self, movie_id: int) -> bool:
+        return movie_id in self._row_by_id
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size][self._alive[:self._size]]
+
+    # Signatures
+
+    def signatures_for(self, tokens: np.ndarray, offsets: np.ndarray, chunk: int = 4096) -> np.ndarray:
+        """MinHash signatures for many token sets given CSR-style offsets"""
+        counts = np.diff(offsets)
+        # Give empty sets a sentinel token so reduceat stays well defined
+        if (counts == 0).any():
+            tokens = np.insert(tokens, offsets[:-1][counts == 0], EMPTY_TOKEN)
+            counts = np.maximum(counts, 1)
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        tokens = tokens.astype(np.uint64)
+        out = np.empty((len(counts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(counts), chunk):
+            stop = min(start + chunk, len(counts))
+            lo, hi = offsets[start], offsets[stop]
+            hashed = (self._a[:, None] * tokens[None, lo:hi] + self._b[:, None]) % MERSENNE_PRIME
+            out[start:stop] = np.minimum.reduceat(hashed, offsets[start:stop] - lo, axis=1).T
+        return out
+
+    def signature_for_features(self, features: Iterable[str]) -> np.ndarray:
+        return self.signatures_for(*_token_set(features))[0]
+
+    def _bucket_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, num_perm) bucket key of each band"""
+        return self._band_shift | signatures.astype(np.uint64)
+
+    def _sorted_buckets(self, rows: np.ndarray, signatures: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        keys = self._bucket_keys(signatures).ravel()
+        rows = np.repeat(rows.astype(np.int32), self.num_perm)
+        # Within a bucket, order rows by a scramble of the row number so a
+        # capped read samples the bucket instead of taking its oldest rows
+        scramble = (rows.astype(np.uint32) * np.uint32(0x9E3779B1)).astype(np.uint32)
+        order = np.lexsort((scramble, keys))
+        return keys[order], rows[order]
+
+    def _signature_rows(self, rows: List[int]) -> np.ndarray:
+        built = len(self._built_signatures)
+        return np.vstack([
+            self._built_signatures[row] if row < built else self._extra_signatures[row - built] for row in rows
+        ])
+
+    # Building and inserts
+
+    def build(self, movie_ids: np.ndarray, signatures: np.ndarray, tokens: np.ndarray, offsets: np.ndarray,
+              neighbours: Optional[Tuple[np.ndarray, np.ndarray]] = None):
+        """
+        Replace the index contents with precomputed signatures, their CSR
+        token sets and optionally exact (neighbour rows, scores) per row
+        """
+        ids = np.asarray(movie_ids, dtype=np.int64).copy()
+        signatures = np.asarray(signatures, dtype=np.uint32)
+        buckets = self._sorted_buckets(np.arange(len(ids)), signatures)
+        with self._lock:
+            self._size = len(ids)
+            self._ids, self._alive = ids, np.ones(len(ids), dtype=bool)
+            self._built_signatures = signatures
+            self._extra_signatures = np.zeros((0, self.num_perm), dtype=np.uint32)
+            self._built_tokens, self._built_offsets = np.asarray(tokens), np.asarray(offsets)
+            self._extra_tokens = []
+            self._row_by_id = {int(m): i for i, m in enumerate(ids)}
+            if neighbours is not None:
+                self._neighbour_rows, self._neighbour_scores = neighbours
+            else:
+                self._neighbour_rows = np.zeros((0, 0), dtype=np.int32)
+                self._neighbour_scores = np.zeros((0, 0), dtype=np.float32)
+            self._built_buckets = buckets
+            self._extra_buckets = _empty_buckets()
+            self._pending, self._pending_count = {}, 0
+
+    def _merge_pending(self):
+        """Re-sort the inserted rows' buckets (retired rows dropped); call with the lock held"""
+        built = len(self._built_signatures)
+        rows = np.flatnonzero(self._alive[built:self._size])
+        self._extra_buckets = self._sorted_buckets(rows + built, self._extra_signatures[rows])
+        self._pending, self._pending_count = {}, 0
+
+    def _grow(self, size: int):
+        capacity = max(size, 2 * len(self._ids), 64)
+        for name in ("_ids", "_alive"):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, movie_id: int, features: Iterable[str]):
+        """Insert or replace a single movie's feature set"""
+        self._insert(movie_id, _token_set(features)[0])
+
+    def _insert(self, movie_id: int, tokens: np.ndarray):
+        signature = self.signatures_for(tokens, np.array([0, len(tokens)]))[0]
+        keys = self._bucket_keys(signature[None, :])[0]
+        with self._lock:
+            previous = self._row_by_id.get(movie_id)
+            if previous is not None:
+                # Retire the old row; its bucket entries are skipped from now on
+                self._alive[previous] = False
+                if previous >= len(self._built_signatures):
+                    self._extra_tokens[previous - len(self._built_signatures)] = tokens[:0]
+
+            row = self._size
+            if row == len(self._ids):
+                self._grow(row + 1)
+            extra = row - len(self._built_signatures)
+            if extra == len(self._extra_signatures):
+                grown = np.zeros((max(2 * extra, 64), self.num_perm), dtype=np.uint32)
+                grown[:extra] = self._extra_signatures[:extra]
+                self._extra_signatures = grown
+            self._extra_signatures[extra] = signature
+            self._ids[row] = movie_id
+            self._alive[row] = True
+            self._extra_tokens.append(tokens)
+            self._row_by_id[movie_id] = row
+            self._size += 1
+
+            for key in keys.tolist():
+                self._pending.setdefault(key, []).append(row)
+            self._pending_count += 1
+            if self._pending_count >= self.merge_threshold:
+                self._merge_pending()
+
+    def add_movie(self, movie_data: dict):
+        self.add(int(movie_data["id"]), create_movie_vector(movie_data))
+
+    # Queries
+
+    def _collisions(self, keys: np.ndarray) -> np.ndarray:
+        """Live rows sharing each bucket key, up to max_bucket per key; call with the lock held"""
+        found = []
+        for bucket_keys, bucket_rows in (self._built_buckets, self._extra_buckets):
+            if not len(bucket_keys):
+                continue
+            lo = np.searchsorted(bucket_keys, keys, side="left")
+            counts = np.minimum(np.searchsorted(bucket_keys, keys, side="right") - lo, self.max_bucket)
+            total = int(counts.sum())
+            if total:
+                found.append(bucket_rows[_ranges(lo, counts, total)])
+        if self._pending:
+            for key in keys.tolist():
+                rows = self._pending.get(key)
+                if rows:
+                    found.append(np.asarray(rows[:self.max_bucket], dtype=np.int32))
+        if not found:
+            return np.zeros(0, dtype=np.int32)
+        rows = np.concatenate(found)
+        return rows[self._alive[rows]]
+
+    def _tokens_of(self, row: int) -> np.ndarray:
+        built = len(self._built_signatures)
+        if row < built:
+            return self._built_tokens[self._built_offsets[row]:self._built_offsets[row + 1]]
+        return self._extra_tokens[row - built]
+
+    def _exact_jaccard(self, rows: np.ndarray, queries: List[np.ndarray]) -> np.ndarray:
+        """Best exact Jaccard of each row's token set against any query set; call with the lock held"""
+        # Built rows first, gathered from the CSR arrays in one go
+        built = len(self._built_signatures)
+        order = np.argsort(rows >= built, kind="stable")
+        rows = rows[order]
+        split = int(np.searchsorted(rows, built)) if len(rows) and rows[-1] >= built else len(rows)
+        starts = self._built_offsets[rows[:split]]
+        lengths = self._built_offsets[rows[:split] + 1] - starts
+        extra = [self._extra_tokens[row - built] for row in rows[split:].tolist()]
+        sizes = np.concatenate([lengths, np.fromiter(map(len, extra), dtype=np.int64, count=len(extra))])
+        flat = np.concatenate([self._built_tokens[_ranges(starts, lengths, int(lengths.sum()))]] + extra)
+        owner = np.repeat(np.arange(len(rows)), sizes)
+
+        best = np.zeros(len(rows))
+        for query in queries:
+            shared = np.bincount(owner[np.isin(flat, query)], minlength=len(rows))
+            union = sizes + len(query) - shared
+            np.maximum(best, np.divide(shared, union, out=np.zeros(len(rows)), where=union > 0), out=best)
+        result = np.empty(len(rows))
+        result[order] = best
+        return result
+
+    def _query(self, signatures: np.ndarray, queries: List[np.ndarray], k: int,
+               exclude: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, exact Jaccards) of up to k neighbours from the buckets; call with the lock held"""
+        collided = self._collisions(self._bucket_keys(signatures).ravel())
+        if not len(collided):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        rows, counts = np.unique(collided, return_counts=True)
+        excluded = [self._row_by_id[m] for m in exclude if m in self._row_by_id]
+        keep = ~np.isin(rows, excluded)
+        rows, counts = rows[keep], counts[keep]
+        limit = k * RERANK_FACTOR
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-counts, limit - 1)[:limit]]
+        exact = self._exact_jaccard(rows, queries)
+        return self._ids[rows], exact
+
+    def query(self, features: Sequence[Iterable[str]], k: int = 20, exclude: Sequence[int] = ()) -> List[int]:
+        """Movie ids most similar to any of the query feature sets"""
+        queries = [_token_set(f)[0] for f in features]
+        signatures = np.vstack([self.signatures_for(q, np.array([0, len(q)])) for q in queries])
+        with self._lock:
+            ids, scores = self._query(signatures, queries, k, exclude)
+        return _top_k(ids, scores, k, exclude)
+
+    def similar_to(self, movie_ids: Sequence[int], k: int = 20) -> List[int]:
+        """Neighbours of indexed movies, e.g. a user's favorites"""
+        found_ids, found_scores = [], []
+        with self._lock:
+            rows = [self._row_by_id[m] for m in movie_ids if m in self._row_by_id]
+            listed = [row for row in rows if row < len(self._neighbour_rows)]
+            unlisted = [row for row in rows if row >= len(self._neighbour_rows)]
+            if listed:
+                neighbours = self._neighbour_rows[listed].ravel()
+                scores = self._neighbour_scores[listed].ravel()
+                found_ids.append(self._ids[neighbours[neighbours >= 0]])
+                found_scores.append(scores[neighbours >= 0])
+            if unlisted:
+                ids, scores = self._query(
+                    self._signature_rows(unlisted), [self._tokens_of(row) for row in unlisted], k, movie_ids
+                )
+                found_ids.append(ids)
+                found_scores.append(scores)
+        if not found_ids:
+            return []
+        return _top_k(np.concatenate(found_ids), np.concatenate(found_scores), k, movie_ids)
+
+
+def _empty_buckets() -> Tuple[np.ndarray, np.ndarray]:
+    return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int32)
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray, total: int) -> np.ndarray:
+    """Concatenated arange(start, start + length) for each pair"""
+    return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int, exclude: Sequence[int]) -> List[int]:
+    """Best-scoring distinct ids (ties by id), leaving out exclude and zero scores"""
+    keep = (scores > 0) & ~np.isin(ids, np.asarray(list(exclude), dtype=np.int64))
+    ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))
+    ids = ids[order]
+    _, first = np.unique(ids, return_index=True)
+    return ids[np.sort(first)[:k]].tolist()
+
+
+def _token_set(features: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted unique token hashes of one feature set, with CSR offsets for signatures_for"""
+    tokens = np.unique(np.array([hash_token(f) for f in set(features)], dtype=np.int64))
+    return tokens, np.array([0, len(tokens)])
+
+
+def catalog_token_sets(store: CatalogStore) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted unique feature-token hashes of every catalog row, with CSR offsets"""
+    n = len(store.ids)
+    row_parts, token_parts = [], []
+    for kind, (prefix, cap) in TOKEN_KINDS.items():
+        offsets = np.asarray(store.column(f"{kind}_offsets"))
+        values = np.asarray(store.column(f"{kind}_values"))
+        counts = np.diff(offsets)
+        rows = np.repeat(np.arange(n), counts)
+        if cap is not None:
+            position = np.arange(len(values)) - np.repeat(offsets[:-1], counts)
+            keep = position < cap
+            rows, values = rows[keep], values[keep]
+        unique_sids, inverse = np.unique(values, return_inverse=True)
+        hashed = np.array(
+            [hash_token(f"{prefix}_{store.string(int(sid))}") for sid in unique_sids], dtype=np.int64
+        )
+        row_parts.append(rows)
+        token_parts.append(hashed[inverse] if len(hashed) else np.zeros(0, dtype=np.int64))
+
+    rows = np.concatenate(row_parts)
+    tokens = np.concatenate(token_parts)
+    order = np.lexsort((tokens, rows))
+    rows, tokens = rows[order], tokens[order]
+    # Drop repeats within a row (e.g. an actor listed twice)
+    keep = np.ones(len(tokens), dtype=bool)
+    keep[1:] = (rows[1:] != rows[:-1]) | (tokens[1:] != tokens[:-1])
+    rows, tokens = rows[keep], tokens[keep]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))])
+    return tokens, offsets
+
+
+def catalog_signatures(index: SimilarityIndex, store: CatalogStore,
+                       token_sets: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+    """Vectorised MinHash signatures for every catalog row"""
+    tokens, offsets = token_sets if token_sets is not None else catalog_token_sets(store)
+    return index.signatures_for(tokens, offsets)
+
+
+def catalog_neighbours(tokens: np.ndarray, offsets: np.ndarray, k: int = CATALOG_NEIGHBOURS,
+                       chunk: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k Jaccard neighbours of every row of CSR token sets, as
+    (rows, scores) padded with -1/0. Shared-token counts come from a sparse
+    product one chunk of rows at a time; ties go to the lower row.
+    """
+    n = len(offsets) - 1
+    vocabulary, columns = np.unique(tokens, return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(tokens), dtype=np.float32), columns, offsets), shape=(n, len(vocabulary))
+    )
+    transposed = incidence.T.tocsr()
+    sizes = np.diff(offsets).astype(np.float32)
+    rows = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    for start in range(0, n, chunk):
+        shared = (incidence[start:start + chunk] @ transposed).tocsr()
+        for i in range(shared.shape[0]):
+            row = start + i
+            others = shared.indices[shared.indptr[i]:shared.indptr[i + 1]]
+            overlap = shared.data[shared.indptr[i]:shared.indptr[i + 1]]
+            jaccard = overlap / (sizes[row] + sizes[others] - overlap)
+            jaccard[others == row] = 0
+            take = min(k, len(others))
+            if take == 0:
+                continue
+            top = np.argpartition(-jaccard, take - 1)[:take]
+            top = top[np.lexsort((others[top], -jaccard[top]))]
+            top = top[jaccard[top] > 0]
+            rows[row, :len(top)] = others[top]
+            scores[row, :len(top)] = jaccard[top]
+    return rows, scores
+
+
+def _save_array(directory: str, name: str, array: np.ndarray):
+    """np.save through a temp file, so a worker never maps a half-written array"""
+    path = os.path.join(directory, f"{name}.npy")
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+def _load_array(directory: str, name: str) -> Optional[np.ndarray]:
+    path = os.path.join(directory, f"{name}.npy")
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def save_catalog_similarity(store: CatalogStore, index: Optional[SimilarityIndex] = None):
+    """Compute and persist signatures and neighbour lists next to the current catalog version"""
+    index = index or SimilarityIndex()
+    directory = os.path.join(store.path, f"v{store.version}")
+    tokens, offsets = catalog_token_sets(store)
+    _save_array(directory, "minhash", catalog_signatures(index, store, (tokens, offsets)))
+    neighbours, scores = catalog_neighbours(tokens, offsets)
+    _save_array(directory, "neighbours", neighbours)
+    _save_array(directory, "neighbour_scores", scores)
+
+
+class CatalogSimilarityIndex(SimilarityIndex):
+    """SimilarityIndex kept in sync with the local catalog"""
+
+    def __init__(self, store: CatalogStore, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+        self.version = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.store.available
+
+    def ensure_built(self):
+        self.store.reload_if_changed()
+        if self.version == self.store.version:
+            return
+        with self._build_lock:
+            version = self.store.version
+            if self.version == version:
+                return
+            self._build_catalog(version)
+            self.version = version
+
+    def _build_catalog(self, version: int):
+        directory = os.path.join(self.store.path, f"v{version}")
+        ids = np.asarray(self.store.ids)
+        tokens, offsets = catalog_token_sets(self.store)
+        signatures = _load_array(directory, "minhash")
+        # Signatures saved under another num_perm can't be compared with ours
+        if signatures is None or signatures.shape != (len(ids), self.num_perm):
+            signatures = catalog_signatures(self, self.store, (tokens, offsets))
+        neighbours = _load_array(directory, "neighbours"), _load_array(directory, "neighbour_scores")
+        if any(array is None or len(array) != len(ids) for array in neighbours):
+            print(f"Computing neighbour lists for {len(ids)} catalog titles; the ingest job precomputes them")
+            neighbours = catalog_neighbours(tokens, offsets)
+            try:
+                _save_array(directory, "neighbours", neighbours[0])
+                _save_array(directory, "neighbour_scores", neighbours[1])
+            except OSError as e:
+                print(f"Could not save neighbour lists: {e}")
+
+        # Keep movies inserted at runtime that the new catalog doesn't cover
+        with self._lock:
+            extras = [
+                (movie_id, self._tokens_of(row)) for movie_id, row in self._row_by_id.items()
+                if self.store.row_of(movie_id) is None
+            ]
+        self.build(ids, signatures, tokens, offsets, neighbours)
+        for movie_id, movie_tokens in extras:
+            self._insert(movie_id, movie_tokens)
+
+    def similar_to(self, movie_ids: Sequence[int], k: int = 20) -> List[int]:
+        self.ensure_built()
+        return super().similar_to(movie_ids, k)
+
+
+similarity_index = CatalogSimilarityIndex(catalog_store)
@@ -1,24 +1,87 @@
+import asyncio
 import os
-import requests
-from typing import List, Dict, Optional
+import threading
+from typing import TYPE_CHECKING, List, Dict, Optional
 from dotenv import load_dotenv
+from app.services.cache import DETAILS_PARAMS, TMDBResponseCache, create_tmdb_cache, endpoint_class, make_cache_key
+from app.services.metrics import ERRORS, TMDB_CACHE_REQUESTS, TMDB_REQUEST_SECONDS
+from app.services.singleflight import AsyncSingleFlight, SingleFlight
+from app.services.tmdb_scheduler import RETRY_STATUSES, RetryableResponse, TMDBScheduler, tmdb_scheduler
+
+if TYPE_CHECKING:
+    import httpx
 
 load_dotenv()
 
+_default_cache: Optional[TMDBResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+def default_tmdb_cache() -> TMDBResponseCache:
+    """
+    The process-wide TMDB cache, opened on first use rather than at import:
+    it connects to SQLite and maps the shared cache file. The lifespan's
+    warm-up opens it before the first request needs it.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = create_tmdb_cache()
+    return _default_cache
+
 class TMDBClient:
-    def __init__(self):
+    def __init__(self, cache: Optional[TMDBResponseCache] = None, scheduler: Optional[TMDBScheduler] = None):
         self.api_key = os.getenv("TMDB_API_KEY")
-        self.base_url = "https://api.themoviedb.org/3"
+        self.base_url = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+        self._cache = cache
+        self.scheduler = scheduler if scheduler is not None else tmdb_scheduler
+        # Concurrent misses for the same request share one upstream call
+        self.flights = SingleFlight("tmdb")
+    
+    @property
+    def cache(self) -> TMDBResponseCache:
+        if self._cache is None:
+            self._cache = default_tmdb_cache()
+        return self._cache
         
     def _make_request(self, endpoint: str, params: dict = None) -> dict:
-        """Make authenticated request to TMDB API"""
-        if params is None:
-            params = {}
-        params["api_key"] = self.api_key
-        
-        response = requests.get(f"{self.base_url}/{endpoint}", params=params)
-        response.raise_for_status()
-        return response.json()
+        """Make authenticated request to TMDB API, served from cache when fresh"""
+        params = dict(params or {})
+        endpoint_name = endpoint_class(endpoint)
+        cached = self.cache.get(endpoint, params)
+        if cached is not None:
+            TMDB_CACHE_REQUESTS.inc(endpoint=endpoint_name, result="hit")
+            return cached
+        TMDB_CACHE_REQUESTS.inc(endpoint=endpoint_name, result="miss")
+        return self.flights.do(make_cache_key(endpoint, params), lambda: self._fetch(endpoint, params))
+    
+    def _fetch(self, endpoint: str, params: dict) -> dict:
+        # Imported on the first miss, not when the app imports this module
+        import requests
+
+        endpoint_name = endpoint_class(endpoint)
+
+        def send():
+            with TMDB_REQUEST_SECONDS.time(endpoint=endpoint_name):
+                response = requests.get(f"{self.base_url}/{endpoint}", params={**params, "api_key": self.api_key})
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableResponse(response)
+            response.raise_for_status()
+            return response
+
+        try:
+            response = self.scheduler.run_blocking(
+                send, retry_on=(requests.ConnectionError, requests.Timeout)
+            )
+        except RetryableResponse as e:
+            ERRORS.inc(where="tmdb_request")
+            e.response.raise_for_status()
+        except Exception:
+            ERRORS.inc(where="tmdb_request")
+            raise
+        data = response.json()
+        self.cache.set(endpoint, params, data)
+        return data
     
     def get_popular_movies(self, page: int = 1, min_rating: float = 6.5) -> List[Dict]:
         """Get popular movies with minimum rating threshold"""
@@ -34,9 +97,7 @@ class TMDBClient:
     
     def get_movie_details(self, movie_id: int) -> Dict:
         """Get full movie details including credits and keywords"""
-        movie = self._make_request(f"movie/{movie_id}", {
-            "append_to_response": "credits,keywords,external_ids"
-        })
+        movie = self._make_request(f"movie/{movie_id}", DETAILS_PARAMS)
         return movie
     
     def get_genres(self) -> List[Dict]:
@@ -48,4 +109,137 @@ class TMDBClient:
         """Get cast and crew for a movie"""
         return self._make_request(f"movie/{movie_id}/credits")
 
+class AsyncTMDBClient:
+    """Non-blocking TMDB client with a shared keep-alive connection pool"""
+
+    def __init__(
+        self,
+        cache: Optional[TMDBResponseCache] = None,
+        max_connections: int = 20,
+        max_concurrency: int = 10,
+        timeout: float = 10.0,
+        scheduler: Optional[TMDBScheduler] = None,
+    ):
+        self.api_key = os.getenv("TMDB_API_KEY")
+        self.base_url = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+        self._cache = cache
+        self.scheduler = scheduler if scheduler is not None else tmdb_scheduler
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.flights = AsyncSingleFlight("tmdb_async")
+
+    @property
+    def cache(self) -> TMDBResponseCache:
+        if self._cache is None:
+            self._cache = default_tmdb_cache()
+        return self._cache
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        """Create the pooled HTTP client lazily, inside the running event loop"""
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=self.timeout,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _make_request(self, endpoint: str, params: dict = None, refresh: bool = False) -> dict:
+        """
+        Make authenticated request to TMDB API, served from cache when fresh.
+        refresh skips the cache read so an entry can be renewed before it expires.
+        """
+        params = dict(params or {})
+        endpoint_name = endpoint_class(endpoint)
+        if not refresh:
+            cached = self.cache.get(endpoint, params)
+            if cached is not None:
+                TMDB_CACHE_REQUESTS.inc(endpoint=endpoint_name, result="hit")
+                return cached
+            TMDB_CACHE_REQUESTS.inc(endpoint=endpoint_name, result="miss")
+        return await self.flights.do(make_cache_key(endpoint, params), lambda: self._fetch(endpoint, params))
+
+    async def _fetch(self, endpoint: str, params: dict) -> dict:
+        import httpx
+
+        endpoint_name = endpoint_class(endpoint)
+        client = self._get_client()
+
+        async def send():
+            async with self._semaphore:
+                with TMDB_REQUEST_SECONDS.time(endpoint=endpoint_name):
+                    response = await client.get(f"/{endpoint}", params={**params, "api_key": self.api_key})
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableResponse(response)
+            response.raise_for_status()
+            return response
+
+        try:
+            response = await self.scheduler.run(send, retry_on=(httpx.TransportError,))
+        except RetryableResponse as e:
+            ERRORS.inc(where="tmdb_request")
+            e.response.raise_for_status()
+        except Exception:
+            ERRORS.inc(where="tmdb_request")
+            raise
+        data = response.json()
+        self.cache.set(endpoint, params, data)
+        return data
+
+    async def get_popular_movies(self, page: int = 1, min_rating: float = 6.5) -> List[Dict]:
+        """Get popular movies with minimum rating threshold"""
+        data = await self._make_request("movie/popular", {"page": page})
+        movies = data.get("results", [])
+        return [m for m in movies if m.get("vote_average", 0) >= min_rating]
+
+    async def search_movies(self, query: str, page: int = 1) -> List[Dict]:
+        """Search for movies by title"""
+        data = await self._make_request("search/movie", {"query": query, "page": page})
+        return data.get("results", [])
+
+    async def get_movie_details(self, movie_id: int) -> Dict:
+        """Get full movie details including credits and keywords"""
+        return await self._make_request(f"movie/{movie_id}", DETAILS_PARAMS)
+
+    async def get_movies_details(self, movie_ids: List[int]) -> Dict[int, Dict]:
+        """Fetch details for many movies concurrently, skipping failures"""
+        unique_ids = list(dict.fromkeys(movie_ids))
+        results = await asyncio.gather(
+            *(self.get_movie_details(movie_id) for movie_id in unique_ids),
+            return_exceptions=True,
+        )
+        details = {}
+        for movie_id, result in zip(unique_ids, results):
+            if isinstance(result, Exception):
+                print(f"Error fetching details for movie {movie_id}: {result}")
+                ERRORS.inc(where="movie_details")
+                continue
+            details[movie_id] = result
+        return details
+
+    async def get_genres(self) -> List[Dict]:
+        """Get list of all movie genres"""
+        data = await self._make_request("genre/movie/list")
+        return data.get("genres", [])
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# Cheap to construct: both open default_tmdb_cache() on first use
 tmdb_client = TMDBClient()
+async_tmdb_client = AsyncTMDBClient(
+    max_connections=int(os.getenv("TMDB_MAX_CONNECTIONS", "20")),
+    max_concurrency=int(os.getenv("TMDB_MAX_CONCURRENCY", "10")),
+)
@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from app.services.metrics import TMDB_RETRIES
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+INGEST = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", INGEST: "ingest"}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_priority = contextvars.ContextVar("tmdb_priority", default=INTERACTIVE)
+
+T = TypeVar("T")
+
+
+@contextmanager
+def tmdb_priority(priority: int):
+    """Run TMDB calls made inside the block (and tasks it spawns) at a priority class"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for the next `seconds`, e.g. after a 429"""
+        with self._lock:
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds, from either delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryableResponse(Exception):
+    """Raised by a send callable for a 429/5xx response that may be retried"""
+
+    def __init__(self, response):
+        super().__init__(f"TMDB returned {response.status_code}")
+        self.response = response
+        self.status_code = response.status_code
+        self.retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+
+
+class TMDBScheduler:
+    """
+    Rate limiting and retries for TMDB calls. Every attempt takes a token
+    from a bucket sized to the API quota; when tokens run out, waiters are
+    released in priority order (interactive before background prefetch and
+    ingest), then FIFO. 429/5xx responses and transport errors are retried
+    with full-jitter exponential backoff, waiting at least Retry-After.
+    """
+
+    def __init__(self, rate: float = 40.0, burst: float = 40.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 10.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._seq = itertools.count()
+        # asyncio waiters: [priority, seq, future]
+        self._waiters: List[list] = []
+        self._dispatcher: Optional[asyncio.Task] = None
+        # threaded waiters: (priority, seq)
+        self._thread_waiters: List[tuple] = []
+        self._cond = threading.Condition()
+
+    def depth(self) -> Dict[str, int]:
+        """Callers waiting for a token, by priority class"""
+        counts = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in list(self._waiters):
+            if not future.done():
+                counts[PRIORITY_NAMES.get(priority, "interactive")] += 1
+        for priority, _ in list(self._thread_waiters):
+            counts[PRIORITY_NAMES.get(priority, "interactive")] += 1
+        return counts
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None to give up"""
+        retry_after = getattr(error, "retry_after", None) or 0.0
+        # Don't hold a request for longer than the backoff cap
+        if attempt >= self.max_retries or retry_after > self.backoff_max:
+            return None
+        if getattr(error, "status_code", None) == 429:
+            # The quota is shared, so every caller backs off, not just this one
+            self.bucket.pause(retry_after or self.backoff_base)
+        TMDB_RETRIES.inc(reason=_retry_reason(error))
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after)
+
+    async def acquire(self, priority: Optional[int] = None):
+        """Wait for a token; nothing jumps the queue while others are waiting"""
+        if not self._waiters and self.bucket.take() == 0:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, [current_priority() if priority is None else priority, next(self._seq), future])
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._dispatcher = loop.create_task(self._dispatch())
+        # A cancelled waiter's future is done, so the dispatcher skips it
+        await future
+
+    async def _dispatch(self):
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self.bucket.take()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(self._waiters)[2].set_result(None)
+
+    def acquire_blocking(self, priority: Optional[int] = None):
+        """Threaded counterpart of acquire, sharing the same bucket"""
+        entry = (current_priority() if priority is None else priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._thread_waiters, entry)
+            try:
+                while True:
+                    if self._thread_waiters[0] == entry:
+                        wait = self.bucket.take()
+                        if not wait:
+                            return
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._thread_waiters.remove(entry)
+                heapq.heapify(self._thread_waiters)
+                self._cond.notify_all()
+
+    async def run(self, send: Callable[[], Awaitable[T]], retry_on: tuple = (), priority: Optional[int] = None) -> T:
+        """
+        Call send() once per token until it succeeds. send raises
+        RetryableResponse (or one of retry_on) for attempts worth retrying.
+        """
+        priority = current_priority() if priority is None else priority
+        attempt = 0
+        while True:
+            await self.acquire(priority)
+            try:
+                return await send()
+            except (RetryableResponse, *retry_on) as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def run_blocking(self, send: Callable[[], T], retry_on: tuple = (), priority: Optional[int] = None) -> T:
+        priority = current_priority() if priority is None else priority
+        attempt = 0
+        while True:
+            self.acquire_blocking(priority)
+            try:
+                return send()
+            except (RetryableResponse, *retry_on) as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+
+def _retry_reason(error: Exception) -> str:
+    return str(error.status_code) if isinstance(error, RetryableResponse) else "transport"
+
+
+tmdb_scheduler = TMDBScheduler(
+    rate=float(os.getenv("TMDB_RATE_LIMIT", "40")),
+    burst=float(os.getenv("TMDB_RATE_BURST", "40")),
+    max_retries=int(os.getenv("TMDB_MAX_RETRIES", "3")),
+    backoff_base=float(os.getenv("TMDB_BACKOFF_BASE", "0.5")),
+    backoff_max=float(os.getenv("TMDB_BACKOFF_MAX", "10")),
+)
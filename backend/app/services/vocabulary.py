@@ -0,0 +1,56 @@
+import threading
+from itertools import repeat
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+class Vocabulary:
+    """Process-wide interning of names to dense integer ids"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, name: str) -> int:
+        """Id for name, assigning the next one if it is new"""
+        name_id = self._ids.get(name)
+        if name_id is None:
+            with self._lock:
+                name_id = self._ids.get(name)
+                if name_id is None:
+                    name_id = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = name_id
+        return name_id
+
+    def intern_many(self, names: Iterable[str]) -> np.ndarray:
+        names = names if isinstance(names, list) else list(names)
+        ids = np.fromiter(map(self._ids.get, names, repeat(-1, len(names))), dtype=np.int32, count=len(names))
+        missing = np.flatnonzero(ids < 0)
+        if len(missing):
+            ids[missing] = [self.intern(names[i]) for i in missing.tolist()]
+        return ids
+
+    def lookup(self, name: str) -> int:
+        """Id for name, or -1 if it was never interned"""
+        return self._ids.get(name, -1)
+
+    def lookup_many(self, names: Iterable[str]) -> np.ndarray:
+        names = list(names)
+        return np.array(list(map(self._ids.get, names, repeat(-1, len(names)))), dtype=np.int32)
+
+    def name(self, name_id: int) -> str:
+        return self._names[name_id]
+
+    def names(self, name_ids: np.ndarray) -> List[str]:
+        names = self._names
+        return [names[i] for i in np.asarray(name_ids).tolist()]
+
+
+genre_vocabulary = Vocabulary()
+actor_vocabulary = Vocabulary()
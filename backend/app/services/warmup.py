@@ -0,0 +1,52 @@
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+from app.services.metrics import ERRORS
+
+
+class Warmup:
+    """
+    Start-up work the lifespan runs in the background after the server
+    is listening: store connections, catalog maps, indexes. /ready stays
+    503 until every step has run, so the load balancer only routes to a
+    warm worker while /health answers from the first second.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.started_at: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.failed: Dict[str, str] = {}
+
+    async def step(self, name: str, fn: Callable[[], object]):
+        """Run one blocking step off the event loop; a failure is logged, not fatal"""
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {e}")
+            ERRORS.inc(where="warmup")
+            self.failed[name] = str(e)
+        self.steps[name] = round(time.perf_counter() - started, 3)
+
+    def begin(self):
+        self.ready = False
+        self.started_at = time.perf_counter()
+        self.steps, self.failed = {}, {}
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self.started_at, 3)
+        self.ready = True
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "seconds": self.seconds,
+            "steps": dict(self.steps),
+            "failed": dict(self.failed),
+        }
+
+
+warmup = Warmup()
@@ -0,0 +1 @@
+"""Load and micro-benchmarks with a local TMDB stand-in"""
@@ -0,0 +1,204 @@
+"""
+Local TMDB stand-in for benchmarks.
+
+Serves recorded fixtures (see `record`) and falls back to deterministic
+synthetic payloads, with configurable latency and per-endpoint call counts.
+
+    python -m benchmarks.fake_tmdb serve --port 8765 --latency-ms 80
+    python -m benchmarks.fake_tmdb record --out benchmarks/recorded --pages 5
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from benchmarks import fixtures
+from app.services.cache import endpoint_class, make_cache_key
+
+
+def fixture_filename(endpoint: str, params: dict) -> str:
+    key = make_cache_key(endpoint, params)
+    return re.sub(r"[^A-Za-z0-9_.=-]+", "_", key) + ".json"
+
+
+class FakeTMDB:
+    """Threaded HTTP server that mimics the TMDB v3 endpoints the app uses"""
+
+    def __init__(self, port: int = 0, latency_ms: float = 50.0, jitter_ms: float = 20.0,
+                 fixtures_dir: str = None, error_rate: float = 0.0, rate_limit: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fixtures_dir = fixtures_dir
+        self.error_rate = error_rate
+        # Requests per second before answering 429, like TMDB's quota; 0 disables
+        self.rate_limit = rate_limit
+        self.rejected = 0
+        self._window = (0, 0)  # (second, requests in it)
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/3"
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.rejected = 0
+
+    def over_limit(self) -> bool:
+        if not self.rate_limit:
+            return False
+        second = int(time.monotonic())
+        with self._lock:
+            start, count = self._window
+            count = count + 1 if start == second else 1
+            self._window = (second, count)
+            if count > self.rate_limit:
+                self.rejected += 1
+                return True
+        return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def payload(self, endpoint: str, params: dict):
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, fixture_filename(endpoint, params))
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+
+        match = re.fullmatch(r"movie/(\d+)", endpoint)
+        if match:
+            return fixtures.movie_details(int(match.group(1)))
+        if endpoint == "movie/popular":
+            return fixtures.popular_page(int(params.get("page", 1)))
+        if endpoint == "search/movie":
+            return fixtures.search_results(params.get("query", ""), int(params.get("page", 1)))
+        if endpoint == "genre/movie/list":
+            return fixtures.genre_list()
+        if endpoint == "movie/changes":
+            return fixtures.movie_changes()
+        return None
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/__stats":
+                    with fake._lock:
+                        return self._send(200, {"calls": dict(fake.calls), "total": sum(fake.calls.values()),
+                                                "rejected": fake.rejected})
+                if fake.over_limit():
+                    return self._send(429, {"status_message": "Rate limit exceeded"}, {"Retry-After": "1"})
+
+                endpoint = url.path.removeprefix("/3/").strip("/")
+                params = {k: v for k, v in parse_qsl(url.query) if k != "api_key"}
+                with fake._lock:
+                    fake.calls[endpoint_class(endpoint)] += 1
+
+                delay = max(0.0, random.gauss(fake.latency_ms, fake.jitter_ms)) / 1000
+                time.sleep(delay)
+
+                if fake.error_rate and random.random() < fake.error_rate:
+                    return self._send(503, {"status_message": "Service unavailable"})
+                body = fake.payload(endpoint, params)
+                if body is None:
+                    return self._send(404, {"status_message": "Not found"})
+                self._send(200, body)
+
+        return Handler
+
+
+def record(out_dir: str, pages: int):
+    """Record real TMDB responses for popular pages, their details and genres"""
+    from app.services.tmdb_client import TMDBClient
+    from app.services.cache import TMDBResponseCache
+
+    client = TMDBClient(cache=TMDBResponseCache(disk_path=None))
+    os.makedirs(out_dir, exist_ok=True)
+
+    def save(endpoint: str, params: dict, body: dict):
+        with open(os.path.join(out_dir, fixture_filename(endpoint, params)), "w") as f:
+            json.dump(body, f)
+
+    save("genre/movie/list", {}, client._make_request("genre/movie/list"))
+    for page in range(1, pages + 1):
+        data = client._make_request("movie/popular", {"page": page})
+        save("movie/popular", {"page": page}, data)
+        for movie in data.get("results", []):
+            params = {"append_to_response": "credits,keywords,external_ids"}
+            save(f"movie/{movie['id']}", params, client._make_request(f"movie/{movie['id']}", params))
+        print(f"Recorded page {page}/{pages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local TMDB stand-in")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency-ms", type=float, default=50.0)
+    serve.add_argument("--jitter-ms", type=float, default=20.0)
+    serve.add_argument("--fixtures", help="Directory of recorded fixtures")
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    serve.add_argument("--rate-limit", type=float, default=0.0, help="Requests/second before answering 429")
+
+    rec = sub.add_parser("record")
+    rec.add_argument("--out", default="benchmarks/recorded")
+    rec.add_argument("--pages", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.out, args.pages)
+        return
+
+    fake = FakeTMDB(args.port, args.latency_ms, args.jitter_ms, args.fixtures, args.error_rate, args.rate_limit)
+    print(f"Fake TMDB listening on {fake.base_url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
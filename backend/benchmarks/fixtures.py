@@ -0,0 +1,100 @@
+"""Deterministic synthetic TMDB payloads for benchmarks."""
+import random
+from typing import Dict, List
+
+GENRES = [
+    (28, "Action"), (12, "Adventure"), (16, "Animation"), (35, "Comedy"), (80, "Crime"),
+    (99, "Documentary"), (18, "Drama"), (10751, "Family"), (14, "Fantasy"), (36, "History"),
+    (27, "Horror"), (10402, "Music"), (9648, "Mystery"), (10749, "Romance"), (878, "Science Fiction"),
+    (53, "Thriller"), (10752, "War"), (37, "Western"),
+]
+NUM_ACTORS = 5000
+NUM_KEYWORDS = 3000
+MOVIES_PER_PAGE = 20
+
+
+def movie_details(movie_id: int) -> Dict:
+    """Full details payload (credits, keywords, external_ids) for a movie id"""
+    rng = random.Random(movie_id)
+    genres = rng.sample(GENRES, rng.randint(1, 3))
+    return {
+        "id": movie_id,
+        "title": f"Movie {movie_id}",
+        "overview": f"Synthetic overview for movie {movie_id}.",
+        "release_date": f"{rng.randint(1970, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "poster_path": f"/poster{movie_id}.jpg",
+        "backdrop_path": f"/backdrop{movie_id}.jpg",
+        "original_language": "en",
+        "vote_average": round(rng.uniform(4.0, 9.0), 1),
+        "vote_count": rng.randint(10, 20000),
+        "popularity": round(rng.expovariate(1 / 40), 3),
+        "genres": [{"id": gid, "name": name} for gid, name in genres],
+        "credits": {
+            "cast": [{"name": f"Actor {rng.randrange(NUM_ACTORS)}"} for _ in range(12)],
+            "crew": [{"job": "Director", "name": f"Director {rng.randrange(NUM_ACTORS // 5)}"}],
+        },
+        "keywords": {"keywords": [{"name": f"keyword {rng.randrange(NUM_KEYWORDS)}"} for _ in range(rng.randint(0, 15))]},
+        "external_ids": {"imdb_id": f"tt{movie_id:07d}"},
+    }
+
+
+def list_result(movie_id: int) -> Dict:
+    """Movie in the shape of a TMDB list/search result"""
+    details = movie_details(movie_id)
+    summary = {k: v for k, v in details.items() if k not in ("genres", "credits", "keywords", "external_ids")}
+    summary["genre_ids"] = [g["id"] for g in details["genres"]]
+    return summary
+
+
+def popular_page(page: int, total_pages: int = 500) -> Dict:
+    start = (page - 1) * MOVIES_PER_PAGE + 1
+    return {
+        "page": page,
+        "results": [list_result(i) for i in range(start, start + MOVIES_PER_PAGE)],
+        "total_pages": total_pages,
+        "total_results": total_pages * MOVIES_PER_PAGE,
+    }
+
+
+def search_results(query: str, page: int = 1) -> Dict:
+    rng = random.Random(f"{query}:{page}")
+    ids = sorted(rng.sample(range(1, 10000), MOVIES_PER_PAGE))
+    return {"page": page, "results": [list_result(i) for i in ids], "total_pages": 1}
+
+
+def genre_list() -> Dict:
+    return {"genres": [{"id": gid, "name": name} for gid, name in GENRES]}
+
+
+def movie_changes() -> Dict:
+    return {"results": [], "page": 1, "total_pages": 1}
+
+
+def sample_profile(uid: str, num_favorites: int = 5, num_actors: int = 20) -> Dict:
+    """Onboarding request body with deterministic favorites"""
+    rng = random.Random(uid)
+    favorite_ids = rng.sample(range(1, 2000), num_favorites)
+    return {
+        "uid": uid,
+        "email": f"{uid}@example.com",
+        "favorite_movies": [{"id": i, "title": f"Movie {i}"} for i in favorite_ids],
+        "preferred_genres": [name for _, name in rng.sample(GENRES, 3)],
+        "preferred_actors": [f"Actor {rng.randrange(NUM_ACTORS)}" for _ in range(num_actors)],
+    }
+
+
+def weighted_profile(num_favorites: int = 5, num_actors: int = 20, seed: int = 0) -> Dict:
+    """Stored-profile shape with genre/actor weights, for micro-benchmarks"""
+    rng = random.Random(seed)
+    actors = rng.sample(range(max(NUM_ACTORS, 2 * num_actors)), num_actors)
+    return {
+        "uid": f"bench-{seed}-{num_favorites}-{num_actors}",
+        "profile_version": 1,
+        "favorite_movies": [{"id": i, "title": f"Movie {i}"} for i in rng.sample(range(1, 2000), num_favorites)],
+        "genre_weights": {name: round(rng.uniform(0.5, 2.0), 2) for _, name in GENRES},
+        "actor_weights": {f"Actor {a}": round(rng.uniform(0.5, 2.0), 2) for a in actors},
+    }
+
+
+def movie_ids(count: int, start: int = 1) -> List[int]:
+    return list(range(start, start + count))
@@ -0,0 +1,107 @@
+"""
+Import-time budget for the API: how long a fresh worker spends importing
+app.main before it can even start its lifespan, which heavy modules get
+pulled in on the way, and whether the TMDB caches were opened. Runs with
+the caller's (production) environment.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget 1.5 --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Only the lifespan (or first use) may import these
+DEFERRED_MODULES = ("firebase_admin", "google.cloud.firestore", "httpx", "requests", "uvicorn")
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+from app.services import tmdb_client
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [m for m in %r if m in sys.modules],
+    "tmdb_cache_opened": tmdb_client._default_cache is not None,
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def probe_env() -> Dict[str, str]:
+    # The production configuration: caches, catalog and store are all
+    # enabled, so anything opened at import shows up in the timing
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.getcwd() + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def measure_import(repeat: int) -> Dict:
+    """Best-of-repeat probe result for importing app.main in a fresh interpreter"""
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE], env=probe_env(), capture_output=True, text=True, check=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def slowest_imports(top: int) -> List[Tuple[str, float]]:
+    """Top-level packages by cumulative import time (wherever first imported), from -X importtime"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=probe_env(), capture_output=True, text=True, check=True,
+    )
+    totals: Dict[str, float] = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        package = name.strip()
+        if "." not in package:
+            totals[package] = max(totals.get(package, 0.0), int(cumulative) / 1e6)
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch import-time budget")
+    parser.add_argument("--budget", type=float, default=1.5, help="Seconds allowed to import app.main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Show the slowest top-level imports")
+    parser.add_argument("--output", help="Write the result as JSON")
+    args = parser.parse_args()
+
+    result = measure_import(args.repeat)
+    seconds, loaded = result["seconds"], result["loaded"]
+    print(f"import app.main: {seconds * 1e3:.0f} ms (budget {args.budget * 1e3:.0f} ms)")
+    for package, package_seconds in slowest_imports(args.top):
+        print(f"  {package:40s} {package_seconds * 1e3:8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({**result, "budget": args.budget}, f, indent=2)
+
+    ok = True
+    if loaded:
+        ok = False
+        print(f"DEFERRED MODULES IMPORTED: {', '.join(loaded)}")
+    if result["tmdb_cache_opened"]:
+        ok = False
+        print("TMDB CACHE OPENED AT IMPORT")
+    if seconds > args.budget:
+        ok = False
+        print(f"OVER BUDGET by {(seconds - args.budget) * 1e3:.0f} ms")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
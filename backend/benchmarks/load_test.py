@@ -0,0 +1,197 @@
+"""
+End-to-end latency/throughput benchmark against a local TMDB stand-in.
+
+Starts the fake TMDB server, launches the API under uvicorn with a local
+SQLite profile store, seeds users and drives each scenario at the given
+concurrency.
+
+    python -m benchmarks.load_test --concurrency 32 --requests 500
+    python -m benchmarks.load_test --scenario recommendations --latency-ms 150
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks import fixtures
+from benchmarks.fake_tmdb import FakeTMDB
+
+SEARCH_TERMS = ["the", "star", "love", "dark", "night", "man", "war", "lost", "king", "blue"]
+
+
+def build_scenarios(uids: List[str]) -> Dict[str, Callable[[random.Random], Tuple[str, str, dict]]]:
+    """Scenario name -> request factory returning (method, path, json body)"""
+    return {
+        "profile": lambda rng: ("POST", "/api/users/profile", fixtures.sample_profile(rng.choice(uids))),
+        "recommendations": lambda rng: (
+            "GET", f"/api/recommendations/{rng.choice(uids)}?page={rng.randint(1, 3)}", None
+        ),
+        "feedback": lambda rng: ("POST", "/api/feedback/", {
+            "uid": rng.choice(uids),
+            "movie_id": rng.randint(1, 2000),
+            "action": rng.choice(["like", "dislike"]),
+        }),
+        "search": lambda rng: (
+            "GET", f"/api/movies/search?q={rng.choice(SEARCH_TERMS)[:rng.randint(1, 5)]}", None
+        ),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, factory, requests: int, concurrency: int, seed: int):
+    """Issue `requests` calls with at most `concurrency` in flight"""
+    rng = random.Random(seed)
+    plan = [factory(rng) for _ in range(requests)]
+    latencies = np.zeros(requests)
+    statuses: Dict[int, int] = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            method, path, body = plan[i]
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            latencies[i] = time.perf_counter() - start
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return latencies, statuses, elapsed
+
+
+def summarize(name: str, latencies: np.ndarray, statuses: Dict[int, int], elapsed: float, upstream: int) -> Dict:
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "rps": round(len(latencies) / elapsed, 1),
+        "upstream_per_request": round(upstream / len(latencies), 2),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def start_api(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=backend_dir,
+        env={**os.environ, **env},
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # /health answers before warm-up; /ready only once it's done
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not become ready")
+
+
+async def run(args) -> List[Dict]:
+    fake = FakeTMDB(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, fixtures_dir=args.fixtures,
+                    rate_limit=args.tmdb_rate_limit).start()
+    workdir = tempfile.mkdtemp(prefix="cinematch-bench-")
+    env = {
+        "TMDB_BASE_URL": fake.base_url,
+        "TMDB_API_KEY": "benchmark",
+        "PROFILE_STORE": "sqlite",
+        "PROFILE_STORE_PATH": os.path.join(workdir, "profiles.sqlite3"),
+        "TMDB_CACHE_PATH": "" if args.cold else os.path.join(workdir, "tmdb_cache.sqlite3"),
+        # Shared by this run's workers only
+        "SHARED_CACHE_DIR": "" if args.cold else os.path.join(workdir, "shared"),
+        "FEEDBACK_SPOOL_PATH": os.path.join(workdir, "feedback_spool.jsonl"),
+        "CATALOG_PATH": args.catalog or os.path.join(workdir, "catalog"),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search_index.json"),
+        # Keep upstream call counts down to what the measured requests cause
+        "CACHE_WARMER_ENABLED": "false",
+    }
+    api = start_api(args.port, args.workers, env)
+    uids = [f"bench-user-{i}" for i in range(args.users)]
+    scenarios = build_scenarios(uids)
+    selected = list(scenarios) if args.scenario == "all" else [args.scenario]
+
+    results = []
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}",
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=args.concurrency),
+        ) as client:
+            await wait_until_ready(client)
+
+            # Seed every user so profile reads hit existing documents
+            for uid in uids:
+                await client.post("/api/users/profile", json=fixtures.sample_profile(uid))
+
+            for name in selected:
+                fake.reset()
+                latencies, statuses, elapsed = await run_scenario(
+                    client, scenarios[name], args.requests, args.concurrency, args.seed
+                )
+                result = summarize(name, latencies, statuses, elapsed, fake.total_calls())
+                results.append(result)
+                print(
+                    f"{name:16s} p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms "
+                    f"p99={result['p99_ms']:8.2f}ms rps={result['rps']:8.1f} "
+                    f"upstream/req={result['upstream_per_request']:5.2f} statuses={result['statuses']}"
+                )
+    finally:
+        api.terminate()
+        api.wait(timeout=10)
+        fake.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch end-to-end load benchmark")
+    parser.add_argument("--scenario", default="all",
+                        choices=["all", "profile", "recommendations", "feedback", "search"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake TMDB mean latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--tmdb-rate-limit", type=float, default=0.0,
+                        help="Fake TMDB requests/second before it answers 429")
+    parser.add_argument("--fixtures", help="Directory of recorded TMDB fixtures")
+    parser.add_argument("--catalog", help="Use an ingested catalog at this path")
+    parser.add_argument("--cold", action="store_true", help="Disable the on-disk and shared TMDB caches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
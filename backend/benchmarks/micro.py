@@ -0,0 +1,149 @@
+"""
+Micro-benchmarks for the scoring, diversity and learning hot paths.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.micro --baseline micro.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List
+
+# Keep benchmarks hermetic: no disk cache, no catalog, no network
+os.environ.setdefault("TMDB_CACHE_PATH", "")
+os.environ.setdefault("SHARED_CACHE_DIR", "")
+os.environ.setdefault("CATALOG_PATH", os.path.join(tempfile.gettempdir(), "cinematch-bench-no-catalog"))
+os.environ.setdefault("PROFILE_STORE", "memory")
+
+from benchmarks import fixtures  # noqa: E402
+from app.services.learning_engine import update_weights_from_feedback  # noqa: E402
+from app.services.ml_recommender import feature_ids, mmr_rerank  # noqa: E402
+from app.services.recommendation_engine import calculate_final_score, score_movies  # noqa: E402
+from app.services.tmdb_client import DETAILS_PARAMS, tmdb_client  # noqa: E402
+
+
+def prime_details(movie_ids: List[int]) -> List[Dict]:
+    """Put synthetic details in the TMDB response cache so scoring never hits HTTP"""
+    details = []
+    for movie_id in movie_ids:
+        movie = fixtures.movie_details(movie_id)
+        tmdb_client.cache.set(f"movie/{movie_id}", DETAILS_PARAMS, movie)
+        details.append(movie)
+    return details
+
+
+def measure(fn: Callable, min_time: float = 0.2) -> float:
+    """Best-of-5 seconds per call"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+
+def bench_scoring() -> List[Dict]:
+    results = []
+    for num_candidates in (20, 200, 2000):
+        for num_favorites in (5, 20):
+            profile = fixtures.weighted_profile(num_favorites=num_favorites, num_actors=50)
+            favorite_ids = [m["id"] for m in profile["favorite_movies"]]
+            favorites = prime_details(favorite_ids)
+            candidates = prime_details(fixtures.movie_ids(num_candidates, start=5000))
+
+            label = f"candidates={num_candidates},favorites={num_favorites}"
+            if num_candidates <= 200:
+                per_movie = measure(lambda: [calculate_final_score(profile, c, favorite_ids) for c in candidates])
+                results.append({"name": f"calculate_final_score[{label}]", "seconds": per_movie})
+            batch = measure(lambda: score_movies(profile, candidates, favorites))
+            results.append({"name": f"score_movies[{label}]", "seconds": batch})
+
+    # Profiles that have accumulated thousands of weighted actors
+    candidates = prime_details(fixtures.movie_ids(200, start=5000))
+    for num_actors in (1000, 10000):
+        profile = fixtures.weighted_profile(num_actors=num_actors)
+        favorites = prime_details([m["id"] for m in profile["favorite_movies"]])
+        results.append({
+            "name": f"score_movies[candidates=200,actors={num_actors}]",
+            "seconds": measure(lambda: score_movies(profile, candidates, favorites)),
+        })
+    return results
+
+
+def bench_diversity() -> List[Dict]:
+    results = []
+    for n in (100, 1000, 5000):
+        scored = [
+            {
+                "movie": {"id": m["id"]},
+                "score": 1.0 / (i + 1),
+                "details": {
+                    "genres": [g["name"] for g in m["genres"]],
+                    "actors": [a["name"] for a in m["credits"]["cast"][:3]],
+                },
+            }
+            for i, m in enumerate(fixtures.movie_details(i) for i in range(1, n + 1))
+        ]
+        # Interned once when a batch is scored, as the router does
+        details = [rec["details"] for rec in scored]
+        results.append({"name": f"feature_ids[n={n}]", "seconds": measure(lambda: feature_ids(details))})
+        for rec, ids in zip(scored, feature_ids(details)):
+            rec["feature_ids"] = ids
+        for top_k in (50, 100):
+            results.append({
+                "name": f"mmr_rerank[n={n},top_k={top_k}]",
+                "seconds": measure(lambda: mmr_rerank(scored, top_k=top_k, seed=7)),
+            })
+    return results
+
+
+def bench_learning() -> List[Dict]:
+    results = []
+    movie = fixtures.movie_details(42)
+    for num_actors in (10, 1000, 10000):
+        profile = fixtures.weighted_profile(num_actors=num_actors)
+        results.append({
+            "name": f"update_weights_from_feedback[actors={num_actors}]",
+            "seconds": measure(lambda: update_weights_from_feedback(profile, movie, "like")),
+        })
+    return results
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float) -> bool:
+    """Print slowdowns against a baseline; False if any exceeds the tolerance"""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r["seconds"] for r in json.load(f)}
+    ok = True
+    for result in results:
+        before = baseline.get(result["name"])
+        if not before:
+            continue
+        change = result["seconds"] / before - 1
+        if change > tolerance:
+            ok = False
+            print(f"REGRESSION {result['name']}: {change:+.0%}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CineMatch micro-benchmarks")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    results = bench_scoring() + bench_diversity() + bench_learning()
+    for result in results:
+        print(f"{result['name']:60s} {result['seconds'] * 1e6:12.1f} us")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
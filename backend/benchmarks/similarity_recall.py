@@ -0,0 +1,95 @@
+"""
+Recall of the similarity index against exact Jaccard over the same
+create_movie_vector feature sets, and similar_to latency, both for a built
+catalog (precomputed neighbour lists) and for movies inserted one at a time
+(LSH buckets).
+
+    python -m benchmarks.similarity_recall
+    python -m benchmarks.similarity_recall --movies 2000 --k 10 --min-recall 0.8
+"""
+import argparse
+import sys
+import time
+from typing import List, Set, Tuple
+
+import numpy as np
+
+from benchmarks import fixtures
+from app.services.recommendation_engine import create_movie_vector
+from app.services.similarity_index import SimilarityIndex, _token_set, catalog_neighbours
+
+
+def exact_jaccard(features: List[Set[str]]) -> np.ndarray:
+    """Movies x movies exact Jaccard, -1 on the diagonal"""
+    n = len(features)
+    vocabulary = {f: i for i, f in enumerate(set().union(*features))}
+    matrix = np.zeros((n, len(vocabulary)), dtype=np.float32)
+    for row, names in enumerate(features):
+        matrix[row, [vocabulary[f] for f in names]] = 1.0
+    sizes = matrix.sum(axis=1)
+    intersection = matrix @ matrix.T
+    jaccard = intersection / np.maximum(sizes[:, None] + sizes[None, :] - intersection, 1)
+    np.fill_diagonal(jaccard, -1.0)
+    return jaccard
+
+
+def evaluate(index: SimilarityIndex, movies: List[dict], jaccard: np.ndarray, k: int) -> Tuple[float, int, float]:
+    """(tie-aware recall@k, movies with no neighbours, mean ms per similar_to)"""
+    # Low Jaccards tie a lot, so any neighbour at least as close as the
+    # true k-th one counts as a hit
+    kth = -np.partition(-jaccard, k - 1, axis=1)[:, k - 1]
+    row_of = {m["id"]: i for i, m in enumerate(movies)}
+    found, empty, seconds = [], 0, 0.0
+    for i, movie in enumerate(movies):
+        started = time.perf_counter()
+        neighbours = index.similar_to([movie["id"]], k=k)
+        seconds += time.perf_counter() - started
+        empty += not neighbours
+        if kth[i] > 0:
+            found.append(sum(jaccard[i, row_of[m]] >= kth[i] for m in neighbours) / k)
+    recall = float(np.mean(found)) if found else 0.0
+    return recall, empty, seconds / len(movies) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Similarity index recall vs exact Jaccard")
+    parser.add_argument("--movies", type=int, default=400)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-recall", type=float, default=0.8, help="Exit 1 below this recall@k")
+    args = parser.parse_args()
+
+    movies = [fixtures.movie_details(i) for i in range(1, args.movies + 1)]
+    features = [create_movie_vector(m) for m in movies]
+    jaccard = exact_jaccard([set(f) for f in features])
+    print(f"median best-neighbour Jaccard {np.median(jaccard.max(axis=1)):.2f}")
+
+    built = SimilarityIndex()
+    token_sets = [_token_set(f)[0] for f in features]
+    tokens = np.concatenate(token_sets)
+    offsets = np.concatenate([[0], np.cumsum([len(t) for t in token_sets])])
+    started = time.perf_counter()
+    built.build(
+        np.array([m["id"] for m in movies]), built.signatures_for(tokens, offsets), tokens, offsets,
+        catalog_neighbours(tokens, offsets, k=args.k),
+    )
+    build_seconds = time.perf_counter() - started
+
+    inserted = SimilarityIndex()
+    started = time.perf_counter()
+    for movie in movies:
+        inserted.add_movie(movie)
+    insert_seconds = time.perf_counter() - started
+
+    ok = True
+    for name, index, seconds in (("built", built, build_seconds), ("inserted", inserted, insert_seconds)):
+        recall, empty, ms = evaluate(index, movies, jaccard, args.k)
+        print(f"{name:9s} {args.movies} movies in {seconds * 1e3:.0f} ms, recall@{args.k} {recall:.3f}, "
+              f"no neighbours {empty}, similar_to {ms:.3f} ms")
+        ok = ok and recall >= args.min_recall
+    if not ok:
+        print(f"RECALL BELOW {args.min_recall}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()